@@ -1,14 +1,62 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import (Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify,
+                   stream_with_context, abort)
 from werkzeug.security import generate_password_hash, check_password_hash
-import sqlite3
+import hmac
 import os
+import sqlite3
 from datetime import datetime, date
 from functools import wraps
 
+import db
+import http_cache
+import metrics
+import session_store
+from db import get_db, get_read_db
+from attendance_archive import ArchiveError, archived_attendance_page, default_archive_dir, is_archived
+from attendance_rollup import archived_until, department_report, monthly_report, refresh_dirty
+from cache import CachedValue, cache_stats
+from change_log import ChangesCompacted, changes_after, feed_args
+from clockin import CLOCK_IN_TYPES, QueueFull, get_punch_buffer
+from exporter import EXPORTS, FORMATS, export_filename, stream_export
+from identity import invalidate_user, link_employee, refresh_identity, store_identity, users_of_employee
+from importer import IMPORTERS, detect_format, import_stream, open_text
+from init_db import create_schema
+from listings import (ATTENDANCE_FILTERS, EMPLOYEE_FILTERS, SALARY_FILTERS, attendance_page,
+                      current_filters, employee_page, salary_page)
+from notice_hub import TooManySubscribers, get_notice_hub, parse_event_id, parse_priorities
+from org_chart import ancestors, has_subordinates, is_descendant, subordinates, subtree_page, would_create_cycle
+from pagination import Page
+from payroll import recent_runs, run_payroll, salary_total
+from reference import reference_data
+from salary_analytics import company_trend, dashboard_panel, department_trend, month_range
+from search import search_employees, search_notices
+from session_store import load_secret_key
+from stats import load_dashboard_stats
+
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
+# 多 worker 进程和重启前后共用同一个密钥，session 才能互认
+app.secret_key = load_secret_key(app.instance_path)
 app.jinja_env.add_extension('jinja2.ext.do')
 DATABASE = 'hr_system.db'
+app.config['DATABASE'] = DATABASE
+db.init_app(app, schema=create_schema)
+app.config['NOTICE_CACHE_TTL'] = 60  # 秒；None 表示只在本进程写入时失效
+app.config['IMPORT_BATCH_SIZE'] = 1000
+app.config['SLOW_QUERY_MS'] = 100
+app.config['IDENTITY_TTL'] = 300  # 秒；session 中缓存的员工 id 和角色的最长有效期
+app.config['CLOCKIN_BATCH_SIZE'] = 500    # 打卡写缓冲：每批最多条数
+app.config['CLOCKIN_FLUSH_MS'] = 2        # 打卡写缓冲：每批最多等待毫秒数
+app.config['CLOCKIN_QUEUE_SIZE'] = 10000  # 打卡写缓冲：队列上限，满了返回 503
+app.config['CLOCKIN_ACK_TIMEOUT'] = 5.0   # 秒；等待写入确认的最长时间
+app.config['ATTENDANCE_ARCHIVE_DIR'] = default_archive_dir(DATABASE)  # 考勤归档文件目录
+app.config['SESSION_STORE'] = 'cookie'       # 'sqlite'：session 存在数据库中，多个 worker 共享
+app.config['SESSION_IDLE_TIMEOUT'] = 8 * 3600  # 秒；服务端 session 闲置超时
+app.config['NOTICE_POLL_INTERVAL'] = 1.0         # 秒；通知推送读取其他进程写入的通知的间隔
+app.config['NOTICE_STREAM_MAX_CLIENTS'] = 10000  # 每个进程的通知推送连接上限
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # Prometheus 抓取 /metrics 用的 Bearer token
+session_store.init_app(app)
+metrics.init_app(app)
+http_cache.init_app(app)
 
 # 权限等级映射
 ROLE_HIERARCHY = {
@@ -21,13 +69,6 @@ ROLE_HIERARCHY = {
 }
 
 
-def get_db():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 def login_required(f):
     """登录验证装饰器"""
 
@@ -58,6 +99,31 @@ def role_required(min_role):
     return decorator
 
 
+def metrics_access_required(f):
+    """指标接口：带 Authorization: Bearer <METRICS_TOKEN> 的抓取请求直接放行，否则只允许管理员登录访问"""
+    admin_only = login_required(role_required('管理员')(f))
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = app.config['METRICS_TOKEN']
+        authorization = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(authorization.encode('utf-8'), ('Bearer ' + token).encode('utf-8')):
+            return f(*args, **kwargs)
+        return admin_only(*args, **kwargs)
+
+    return decorated_function
+
+
+@app.before_request
+def load_identity():
+    """session 中的身份已失效（角色被修改）或过期时重新加载，账号不存在则退出登录"""
+    # 静态资源不读 session：读过 session 的响应带 Vary: Cookie，浏览器和代理无法共用缓存
+    if request.endpoint == 'static':
+        return
+    if not refresh_identity(session, get_read_db, app.config['IDENTITY_TTL']):
+        session.clear()
+
+
 @app.context_processor
 def inject_today():
     """注入全局日期变量"""
@@ -67,10 +133,26 @@ def inject_today():
     }
 
 
+def load_sidebar_notices():
+    """加载侧栏展示的最新有效通知"""
+    rows = get_read_db().execute(
+        'SELECT * FROM notices WHERE is_active = 1 ORDER BY created_at DESC LIMIT 3'
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+sidebar_notices = CachedValue('sidebar_notices', load_sidebar_notices, ttl=app.config['NOTICE_CACHE_TTL'])
+
+
+NOTICE_READER_ROLES = ('普通职员', '实习生')
+
+
 @app.context_processor
-def utility_processor():
-    """注册模板工具函数"""
-    return dict(get_db=get_db)
+def inject_sidebar_notices():
+    """注入全局通知（仅普通职员和实习生可见，数据来自缓存）"""
+    if session.get('user_role') in NOTICE_READER_ROLES:
+        return {'sidebar_notices': sidebar_notices.get()}
+    return {}
 
 
 @app.route('/')
@@ -79,15 +161,8 @@ def dashboard():
     """工作台首页"""
     conn = get_db()
 
-    # 统计数据
-    stats = conn.execute('''
-        SELECT 
-            (SELECT COUNT(*) FROM employees) as total_employees,
-            (SELECT COUNT(*) FROM departments) as total_departments,
-            (SELECT COUNT(*) FROM positions) as total_positions,
-            (SELECT COUNT(*) FROM attendance WHERE DATE(timestamp) = DATE('now')) as today_attendance,
-            (SELECT COUNT(*) FROM notices WHERE is_active = 1) as active_notices
-    ''').fetchone()
+    # 统计数据（触发器维护的物化计数）
+    stats = load_dashboard_stats(conn)
 
     # 最近入职员工
     recent_employees = conn.execute('''
@@ -99,8 +174,10 @@ def dashboard():
         LIMIT 5
     ''').fetchall()
 
-    conn.close()
-    return render_template('dashboard.html', stats=stats, employees=recent_employees)
+    # 薪资面板只读按部门按月的聚合表（仅管理员可见）
+    salary_panel = dashboard_panel(conn) if session.get('user_role') == '管理员' else None
+
+    return render_template('dashboard.html', stats=stats, employees=recent_employees, salary_panel=salary_panel)
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -110,14 +187,13 @@ def login():
         username = request.form['username']
         password = request.form['password']
 
-        conn = get_db()
+        conn = get_read_db()
         user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        conn.close()
 
         if user and check_password_hash(user['password'], password):
             session['user_id'] = user['id']
             session['username'] = user['username']
-            session['user_role'] = user['role']
+            store_identity(session, user)
             return redirect(url_for('dashboard'))
         else:
             flash('用户名或密码错误！', 'error')
@@ -141,23 +217,22 @@ def register():
 
         conn = get_db()
         try:
-            # 1. 创建用户账号（默认角色：实习生）
-            conn.execute('INSERT INTO users (username, password, email, role) VALUES (?, ?, ?, ?)',
-                         (username, generate_password_hash(password), email, '实习生'))
-
-            # 2. 自动创建员工档案
-            conn.execute('''
+            # 1. 自动创建员工档案
+            employee_id = conn.execute('''
                 INSERT INTO employees (name, gender, phone, email, role, join_date)
                 VALUES (?, ?, ?, ?, ?, ?)
-            ''', (name, gender, phone, email, '实习生', date.today().isoformat()))
+            ''', (name, gender, phone, email, '实习生', date.today().isoformat())).lastrowid
+
+            # 2. 创建用户账号并关联员工档案（默认角色：实习生）
+            conn.execute('INSERT INTO users (username, password, email, role, employee_id) VALUES (?, ?, ?, ?, ?)',
+                         (username, generate_password_hash(password), email, '实习生', employee_id))
 
             conn.commit()
             flash('注册成功，自动创建员工档案！', 'success')
             return redirect(url_for('login'))
         except sqlite3.IntegrityError:
+            conn.rollback()
             flash('用户名或邮箱已存在！', 'error')
-        finally:
-            conn.close()
     return render_template('register.html')
 
 
@@ -169,6 +244,41 @@ def logout():
     return redirect(url_for('login'))
 
 
+def current_employee_id():
+    """当前登录用户关联的员工 id（缓存在 session 中），没有员工档案时返回 None"""
+    return session.get('employee_id')
+
+
+def visible_employee_page(conn, args):
+    """当前用户可见的员工分页：管理员看全部，其他人看自己的整棵下属树"""
+    # 修复查询逻辑：管理员能看到所有员工（包括无上级员工）
+    if session.get('user_role') == '管理员':
+        return employee_page(conn, args)
+
+    # 非管理员：查看自己管理的下属（含间接下属）
+    employee_id = current_employee_id()
+    if employee_id is None:
+        return Page([], None)
+    return employee_page(conn, args, manager_id=employee_id)
+
+
+def can_view_org(conn, employee_id):
+    """管理员可查看任何人的组织关系，其他人只能查看本人及下属"""
+    if session.get('user_role') == '管理员':
+        return True
+    own_id = current_employee_id()
+    return own_id is not None and (own_id == employee_id or is_descendant(conn, own_id, employee_id))
+
+
+# 行模板链接中代替 id 生成地址的占位值，不会与地址的其他部分重合
+ROW_ID_PLACEHOLDER = 9007199254740993
+
+
+def row_url(endpoint):
+    """虚拟表格行模板中的链接地址：按路由生成，id 处留出 {id}，由 virtual_table.js 按行填入"""
+    return url_for(endpoint, id=ROW_ID_PLACEHOLDER).replace(str(ROW_ID_PLACEHOLDER), '{id}')
+
+
 @app.route('/employees', methods=['GET', 'POST'])
 @login_required
 def employees():
@@ -186,76 +296,46 @@ def employees():
         role = request.form['role']
         join_date = request.form['join_date']
 
-        conn.execute('''
+        employee_id = conn.execute('''
             INSERT INTO employees (name, gender, phone, email, department_id, position_id, manager_id, role, join_date)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (name, gender, phone, email, department_id, position_id, manager_id, role, join_date))
+        ''', (name, gender, phone, email, department_id, position_id, manager_id, role, join_date)).lastrowid
+        # 已注册但还没有员工档案的同邮箱账号自动关联
+        link_employee(conn, employee_id, email)
         conn.commit()
         flash('员工添加成功！', 'success')
         return redirect(url_for('employees'))
 
-    # 修复查询逻辑：管理员能看到所有员工（包括无上级员工）
-    if session.get('user_role') == '管理员':
-        employees = conn.execute('''
-            SELECT e.*, d.name as dept_name, p.title as pos_title, m.name as manager_name
-            FROM employees e
-            LEFT JOIN departments d ON e.department_id = d.id
-            LEFT JOIN positions p ON e.position_id = p.id
-            LEFT JOIN employees m ON e.manager_id = m.id
-            ORDER BY e.created_at DESC
-        ''').fetchall()
-    else:
-        # 非管理员：查看自己管理的下属
-        current_user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-        current_employee = conn.execute('SELECT id FROM employees WHERE email = ?', (current_user['email'],)).fetchone()
-
-        if current_employee:
-            employees = conn.execute('''
-                SELECT e.*, d.name as dept_name, p.title as pos_title, m.name as manager_name
-                FROM employees e
-                LEFT JOIN departments d ON e.department_id = d.id
-                LEFT JOIN positions p ON e.position_id = p.id
-                LEFT JOIN employees m ON e.manager_id = m.id
-                WHERE e.manager_id = ?
-                ORDER BY e.created_at DESC
-            ''', (current_employee['id'],)).fetchall()
-        else:
-            employees = []
-
-    departments = conn.execute('SELECT * FROM departments ORDER BY name').fetchall()
-    positions = conn.execute('SELECT * FROM positions ORDER BY title').fetchall()
+    page = visible_employee_page(conn, request.args)
 
-    # 获取可分配的上级
-    managers = conn.execute('''
-        SELECT e.*, d.name as dept_name, p.title as pos_title
-        FROM employees e
-        LEFT JOIN departments d ON e.department_id = d.id
-        LEFT JOIN positions p ON e.position_id = p.id
-        WHERE e.role IN ('领导', '主管', '组长')
-        ORDER BY e.name
-    ''').fetchall()
+    # 部门、职位和可分配的上级来自参考数据缓存
+    ref = reference_data(conn, 'departments', 'positions', 'managers')
 
-    conn.close()
-    return render_template('employees.html', employees=employees, departments=departments,
-                           positions=positions, managers=managers, roles=ROLE_HIERARCHY)
+    return render_template('employees.html', employees=page.items, page=page,
+                           filters=current_filters(request.args, EMPLOYEE_FILTERS),
+                           departments=ref['departments'], positions=ref['positions'], managers=ref['managers'],
+                           roles=ROLE_HIERARCHY,
+                           row_urls={'edit': row_url('edit_employee'), 'delete': row_url('delete_employee')})
 
 
 @app.route('/employees/delete/<int:id>')
+@db.writes
 @login_required
 def delete_employee(id):
     """删除员工"""
     conn = get_db()
 
     # 检查是否有下属
-    sub_count = conn.execute('SELECT COUNT(*) as cnt FROM employees WHERE manager_id = ?', (id,)).fetchone()['cnt']
-    if sub_count > 0:
+    if has_subordinates(conn, id):
         flash('该员工有下属，请先调整下属关系！', 'error')
-        conn.close()
         return redirect(url_for('employees'))
 
+    # 删除触发器会解除账号关联，先记下关联的账号，提交后让它们的 session 重新加载身份
+    user_ids = users_of_employee(conn, id)
     conn.execute('DELETE FROM employees WHERE id = ?', (id,))
     conn.commit()
-    conn.close()
+    for user_id in user_ids:
+        invalidate_user(user_id)
     flash('员工删除成功！', 'success')
     return redirect(url_for('employees'))
 
@@ -269,6 +349,16 @@ def edit_employee(id):
     if request.method == 'POST':
         role = request.form['role']
         manager_id = request.form['manager_id'] or None
+        if manager_id is not None:
+            try:
+                manager_id = int(manager_id)
+            except ValueError:
+                flash('上级选择无效！', 'error')
+                return redirect(url_for('edit_employee', id=id))
+
+        if would_create_cycle(conn, id, manager_id):
+            flash('上级不能是本人或其下属！', 'error')
+            return redirect(url_for('edit_employee', id=id))
 
         # 关键修复：同时更新employees和users表
         try:
@@ -279,19 +369,17 @@ def edit_employee(id):
                 UPDATE employees SET role = ?, manager_id = ? WHERE id = ?
             ''', (role, manager_id, id))
 
-            # 2. 获取该员工的邮箱
-            emp = conn.execute('SELECT email FROM employees WHERE id = ?', (id,)).fetchone()
-            if emp:
-                # 3. 同步更新users表（核心修复）
-                conn.execute('UPDATE users SET role = ? WHERE email = ?', (role, emp['email']))
+            # 2. 同步更新关联账号的角色（核心修复）
+            conn.execute('UPDATE users SET role = ? WHERE employee_id = ?', (role, id))
 
             conn.commit()
+            # 3. 关联账号 session 中缓存的角色失效，下次请求重新加载
+            for user_id in users_of_employee(conn, id):
+                invalidate_user(user_id)
             flash('员工信息修改成功！（角色已同步到用户账号）', 'success')
         except Exception as e:
             conn.rollback()
             flash(f'修改失败：{str(e)}', 'error')
-        finally:
-            conn.close()
 
         return redirect(url_for('employees'))
 
@@ -302,16 +390,8 @@ def edit_employee(id):
         return redirect(url_for('employees'))
 
     # 获取可选上级
-    managers = conn.execute('''
-        SELECT e.*, d.name as dept_name, p.title as pos_title
-        FROM employees e
-        LEFT JOIN departments d ON e.department_id = d.id
-        LEFT JOIN positions p ON e.position_id = p.id
-        WHERE e.role IN ('领导', '主管', '组长')
-        ORDER BY e.name
-    ''').fetchall()
+    managers = reference_data(conn, 'managers')['managers']
 
-    conn.close()
     return render_template('edit_employee.html', employee=employee, managers=managers, roles=ROLE_HIERARCHY)
 
 
@@ -341,11 +421,11 @@ def departments():
         GROUP BY d.id
         ORDER BY d.name
     ''').fetchall()
-    conn.close()
     return render_template('departments.html', departments=departments)
 
 
 @app.route('/departments/delete/<int:id>')
+@db.writes
 @login_required
 @role_required('管理员')
 def delete_department(id):
@@ -358,7 +438,6 @@ def delete_department(id):
         flash('部门删除成功！', 'success')
     else:
         flash('该部门下有员工，无法删除！', 'error')
-    conn.close()
     return redirect(url_for('departments'))
 
 
@@ -384,11 +463,11 @@ def positions():
         return redirect(url_for('positions'))
 
     positions = conn.execute('SELECT * FROM positions ORDER BY title').fetchall()
-    conn.close()
     return render_template('positions.html', positions=positions)
 
 
 @app.route('/positions/delete/<int:id>')
+@db.writes
 @login_required
 @role_required('管理员')
 def delete_position(id):
@@ -401,7 +480,6 @@ def delete_position(id):
         flash('职位删除成功！', 'success')
     else:
         flash('该职位下有员工，无法删除！', 'error')
-    conn.close()
     return redirect(url_for('positions'))
 
 
@@ -416,22 +494,23 @@ def attendance():
         att_type = request.form['type']
         timestamp = request.form['timestamp']
 
+        boundary = archived_until(conn)
+        if boundary and timestamp < boundary:
+            flash('%s 之前的考勤已归档，不能再补录！' % boundary, 'error')
+            return redirect(url_for('attendance'))
+
         conn.execute('INSERT INTO attendance (employee_id, type, timestamp) VALUES (?, ?, ?)',
                      (employee_id, att_type, timestamp))
         conn.commit()
+        refresh_dirty(conn)
         flash('考勤记录添加成功！', 'success')
         return redirect(url_for('attendance'))
 
-    attendance = conn.execute('''
-        SELECT a.*, e.name as emp_name
-        FROM attendance a
-        JOIN employees e ON a.employee_id = e.id
-        ORDER BY a.timestamp DESC
-    ''').fetchall()
-
-    employees = conn.execute('SELECT id, name FROM employees ORDER BY name').fetchall()
-    conn.close()
-    return render_template('attendance.html', attendance=attendance, employees=employees)
+    page = attendance_page(conn, request.args)
+    employees = reference_data(conn, 'employee_options')['employee_options']
+    return render_template('attendance.html', attendance=page.items, page=page,
+                           filters=current_filters(request.args, ATTENDANCE_FILTERS), employees=employees,
+                           archived_until=archived_until(conn))
 
 
 @app.route('/salaries', methods=['GET', 'POST'])
@@ -447,7 +526,9 @@ def salaries():
         deduction = float(request.form['deduction'] or 0)
         pay_date = request.form['pay_date']
 
-        total = base_salary + bonus - deduction
+        # 按分精确计算，避免浮点误差
+        total = salary_total(request.form['base_salary'], request.form['bonus'] or 0,
+                             request.form['deduction'] or 0)
 
         conn.execute('''
             INSERT INTO salaries (employee_id, base_salary, bonus, deduction, total, pay_date)
@@ -457,16 +538,35 @@ def salaries():
         flash('薪资记录添加成功！', 'success')
         return redirect(url_for('salaries'))
 
-    salaries = conn.execute('''
-        SELECT s.*, e.name as emp_name
-        FROM salaries s
-        JOIN employees e ON s.employee_id = e.id
-        ORDER BY s.pay_date DESC
-    ''').fetchall()
+    page = salary_page(conn, request.args)
+    employees = reference_data(conn, 'employee_options')['employee_options']
+    return render_template('salaries.html', salaries=page.items, page=page,
+                           filters=current_filters(request.args, SALARY_FILTERS), employees=employees)
 
-    employees = conn.execute('SELECT id, name FROM employees ORDER BY name').fetchall()
-    conn.close()
-    return render_template('salaries.html', salaries=salaries, employees=employees)
+
+@app.route('/payroll', methods=['GET', 'POST'])
+@login_required
+@role_required('管理员')
+def payroll():
+    """月度薪资核算"""
+    conn = get_db()
+
+    if request.method == 'POST':
+        department_id = request.form.get('department_id') or None
+        try:
+            result = run_payroll(conn, request.form['pay_date'],
+                                 int(department_id) if department_id else None,
+                                 request.form.get('default_base') or None, session['user_id'])
+        except ValueError as e:
+            flash(f'核算失败：{str(e)}', 'error')
+            return redirect(url_for('payroll'))
+        flash('核算完成：新增 %d 条，跳过 %d 条（已存在 %d / 无基本工资 %d），耗时 %.2fs'
+              % (result.inserted, result.skipped + result.missing_base, result.skipped,
+                 result.missing_base, result.elapsed), 'success')
+        return redirect(url_for('payroll'))
+
+    departments = reference_data(conn, 'departments')['departments']
+    return render_template('payroll.html', runs=recent_runs(conn), departments=departments)
 
 
 @app.route('/notices', methods=['GET', 'POST'])
@@ -486,6 +586,8 @@ def notices():
             VALUES (?, ?, ?, ?, 1)
         ''', (title, content, session['user_id'], priority))
         conn.commit()
+        sidebar_notices.invalidate()
+        get_notice_hub(app).publish()
         flash('通知发布成功！', 'success')
         return redirect(url_for('notices'))
 
@@ -506,11 +608,16 @@ def notices():
             ORDER BY n.created_at DESC
         ''', (session['user_id'],)).fetchall()
 
-    conn.close()
-    return render_template('notices.html', notices=notices)
+    stats = conn.execute('''
+        SELECT COUNT(*) as total, SUM(CASE WHEN priority = 'high' THEN 1 ELSE 0 END) as urgent
+        FROM notices WHERE author_id = ?
+    ''', (session['user_id'],)).fetchone()
+
+    return render_template('notices.html', notices=notices, stats=stats)
 
 
 @app.route('/notices/delete/<int:id>')
+@db.writes
 @login_required
 def delete_notice(id):
     """删除通知"""
@@ -527,27 +634,361 @@ def delete_notice(id):
 
     conn.execute('DELETE FROM notices WHERE id = ?', (id,))
     conn.commit()
-    conn.close()
+    sidebar_notices.invalidate()
+    get_notice_hub(app).publish()
     flash('通知删除成功！', 'success')
     return redirect(url_for('notices'))
 
 
+@app.route('/notices/stream')
+@login_required
+def notice_stream():
+    """通知推送（server-sent events）：?priority=high,medium 只接收指定优先级的通知；
+    断线重连时浏览器带上 Last-Event-ID，补发期间错过的通知。可见范围与侧栏通知相同（管理员也可订阅）"""
+    if session.get('user_role') not in ('管理员',) + NOTICE_READER_ROLES:
+        return jsonify({'error': '当前角色没有通知推送'}), 403
+    try:
+        priorities = parse_priorities(request.args.getlist('priority'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    hub = get_notice_hub(app)
+    try:
+        subscriber = hub.subscribe(parse_event_id(request.headers.get('Last-Event-ID')), priorities)
+    except TooManySubscribers as e:
+        return jsonify({'error': str(e)}), 503
+    return Response(hub.stream(subscriber, request.environ.get('serve.handoff')), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def import_upload():
+    """读取上传文件并流式导入，返回 ImportResult"""
+    kind = request.values.get('kind')
+    upload = request.files.get('file')
+    if kind not in IMPORTERS or upload is None:
+        return None
+    fmt = request.values.get('format') or detect_format(upload.filename)
+    return import_stream(get_db(), kind, open_text(upload.stream), fmt,
+                         app.config['IMPORT_BATCH_SIZE'])
+
+
+@app.route('/import', methods=['GET', 'POST'])
+@login_required
+@role_required('管理员')
+def bulk_import():
+    """批量导入"""
+    result = None
+    if request.method == 'POST':
+        result = import_upload()
+        if result is None:
+            flash('请选择数据类型并上传文件！', 'error')
+        elif result.failed:
+            flash('导入完成：成功 %d 行，失败 %d 行' % (result.inserted, result.failed), 'error')
+        else:
+            flash('导入完成：成功 %d 行' % result.inserted, 'success')
+    return render_template('import.html', result=result)
+
+
+@app.route('/api/import', methods=['POST'])
+@login_required
+@role_required('管理员')
+def api_import():
+    """批量导入 API：multipart 上传 file，参数 kind、format"""
+    result = import_upload()
+    if result is None:
+        return jsonify({'error': '需要 kind 参数和 file 文件'}), 400
+    return jsonify(result.to_dict())
+
+
+@app.route('/export/<kind>')
+@login_required
+@role_required('管理员')
+def export_data(kind):
+    """流式导出：?format=csv|ndjson&gzip=1&date_from=&date_to=&department_id="""
+    fmt = request.args.get('format', 'csv')
+    if kind not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    gzip = request.args.get('gzip') == '1'
+    args = request.args.to_dict()
+    conn = get_db()
+
+    body = stream_with_context(stream_export(conn, kind, args, fmt, gzip))
+    response = Response(body, mimetype='application/gzip' if gzip else FORMATS[fmt])
+    response.headers['Content-Disposition'] = 'attachment; filename=%s' % export_filename(kind, fmt, gzip)
+    return response
+
+
 @app.route('/api/subordinates/<int:manager_id>')
 @login_required
 def get_subordinates(manager_id):
-    """获取下属列表 API"""
+    """获取下属列表 API：全部下属（闭包表，含间接下属），按层级和姓名排序，?max_depth=1 只看直属下属"""
     conn = get_db()
-    subordinates = conn.execute('''
-        SELECT e.id, e.name, d.name as dept_name, p.title as pos_title
-        FROM employees e
-        LEFT JOIN departments d ON e.department_id = d.id
-        LEFT JOIN positions p ON e.position_id = p.id
-        WHERE e.manager_id = ?
-        ORDER BY e.name
-    ''', (manager_id,)).fetchall()
-    conn.close()
+    if not can_view_org(conn, manager_id):
+        return jsonify({'error': '无权查看该员工的组织关系'}), 403
+    return jsonify(subordinates(conn, manager_id, request.args))
+
+
+@app.route('/api/employees')
+@login_required
+def api_employees():
+    """员工列表 API（筛选 + 游标分页）"""
+    return jsonify(visible_employee_page(get_db(), request.args).to_dict())
 
-    return jsonify([dict(row) for row in subordinates])
+
+@app.route('/api/attendance')
+@login_required
+def api_attendance():
+    """考勤列表 API（筛选 + 游标分页）"""
+    return jsonify(attendance_page(get_db(), request.args).to_dict())
+
+
+@app.route('/api/attendance/clock-in', methods=['POST'])
+@login_required
+def api_clock_in():
+    """打卡 API：JSON {type, timestamp?, employee_id?（仅管理员可代他人打卡）}，写入提交后才返回 201"""
+    data = request.get_json(silent=True) or {}
+    att_type = data.get('type', '上班')
+    if att_type not in CLOCK_IN_TYPES:
+        return jsonify({'error': 'type 只能是 %s' % '/'.join(CLOCK_IN_TYPES)}), 400
+
+    if session.get('user_role') == '管理员' and data.get('employee_id') is not None:
+        try:
+            employee_id = int(data['employee_id'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'employee_id 必须是整数'}), 400
+        if get_read_db().execute('SELECT 1 FROM employees WHERE id = ?', (employee_id,)).fetchone() is None:
+            return jsonify({'error': '员工不存在'}), 404
+    else:
+        employee_id = current_employee_id()
+        if employee_id is None:
+            return jsonify({'error': '当前账号没有关联的员工档案'}), 403
+
+    timestamp = data.get('timestamp') or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'timestamp 格式应为 YYYY-MM-DD HH:MM:SS'}), 400
+    # 已归档月份在入队前拒绝，避免整批写入被触发器中止；写入由打卡缓冲完成，这里只需要只读连接
+    boundary = archived_until(get_read_db())
+    if boundary and timestamp < boundary:
+        return jsonify({'error': '%s 之前的考勤已归档' % boundary}), 409
+
+    try:
+        punch = get_punch_buffer(app).submit(employee_id, att_type, timestamp)
+    except QueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    result = {'employee_id': employee_id, 'type': att_type, 'timestamp': timestamp}
+    try:
+        committed = punch.wait(app.config['CLOCKIN_ACK_TIMEOUT'])
+    except sqlite3.IntegrityError as e:
+        # 这条打卡违反约束（员工已删除、月份刚被归档等），同批的其他打卡不受影响
+        return jsonify(dict(result, error='打卡写入失败：%s' % e)), 409
+    except Exception as e:
+        app.logger.warning('打卡写入失败：%s', e)
+        response = jsonify(dict(result, error='打卡暂时无法写入，请稍后重试'))
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    if not committed:
+        # 仍在队列中，稍后会写入
+        return jsonify(dict(result, status='queued')), 202
+    return jsonify(dict(result, status='committed', batch_size=punch.batch_size,
+                        latency_ms=round(punch.latency * 1000, 1))), 201
+
+
+@app.route('/api/attendance/clock-in/stats')
+@login_required
+@role_required('管理员')
+def api_clock_in_stats():
+    """打卡写缓冲指标 API"""
+    return jsonify(get_punch_buffer(app).stats())
+
+
+@app.route('/api/notices/stream/stats')
+@login_required
+@role_required('管理员')
+def api_notice_stream_stats():
+    """通知推送指标 API（本进程）"""
+    return jsonify(get_notice_hub(app).stats())
+
+
+@app.route('/api/attendance/archive/<month>')
+@login_required
+@role_required('主管')
+def api_attendance_archive(month):
+    """已归档月份的原始打卡 API：?employee_id=&type=&cursor=&limit=（按需解压并只读挂载归档文件）"""
+    conn = get_db()
+    try:
+        if not is_archived(conn, month):
+            return jsonify({'error': '%s 没有归档' % month}), 404
+        page = archived_attendance_page(conn, month, request.args, app.config['ATTENDANCE_ARCHIVE_DIR'])
+    except ValueError:
+        return jsonify({'error': 'month 格式应为 YYYY-MM'}), 400
+    except ArchiveError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify(page.to_dict())
+
+
+@app.route('/api/attendance/monthly')
+@login_required
+@role_required('主管')
+def api_attendance_monthly():
+    """员工月度考勤汇总 API：?month=YYYY-MM&department_id="""
+    month = request.args.get('month') or date.today().strftime('%Y-%m')
+    department_id = request.args.get('department_id', type=int)
+    try:
+        return jsonify(monthly_report(get_db(), month, department_id))
+    except ValueError:
+        return jsonify({'error': 'month 格式应为 YYYY-MM'}), 400
+
+
+@app.route('/api/attendance/departments')
+@login_required
+@role_required('主管')
+def api_attendance_departments():
+    """部门月度考勤汇总 API：?month=YYYY-MM"""
+    month = request.args.get('month') or date.today().strftime('%Y-%m')
+    try:
+        return jsonify(department_report(get_db(), month))
+    except ValueError:
+        return jsonify({'error': 'month 格式应为 YYYY-MM'}), 400
+
+
+@app.route('/api/salaries')
+@login_required
+def api_salaries():
+    """薪资列表 API（筛选 + 游标分页）"""
+    return jsonify(salary_page(get_db(), request.args).to_dict())
+
+
+@app.route('/api/search/employees')
+@login_required
+def api_search_employees():
+    """员工全文检索 API：?q=&cursor=&limit=，可见范围与员工列表相同"""
+    if session.get('user_role') == '管理员':
+        return jsonify(search_employees(get_db(), request.args).to_dict())
+    employee_id = current_employee_id()
+    if employee_id is None:
+        return jsonify(Page([], None).to_dict())
+    return jsonify(search_employees(get_db(), request.args, manager_id=employee_id).to_dict())
+
+
+@app.route('/api/search/notices')
+@login_required
+def api_search_notices():
+    """通知全文检索 API：?q=&cursor=&limit=
+
+    可见范围与页面一致：管理员检索全部，领导检索自己发布的（通知管理页），
+    普通职员和实习生检索有效通知（侧栏），其他角色看不到通知
+    """
+    role = session.get('user_role')
+    if role == '管理员':
+        page = search_notices(get_db(), request.args)
+    elif role == '领导':
+        page = search_notices(get_db(), request.args, author_id=session['user_id'])
+    elif role in ('普通职员', '实习生'):
+        page = search_notices(get_db(), request.args, active_only=True)
+    else:
+        page = Page([], None)
+    return jsonify(page.to_dict())
+
+
+@app.route('/api/changes')
+@login_required
+@role_required('管理员')
+def api_changes():
+    """增量同步 API：?after=<seq>&limit=&table=，返回 seq 大于 after 的变更，下一批以 next_after 继续
+
+    游标早于压缩位置时返回 410，下游需要重新全量同步
+    """
+    try:
+        after, limit, tables = feed_args(request.args)
+        return jsonify(changes_after(get_db(), after, limit, tables))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ChangesCompacted as e:
+        return jsonify({'error': str(e)}), 410
+
+
+@app.route('/api/salaries/analytics/departments')
+@login_required
+@role_required('管理员')
+def api_salary_departments():
+    """部门月度薪资分析 API：?from=YYYY-MM&to=YYYY-MM&department_id=（默认最近 12 个月）"""
+    department_id = request.args.get('department_id', type=int)
+    try:
+        month_from, month_to = month_range(request.args.get('from'), request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from/to 格式应为 YYYY-MM，且 from 不晚于 to'}), 400
+    return jsonify(department_trend(get_db(), month_from, month_to, department_id))
+
+
+@app.route('/api/salaries/analytics/company')
+@login_required
+@role_required('管理员')
+def api_salary_company():
+    """全公司月度薪资趋势 API：?from=YYYY-MM&to=YYYY-MM（默认最近 12 个月）"""
+    try:
+        month_from, month_to = month_range(request.args.get('from'), request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from/to 格式应为 YYYY-MM，且 from 不晚于 to'}), 400
+    return jsonify(company_trend(get_db(), month_from, month_to))
+
+
+@app.route('/api/cache/stats')
+@login_required
+@role_required('管理员')
+def cache_stats_api():
+    """缓存命中率 API"""
+    return jsonify(cache_stats())
+
+
+@app.route('/api/org/<int:employee_id>/subtree')
+@login_required
+def org_subtree(employee_id):
+    """下属树 API：?max_depth=&cursor=&limit="""
+    conn = get_db()
+    if not can_view_org(conn, employee_id):
+        return jsonify({'error': '无权查看该员工的组织关系'}), 403
+    return jsonify(subtree_page(conn, employee_id, request.args).to_dict())
+
+
+@app.route('/api/org/<int:employee_id>/ancestors')
+@login_required
+def org_ancestors(employee_id):
+    """上级链 API：?max_depth="""
+    conn = get_db()
+    if not can_view_org(conn, employee_id):
+        return jsonify({'error': '无权查看该员工的组织关系'}), 403
+    return jsonify(ancestors(conn, employee_id, request.args))
+
+
+@app.route('/metrics')
+@metrics_access_required
+def prometheus_metrics():
+    """Prometheus 指标：路由延迟、每请求查询数、SQL 耗时、连接池（按读/写角色）与缓存"""
+    pools = db.pool_stats().items()
+    gauges = [
+        ('db_pool_connections', 'gauge', [('role="%s",state="%s"' % (role, key), pool[key])
+                                          for role, pool in pools for key in ('size', 'idle', 'in_use')]),
+        ('db_pool_acquire_total', 'counter', [('role="%s",result="%s"' % (role, key), pool[key])
+                                              for role, pool in pools for key in ('hits', 'misses', 'waits')]),
+        ('db_pool_wait_seconds_total', 'counter', [('role="%s"' % role, pool['wait_time']) for role, pool in pools]),
+        ('db_pool_hold_seconds_total', 'counter', [('role="%s"' % role, pool['hold_time']) for role, pool in pools]),
+        ('cache_requests_total', 'counter', [('cache="%s",result="%s"' % (name, key), stats[key])
+                                             for name, stats in cache_stats().items()
+                                             for key in ('hits', 'misses')]),
+    ]
+    return Response(metrics.metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/db/pool')
+@login_required
+@role_required('管理员')
+def db_pool_stats():
+    """连接池指标 API（只读与写连接池分别统计）"""
+    return jsonify(db.pool_stats())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,361 @@
+"""考勤冷数据归档：已关账月份的原始打卡从 attendance 移到按月的压缩只读归档文件
+
+attendance 只保留最近 keep_months 个月（含本月）的打卡，写入和列表查询只涉及这部分热数据。
+更早的月份逐月导出为独立的 SQLite 文件（与 attendance 同结构、同索引），gzip 压缩后保存为
+<归档目录>/attendance_YYYY-MM.db.gz，再从 attendance 中分天删除；删除腾出的空闲页由之后的写入复用，
+主库文件大小不随历史增长。
+
+归档按月从最早的月份开始连续进行，attendance_archives 记录每个已归档月份。
+早于最后一个归档月份月末的打卡禁止写入和修改（触发器拦截），考勤日汇总 attendance_daily 保留不动，
+月度报表和薪资核算照常使用。需要查看原始打卡时，open_archive() 把归档解压到缓存目录并以只读方式 ATTACH。
+
+用法：python attendance_archive.py archive [--keep-months 3] [--dry-run]
+      python attendance_archive.py list
+      python attendance_archive.py query YYYY-MM [--employee ID] [--limit 20]
+      python attendance_archive.py purge-cache
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date
+from urllib.request import pathname2url
+
+from attendance_rollup import _next_day, month_period, refresh_dirty
+from listings import ATTENDANCE_SELECT, attendance_conditions
+from pagination import fetch_page, page_size
+
+DEFAULT_KEEP_MONTHS = 3
+ARCHIVE_DIRNAME = 'attendance_archive'
+CACHE_DIRNAME = 'cache'
+
+ARCHIVE_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_archive_attendance_ins BEFORE INSERT ON attendance
+    WHEN NEW.timestamp < (SELECT end_day FROM attendance_archives ORDER BY month DESC LIMIT 1) BEGIN
+        SELECT RAISE(ABORT, '该月考勤已归档，不能再写入');
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_archive_attendance_upd BEFORE UPDATE ON attendance
+    WHEN OLD.timestamp < (SELECT end_day FROM attendance_archives ORDER BY month DESC LIMIT 1)
+      OR NEW.timestamp < (SELECT end_day FROM attendance_archives ORDER BY month DESC LIMIT 1) BEGIN
+        SELECT RAISE(ABORT, '该月考勤已归档，不能再修改');
+    END;
+'''
+
+# 归档文件中的表结构（id 保留原值，不需要 AUTOINCREMENT）
+ARCHIVE_DDL = '''
+    CREATE TABLE {schema}.attendance (
+        id INTEGER PRIMARY KEY,
+        employee_id INTEGER NOT NULL,
+        type VARCHAR(20) NOT NULL,
+        timestamp TIMESTAMP
+    );
+'''
+ARCHIVE_INDEXES = '''
+    CREATE INDEX {schema}.idx_attendance_time ON attendance(timestamp);
+    CREATE INDEX {schema}.idx_attendance_emp_time ON attendance(employee_id, timestamp);
+'''
+
+
+class ArchiveError(Exception):
+    """归档文件缺失或与主库记录不一致"""
+
+
+def create_archive_schema(conn):
+    """归档记录表和禁止写入已归档月份的触发器"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_archives (
+            month TEXT PRIMARY KEY,
+            end_day DATE NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            rows INTEGER NOT NULL DEFAULT 0,
+            id_sum INTEGER NOT NULL DEFAULT 0,
+            raw_bytes INTEGER NOT NULL DEFAULT 0,
+            compressed_bytes INTEGER NOT NULL DEFAULT 0,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.executescript(ARCHIVE_TRIGGERS)
+    conn.commit()
+
+
+def default_archive_dir(database):
+    return os.path.join(os.path.dirname(os.path.abspath(database)), ARCHIVE_DIRNAME)
+
+
+def archive_path(archive_dir, month):
+    return os.path.join(archive_dir, 'attendance_%s.db.gz' % month)
+
+
+def month_bounds(month):
+    """'YYYY-MM' -> ('YYYY-MM-01', 次月首日)，格式不对时抛 ValueError"""
+    start, end = month_period(date.fromisoformat(month + '-01'))
+    return start.isoformat(), end.isoformat()
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def closed_months(conn, keep_months=DEFAULT_KEEP_MONTHS, today=None):
+    """attendance 中早于保留窗口、可以归档的月份（从最早的月份起）"""
+    cutoff = _add_months((today or date.today()).replace(day=1), 1 - keep_months).isoformat()
+    oldest = conn.execute('SELECT MIN(timestamp) FROM attendance').fetchone()[0]
+    months = []
+    if not oldest:
+        return months
+    month = date.fromisoformat(oldest[:7] + '-01')
+    while month.isoformat() < cutoff:
+        months.append(month.strftime('%Y-%m'))
+        month = _add_months(month, 1)
+    return months
+
+
+def list_archives(conn):
+    return [dict(row) for row in conn.execute('SELECT * FROM attendance_archives ORDER BY month')]
+
+
+def _hot_checksum(conn, start, end):
+    row = conn.execute('SELECT COUNT(*), COALESCE(SUM(id), 0) FROM attendance WHERE timestamp >= ? AND timestamp < ?',
+                       (start, end)).fetchone()
+    return row[0], row[1]
+
+
+def _export(conn, month, path):
+    """把该月打卡写入新的 SQLite 文件并校验行数与 id 之和，返回 (行数, id 之和)"""
+    start, end = month_bounds(month)
+    if os.path.exists(path):
+        os.remove(path)
+    conn.execute('ATTACH DATABASE ? AS archive_out', (path,))
+    try:
+        conn.execute('PRAGMA archive_out.journal_mode = OFF').fetchall()
+        conn.execute('PRAGMA archive_out.synchronous = OFF')
+        conn.executescript(ARCHIVE_DDL.format(schema='archive_out'))
+        conn.execute('''
+            INSERT INTO archive_out.attendance (id, employee_id, type, timestamp)
+            SELECT id, employee_id, type, timestamp FROM main.attendance
+            WHERE timestamp >= ? AND timestamp < ?
+            ORDER BY timestamp
+        ''', (start, end))
+        conn.commit()
+        conn.executescript(ARCHIVE_INDEXES.format(schema='archive_out'))
+        exported = conn.execute('SELECT COUNT(*), COALESCE(SUM(id), 0) FROM archive_out.attendance').fetchone()
+        exported = (exported[0], exported[1])
+    finally:
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('DETACH DATABASE archive_out')
+    if exported != _hot_checksum(conn, start, end):
+        raise ArchiveError('%s 导出行数与 attendance 不一致' % month)
+    return exported
+
+
+def _compress(source, target):
+    """gzip 压缩到临时文件，落盘后再原子替换为归档文件"""
+    temp = target + '.tmp'
+    with open(source, 'rb') as src, gzip.open(temp, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    with open(temp, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(temp, target)
+
+
+def _delete_hot(conn, month):
+    """按天分批删除已归档月份的打卡，每天一个事务，避免长时间占用写锁"""
+    start, end = month_bounds(month)
+    deleted, day = 0, start
+    while day < end:
+        next_day = _next_day(day)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            deleted += conn.execute('DELETE FROM attendance WHERE timestamp >= ? AND timestamp < ?',
+                                    (day, next_day)).rowcount
+            # 删除触发的汇总重算标记无需处理：该日的汇总已在归档前算好
+            conn.execute('DELETE FROM attendance_rollup_dirty WHERE day = ?', (day,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        day = next_day
+    return deleted
+
+
+def archive_month(conn, month, archive_dir):
+    """归档一个月；可重复执行，中断后再次运行会从中断处继续"""
+    start, end = month_bounds(month)
+    os.makedirs(archive_dir, exist_ok=True)
+    target = archive_path(archive_dir, month)
+
+    # 1. 登记归档，从此该月禁止写入；再重算一次汇总，确保 attendance_daily 包含该月全部打卡
+    conn.execute('INSERT OR IGNORE INTO attendance_archives (month, end_day) VALUES (?, ?)', (month, end))
+    conn.commit()
+    refresh_dirty(conn)
+
+    record = conn.execute('SELECT * FROM attendance_archives WHERE month = ?', (month,)).fetchone()
+    if record['status'] == 'archived' and not os.path.exists(target):
+        # 热数据可能已删除：重新导出只会得到剩余的打卡，覆盖 rows/id_sum 会把丢失的数据掩盖掉
+        raise ArchiveError('%s 已归档但归档文件 %s 不存在，请从备份恢复该文件后再运行' % (month, target))
+    if record['status'] != 'archived':
+        # 2. 导出、校验、压缩
+        raw = os.path.join(archive_dir, 'attendance_%s.db' % month)
+        rows, id_sum = _export(conn, month, raw)
+        raw_bytes = os.path.getsize(raw)
+        _compress(raw, target)
+        os.remove(raw)
+        conn.execute('''
+            UPDATE attendance_archives
+            SET status = 'archived', rows = ?, id_sum = ?, raw_bytes = ?, compressed_bytes = ?,
+                archived_at = CURRENT_TIMESTAMP
+            WHERE month = ?
+        ''', (rows, id_sum, raw_bytes, os.path.getsize(target), month))
+        conn.commit()
+        record = conn.execute('SELECT * FROM attendance_archives WHERE month = ?', (month,)).fetchone()
+
+    # 3. 删除热数据（上次中断时可能已删除一部分，此时只校验剩余部分是归档的子集）
+    remaining = _hot_checksum(conn, start, end)
+    if remaining[0] > record['rows']:
+        raise ArchiveError('%s 仍有未归档的打卡，请检查后重新归档' % month)
+    _delete_hot(conn, month)
+    return dict(record)
+
+
+def archive(conn, archive_dir, keep_months=DEFAULT_KEEP_MONTHS, dry_run=False, today=None):
+    """归档保留窗口之外的全部月份，返回各月的归档记录"""
+    months = closed_months(conn, keep_months, today)
+    if dry_run:
+        return [{'month': month, 'rows': _hot_checksum(conn, *month_bounds(month))[0]} for month in months]
+    return [archive_month(conn, month, archive_dir) for month in months]
+
+
+# ---------- 按需查询归档 ----------
+
+# 月份 -> 解压锁：同一进程内多个请求同时查询未缓存的同一个月时只解压一次
+_cache_locks = {}
+_cache_locks_lock = threading.Lock()
+
+
+def _cache_fresh(target, source):
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source)
+
+
+def _cached_copy(archive_dir, month):
+    """解压到缓存目录（已是最新则直接复用），返回只读文件路径
+
+    先解压到唯一的临时文件再原子替换，其他进程（或线程）看到的缓存文件总是完整的。
+    """
+    source = archive_path(archive_dir, month)
+    if not os.path.exists(source):
+        raise ArchiveError('%s 没有归档文件' % month)
+    cache_dir = os.path.join(archive_dir, CACHE_DIRNAME)
+    target = os.path.join(cache_dir, 'attendance_%s.db' % month)
+    if _cache_fresh(target, source):
+        return target
+    with _cache_locks_lock:
+        lock = _cache_locks.setdefault(month, threading.Lock())
+    with lock:
+        if _cache_fresh(target, source):
+            return target
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, temp = tempfile.mkstemp(prefix='attendance_%s.' % month, suffix='.tmp', dir=cache_dir)
+        try:
+            with gzip.open(source, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.chmod(temp, 0o444)
+            os.replace(temp, target)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+    return target
+
+
+@contextmanager
+def open_archive(conn, month, archive_dir):
+    """把某月归档以只读方式 ATTACH 到连接上，返回 schema 名，退出时 DETACH"""
+    month_bounds(month)
+    path = _cached_copy(archive_dir, month)
+    schema = 'archive_' + month.replace('-', '_')
+    # ATTACH 不能在事务中执行：只读连接借出时开启的快照读事务在此结束（归档文件不可变，不影响一致性）
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('ATTACH DATABASE ? AS %s' % schema,
+                 ('file:%s?mode=ro&immutable=1' % pathname2url(os.path.abspath(path)),))
+    try:
+        yield schema
+    finally:
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('DETACH DATABASE %s' % schema)
+
+
+def is_archived(conn, month):
+    return conn.execute("SELECT 1 FROM attendance_archives WHERE month = ? AND status = 'archived'",
+                        (month,)).fetchone() is not None
+
+
+def archived_attendance_page(conn, month, args, archive_dir):
+    """已归档月份的打卡列表：筛选与键集分页同 attendance_page()"""
+    clauses, params = attendance_conditions(args)
+    with open_archive(conn, month, archive_dir) as schema:
+        select = ATTENDANCE_SELECT.replace('FROM attendance a', 'FROM %s.attendance a' % schema)
+        return fetch_page(conn, select, clauses, params, 'a.timestamp', 'a.id', 'timestamp',
+                          args.get('cursor'), page_size(args))
+
+
+def purge_cache(archive_dir):
+    cache_dir = os.path.join(archive_dir, CACHE_DIRNAME)
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+def main():
+    from db import connect
+    from init_db import DATABASE, create_schema
+
+    parser = argparse.ArgumentParser(description='考勤冷数据归档')
+    parser.add_argument('command', choices=('archive', 'list', 'query', 'purge-cache'))
+    parser.add_argument('month', nargs='?', help='query 的月份 YYYY-MM')
+    parser.add_argument('--keep-months', type=int, default=DEFAULT_KEEP_MONTHS, help='attendance 保留的月数（含本月）')
+    parser.add_argument('--dry-run', action='store_true', help='只列出将要归档的月份')
+    parser.add_argument('--employee', type=int)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--database', default=DATABASE)
+    parser.add_argument('--archive-dir')
+    args = parser.parse_args()
+
+    archive_dir = args.archive_dir or default_archive_dir(args.database)
+    conn = connect(args.database)
+    create_schema(conn)
+    if args.command == 'archive':
+        before = os.path.getsize(args.database)
+        for item in archive(conn, archive_dir, max(1, args.keep_months), args.dry_run):
+            if args.dry_run:
+                print('%s  %d 条' % (item['month'], item['rows']))
+            else:
+                print('%s  %d 条  %.1f MB -> %.1f MB' % (item['month'], item['rows'], item['raw_bytes'] / 1e6,
+                                                        item['compressed_bytes'] / 1e6))
+        print('主库大小 %.1f MB（删除腾出的页由之后的写入复用）' % (before / 1e6))
+    elif args.command == 'list':
+        for item in list_archives(conn):
+            print('%(month)s  %(status)-8s  %(rows)8d 条  %(compressed_bytes)10d 字节  %(archived_at)s' % item)
+    elif args.command == 'query':
+        if not args.month:
+            parser.error('query 需要月份 YYYY-MM')
+        query = {'limit': args.limit}
+        if args.employee is not None:
+            query['employee_id'] = str(args.employee)
+        for row in archived_attendance_page(conn, args.month, query, archive_dir).items:
+            print('%(id)10d  %(emp_name)-8s  %(type)-4s  %(timestamp)s' % dict(row))
+    else:
+        purge_cache(archive_dir)
+        print('已清空解压缓存。')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+"""考勤汇总：按员工按天配对签到/签退，维护 attendance_daily 汇总表，报表只读汇总表
+
+原始打卡写入时由触发器登记到 attendance_rollup_dirty，refresh_dirty() 只重算这些 (员工, 日期)。
+
+用法：python attendance_rollup.py refresh | backfill [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+import argparse
+import calendar
+from datetime import date, datetime, timedelta
+
+WORK_START = '09:00:59'          # 晚于该时间的首次签到计为迟到
+CHECK_IN_TYPES = ('上班', '外勤')
+CHECK_OUT_TYPES = ('下班',)
+REFRESH_BATCH_SIZE = 500
+
+ROLLUP_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_attendance_ins AFTER INSERT ON attendance
+    WHEN DATE(NEW.timestamp) IS NOT NULL BEGIN
+        INSERT OR IGNORE INTO attendance_rollup_dirty (employee_id, day)
+        VALUES (NEW.employee_id, DATE(NEW.timestamp));
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_attendance_del AFTER DELETE ON attendance
+    WHEN DATE(OLD.timestamp) IS NOT NULL BEGIN
+        INSERT OR IGNORE INTO attendance_rollup_dirty (employee_id, day)
+        VALUES (OLD.employee_id, DATE(OLD.timestamp));
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_attendance_upd AFTER UPDATE ON attendance BEGIN
+        INSERT OR IGNORE INTO attendance_rollup_dirty (employee_id, day)
+        SELECT OLD.employee_id, DATE(OLD.timestamp) WHERE DATE(OLD.timestamp) IS NOT NULL
+        UNION ALL
+        SELECT NEW.employee_id, DATE(NEW.timestamp) WHERE DATE(NEW.timestamp) IS NOT NULL;
+    END;
+'''
+
+
+def create_rollup_schema(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_daily (
+            employee_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            first_in TEXT,
+            last_out TEXT,
+            punches INTEGER NOT NULL DEFAULT 0,
+            worked_minutes INTEGER NOT NULL DEFAULT 0,
+            late_minutes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (employee_id, day)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_daily_day ON attendance_daily(day)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_rollup_dirty (
+            employee_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            PRIMARY KEY (employee_id, day)
+        ) WITHOUT ROWID
+    ''')
+    cursor.executescript(ROLLUP_TRIGGERS)
+
+    has_rollups = cursor.execute('SELECT 1 FROM attendance_daily LIMIT 1').fetchone()
+    has_punches = cursor.execute('SELECT 1 FROM attendance LIMIT 1').fetchone()
+    if has_punches and not has_rollups:
+        backfill(conn)
+
+
+def month_period(day):
+    """某日所在自然月的 [起, 止) 日期"""
+    start = day.replace(day=1)
+    days = calendar.monthrange(day.year, day.month)[1]
+    return start, start + timedelta(days=days)
+
+
+def workdays(start, end):
+    """[start, end) 内的工作日（周一至周五）"""
+    day, result = start, []
+    while day < end:
+        if day.weekday() < 5:
+            result.append(day.isoformat())
+        day += timedelta(days=1)
+    return result
+
+
+def _parse(timestamp):
+    return datetime.fromisoformat(str(timestamp).replace('T', ' ')[:19])
+
+
+def summarize_day(employee_id, day, punches):
+    """把一天的打卡 [(类型, 时间戳)] 配对成汇总行；上班/外勤开始计时，下班结束计时"""
+    punches = sorted((_parse(ts), att_type) for att_type, ts in punches)
+    first_in = last_out = opened = None
+    worked = 0
+    for moment, att_type in punches:
+        if att_type in CHECK_IN_TYPES:
+            if first_in is None:
+                first_in = moment
+            if opened is None:
+                opened = moment
+        elif att_type in CHECK_OUT_TYPES:
+            last_out = moment
+            if opened is not None:
+                worked += int((moment - opened).total_seconds() // 60)
+                opened = None
+
+    late = 0
+    if first_in is not None and first_in.strftime('%H:%M:%S') > WORK_START:
+        start = datetime.combine(first_in.date(), datetime.strptime(WORK_START, '%H:%M:%S').time())
+        late = max(1, int((first_in - start).total_seconds() // 60))
+    return (
+        employee_id, day,
+        first_in.strftime('%H:%M:%S') if first_in else None,
+        last_out.strftime('%H:%M:%S') if last_out else None,
+        len(punches), worked, late,
+    )
+
+
+UPSERT_DAILY = '''
+    INSERT OR REPLACE INTO attendance_daily
+        (employee_id, day, first_in, last_out, punches, worked_minutes, late_minutes)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def _next_day(day):
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def archived_until(conn):
+    """已归档考勤的截止日：早于该日的原始打卡已移到归档文件（只读）；没有归档时返回 None"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attendance_archives'").fetchone():
+        return None
+    row = conn.execute('SELECT end_day FROM attendance_archives ORDER BY month DESC LIMIT 1').fetchone()
+    return row[0] if row else None
+
+
+def refresh_dirty(conn, batch_size=REFRESH_BATCH_SIZE):
+    """重算所有待更新的 (员工, 日期)，返回处理数量"""
+    if conn.in_transaction:
+        conn.commit()
+    # 已归档日期的原始打卡不在 attendance 中，汇总保持归档时的结果
+    boundary = archived_until(conn) or ''
+    processed = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            dirty = conn.execute('SELECT employee_id, day FROM attendance_rollup_dirty LIMIT ?',
+                                 (batch_size,)).fetchall()
+            if not dirty:
+                conn.commit()
+                return processed
+            upserts, deletes = [], []
+            for employee_id, day in dirty:
+                if day < boundary:
+                    continue
+                punches = conn.execute('''
+                    SELECT type, timestamp FROM attendance
+                    WHERE employee_id = ? AND timestamp >= ? AND timestamp < ?
+                ''', (employee_id, day, _next_day(day))).fetchall()
+                if punches:
+                    upserts.append(summarize_day(employee_id, day, punches))
+                else:
+                    deletes.append((employee_id, day))
+            conn.executemany(UPSERT_DAILY, upserts)
+            conn.executemany('DELETE FROM attendance_daily WHERE employee_id = ? AND day = ?', deletes)
+            conn.executemany('DELETE FROM attendance_rollup_dirty WHERE employee_id = ? AND day = ?',
+                             [tuple(row) for row in dirty])
+            conn.commit()
+            processed += len(dirty)
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def backfill(conn, date_from=None, date_to=None, batch_size=5000):
+    """按原始打卡全量重建汇总（一次顺序扫描，分批写入），返回写入的汇总行数
+
+    已归档的月份不在重建范围内，其汇总保持不变。
+    """
+    boundary = archived_until(conn)
+    if boundary and (not date_from or date_from < boundary):
+        date_from = boundary
+    clauses, params = [], []
+    if date_from:
+        clauses.append('timestamp >= ?')
+        params.append(date_from)
+    if date_to:
+        clauses.append('timestamp < ?')
+        params.append(_next_day(date_to))
+    where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        delete_clauses = [c.replace('timestamp', 'day') for c in clauses]
+        conn.execute('DELETE FROM attendance_daily' + (' WHERE ' + ' AND '.join(delete_clauses) if clauses else ''),
+                     params)
+        cursor = conn.execute('''
+            SELECT employee_id, DATE(timestamp) as day, type, timestamp FROM attendance
+        ''' + where + ' ORDER BY employee_id, timestamp', params)
+
+        written, batch, key, punches = 0, [], None, []
+        for employee_id, day, att_type, timestamp in cursor:
+            if (employee_id, day) != key:
+                if key and key[1]:
+                    batch.append(summarize_day(key[0], key[1], punches))
+                key, punches = (employee_id, day), []
+            punches.append((att_type, timestamp))
+            if len(batch) >= batch_size:
+                conn.executemany(UPSERT_DAILY, batch)
+                written += len(batch)
+                batch = []
+        if key and key[1]:
+            batch.append(summarize_day(key[0], key[1], punches))
+        conn.executemany(UPSERT_DAILY, batch)
+        written += len(batch)
+
+        conn.execute('DELETE FROM attendance_rollup_dirty' + (' WHERE ' + ' AND '.join(delete_clauses) if clauses else ''),
+                     params)
+        conn.commit()
+        return written
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# ---------- 报表（只读汇总表） ----------
+
+def _month_bounds(month):
+    """'YYYY-MM' -> (起始日, 次月首日, 当月工作日列表)"""
+    start, end = month_period(date.fromisoformat(month + '-01'))
+    return start.isoformat(), end.isoformat(), workdays(start, end)
+
+
+def elapsed_workdays(month_workdays, end, today=None):
+    """只保留 today（默认今天）之前的工作日，返回 (工作日列表, 截止日)：还没到（或还没过完）的工作日不算缺勤"""
+    cutoff = min(end, (today or date.today()).isoformat())
+    return [day for day in month_workdays if day < cutoff], cutoff
+
+
+def monthly_report(conn, month, department_id=None, today=None):
+    """员工月度考勤：出勤天数、工时、迟到次数/分钟、缺勤天数（缺勤只统计今天之前的工作日）"""
+    start, end, month_workdays = _month_bounds(month)
+    month_workdays, cutoff = elapsed_workdays(month_workdays, end, today)
+    sql = '''
+        SELECT e.id as employee_id, e.name as emp_name, e.department_id, d.name as dept_name, e.join_date,
+               COUNT(r.day) as days_present,
+               COALESCE(SUM(CASE WHEN strftime('%w', r.day) NOT IN ('0', '6') AND r.first_in IS NOT NULL
+                                      AND r.day < ? THEN 1 ELSE 0 END), 0) as workdays_present,
+               COALESCE(SUM(r.worked_minutes), 0) as worked_minutes,
+               COALESCE(SUM(r.late_minutes > 0), 0) as late_count,
+               COALESCE(SUM(r.late_minutes), 0) as late_minutes
+        FROM employees e
+        LEFT JOIN departments d ON e.department_id = d.id
+        LEFT JOIN attendance_daily r ON r.employee_id = e.id AND r.day >= ? AND r.day < ?
+    '''
+    params = [cutoff, start, end]
+    if department_id is not None:
+        sql += ' WHERE e.department_id = ?'
+        params.append(department_id)
+    sql += ' GROUP BY e.id ORDER BY e.id'
+
+    report = []
+    for row in conn.execute(sql, params):
+        item = dict(row)
+        join_date = item.pop('join_date')
+        required = sum(1 for day in month_workdays if not join_date or day >= join_date)
+        item['absences'] = max(0, required - item.pop('workdays_present'))
+        report.append(item)
+    return report
+
+
+def department_report(conn, month, today=None):
+    """部门月度考勤汇总"""
+    departments = {}
+    for item in monthly_report(conn, month, today=today):
+        key = item['department_id']
+        dept = departments.setdefault(key, {
+            'department_id': key, 'dept_name': item['dept_name'], 'employees': 0,
+            'worked_minutes': 0, 'late_count': 0, 'absences': 0,
+        })
+        dept['employees'] += 1
+        dept['worked_minutes'] += item['worked_minutes']
+        dept['late_count'] += item['late_count']
+        dept['absences'] += item['absences']
+    for dept in departments.values():
+        dept['avg_worked_hours'] = round(dept['worked_minutes'] / 60 / dept['employees'], 2) if dept['employees'] else 0
+    return sorted(departments.values(), key=lambda d: (d['department_id'] is None, d['department_id'] or 0))
+
+
+def first_check_ins(conn, start, end, department_id=None):
+    """各员工每天首次签到时间 {employee_id: {日期: 时间}}（薪资核算用）"""
+    sql = '''
+        SELECT r.employee_id, r.day, r.first_in FROM attendance_daily r
+    '''
+    params = [start.isoformat(), end.isoformat()]
+    if department_id is not None:
+        sql += ' JOIN employees e ON e.id = r.employee_id AND e.department_id = ?'
+        params.insert(0, department_id)
+    sql += ' WHERE r.day >= ? AND r.day < ? AND r.first_in IS NOT NULL'
+
+    summary = {}
+    for employee_id, day, first_in in conn.execute(sql, params):
+        summary.setdefault(employee_id, {})[day] = first_in
+    return summary
+
+
+def main():
+    from db import connect
+    from init_db import DATABASE, create_schema
+
+    parser = argparse.ArgumentParser(description='考勤汇总维护')
+    parser.add_argument('command', choices=('refresh', 'backfill'))
+    parser.add_argument('--from', dest='date_from')
+    parser.add_argument('--to', dest='date_to')
+    parser.add_argument('--database', default=DATABASE)
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    create_schema(conn)
+    started = datetime.now()
+    if args.command == 'refresh':
+        print('已重算 %d 个 (员工, 日期)' % refresh_dirty(conn))
+    else:
+        print('已回填 %d 行汇总' % backfill(conn, args.date_from, args.date_to))
+    print('耗时 %.2fs' % (datetime.now() - started).total_seconds())
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""打卡吞吐基准：对比 attendance() 的逐条提交路径与 PunchBuffer 批量提交（group commit）
+
+用法：python bench_clockin.py [--clients 16] [--punches 200] [--batch-size 500] [--flush-ms 2]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from attendance_rollup import refresh_dirty
+from bench_routes import percentile
+from clockin import INSERT_PUNCH, PunchBuffer
+from db import connect
+from init_db import create_schema
+
+EMPLOYEES = 1000
+
+
+def prepare(path):
+    conn = connect(path)
+    create_schema(conn)
+    conn.executemany('INSERT INTO employees (name, role, join_date) VALUES (?, ?, ?)',
+                     [('员工%d' % i, '普通职员', '2024-01-01') for i in range(EMPLOYEES)])
+    conn.commit()
+    conn.close()
+
+
+def punch_row(client_id, i):
+    employee_id = (client_id * 7919 + i) % EMPLOYEES + 1
+    return employee_id, '上班', '2024-03-01 08:%02d:%02d' % (55 + i // 60 % 5, i % 60)
+
+
+def per_row_client(path, client_id, punches, latencies):
+    """与 attendance() POST 相同：每条 INSERT + commit，再重算考勤汇总"""
+    conn = connect(path, check_same_thread=False)
+    for i in range(punches):
+        started = time.perf_counter()
+        conn.execute(INSERT_PUNCH, punch_row(client_id, i))
+        conn.commit()
+        refresh_dirty(conn)
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def buffered_client(buffer, client_id, punches, latencies):
+    for i in range(punches):
+        started = time.perf_counter()
+        buffer.submit(*punch_row(client_id, i)).wait()
+        latencies.append(time.perf_counter() - started)
+
+
+def run(name, target, args_for, clients):
+    latencies = []
+    threads = [threading.Thread(target=target, args=args_for(client_id) + (latencies,)) for client_id in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    rate = len(latencies) / elapsed
+    print('%-10s %6d 条  耗时 %6.2fs  吞吐 %8.1f 条/秒  确认延迟 p50 %6.1f ms  p99 %6.1f ms'
+          % (name, len(latencies), elapsed, rate, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000))
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='打卡写入吞吐基准')
+    parser.add_argument('--clients', type=int, default=16, help='并发打卡的客户端线程数')
+    parser.add_argument('--punches', type=int, default=200, help='每个客户端的打卡次数')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-ms', type=float, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        per_row_path = os.path.join(directory, 'per_row.db')
+        buffered_path = os.path.join(directory, 'buffered.db')
+        prepare(per_row_path)
+        prepare(buffered_path)
+
+        baseline = run('逐条提交', per_row_client,
+                       lambda client_id: (per_row_path, client_id, args.punches), args.clients)
+
+        buffer = PunchBuffer(buffered_path, batch_size=args.batch_size, flush_interval=args.flush_ms / 1000.0)
+        buffered = run('批量提交', buffered_client,
+                       lambda client_id: (buffer, client_id, args.punches), args.clients)
+        buffer.close()
+        stats = buffer.stats()
+        print('批量提交共 %(flushes)d 个事务，平均每批 %(avg_batch).1f 条' % stats)
+        print('吞吐提升：%.2fx' % (buffered / baseline))
+
+
+if __name__ == '__main__':
+    main()
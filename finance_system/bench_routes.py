@@ -0,0 +1,206 @@
+"""路由基准：用 Flask 测试客户端按账号逐个访问全部 GET 页面和 API，统计延迟分位数、每请求查询数和峰值内存
+
+结果保存为 JSON，可用 --compare 与之前的结果对比。数据库一般先用 gen_data.py 生成。
+
+用法：python bench_routes.py [--database hr_system_bench.db] [--requests 30] [--login admin:admin123 ...]
+                             [--output bench_results/xxx.json] [--compare 旧结果.json]
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+
+# 有副作用的 GET 路由不参与压测
+UNSAFE_ENDPOINTS = {'logout', 'delete_employee', 'delete_department', 'delete_position', 'delete_notice'}
+# 不会结束的推送连接
+STREAMING_ENDPOINTS = {'notice_stream'}
+DEFAULT_LOGINS = ['admin:admin123', 'bench_staff:bench123']
+
+
+def percentile(sorted_values, p):
+    """最近秩法分位数"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def peak_rss_kb():
+    # Linux 下 ru_maxrss 单位为 KiB，macOS 为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if platform.system() == 'Darwin' else peak
+
+
+def sample_arguments(database):
+    """为带参数的路由挑选样本值：下属最多的员工、导出类型等"""
+    conn = sqlite3.connect(database)
+    row = conn.execute('''
+        SELECT ancestor_id FROM employee_closure GROUP BY ancestor_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone()
+    employee_id = row[0] if row else 1
+    conn.close()
+    return {'id': employee_id, 'employee_id': employee_id, 'manager_id': employee_id, 'kind': 'attendance'}
+
+
+def sample_query(endpoint):
+    """个别路由需要的查询参数（导出只取最近一周，避免单次请求导出全表）"""
+    if endpoint == 'export_data':
+        return {'date_from': (date.today() - timedelta(days=7)).isoformat()}
+    if endpoint in ('api_attendance_monthly', 'api_attendance_departments'):
+        return {'month': (date.today().replace(day=1) - timedelta(days=1)).strftime('%Y-%m')}
+    return {}
+
+
+def discover_routes(app, database):
+    """从 url_map 枚举全部可 GET 的路由并填好参数"""
+    args = sample_arguments(database)
+    routes = []
+    with app.test_request_context():
+        from flask import url_for
+        for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+            if rule.endpoint == 'static' or rule.endpoint in UNSAFE_ENDPOINTS | STREAMING_ENDPOINTS \
+                    or 'GET' not in rule.methods:
+                continue
+            values = {name: args[name] for name in rule.arguments if name in args}
+            if len(values) != len(rule.arguments):
+                continue
+            values.update(sample_query(rule.endpoint))
+            routes.append((rule.endpoint, url_for(rule.endpoint, **values)))
+    return routes
+
+
+def bench_route(client, path, requests):
+    """先预热一次，再连续请求 requests 次"""
+    client.get(path).close()
+    latencies, queries, statuses = [], [], set()
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(int(response.headers.get('X-Query-Count', 0)))
+        statuses.add(response.status_code)
+        response.close()
+    latencies.sort()
+    return {
+        'status': sorted(statuses),
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'max_ms': round(latencies[-1], 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def table_counts(database):
+    conn = sqlite3.connect(database)
+    counts = {table: conn.execute('SELECT COUNT(*) FROM %s' % table).fetchone()[0]
+              for table in ('employees', 'attendance', 'salaries', 'notices')}
+    conn.close()
+    return counts
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(database, logins, requests):
+    from app import app
+
+    app.config['DATABASE'] = database
+    app.config['TESTING'] = True
+    # 慢查询日志在压测时会刷屏，只保留统计
+    logging.getLogger('hr_system.slow_query').setLevel(logging.ERROR)
+
+    routes = discover_routes(app, database)
+    results = []
+    for login in logins:
+        username, password = login.split(':', 1)
+        client = app.test_client()
+        response = client.post('/login', data={'username': username, 'password': password})
+        if response.status_code != 302 or response.headers.get('Location', '').endswith('/login'):
+            print('账号 %s 登录失败，跳过' % username)
+            continue
+        for endpoint, path in routes:
+            result = bench_route(client, path, requests)
+            result.update({'user': username, 'endpoint': endpoint, 'path': path})
+            results.append(result)
+            print('%-14s %-34s %-22s p50 %8.2f  p95 %8.2f  p99 %8.2f ms  查询 %5.1f  状态 %s' % (
+                username, endpoint, path[:22], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                result['queries_per_request'], ','.join(map(str, result['status']))))
+    return results
+
+
+def compare(results, previous_path):
+    """按 (账号, 路由) 对比 p95 与每请求查询数"""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {(r['user'], r['endpoint']): r for r in json.load(f)['routes']}
+    print('\n与 %s 对比（p95 / 查询数）：' % previous_path)
+    for result in results:
+        old = previous.get((result['user'], result['endpoint']))
+        if not old:
+            continue
+        change = (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+        print('%-14s %-34s %8.2f -> %8.2f ms (%+6.1f%%)  查询 %5.1f -> %5.1f' % (
+            result['user'], result['endpoint'], old['p95_ms'], result['p95_ms'], change,
+            old['queries_per_request'], result['queries_per_request']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='路由延迟基准')
+    parser.add_argument('--database', default='hr_system_bench.db')
+    parser.add_argument('--requests', type=int, default=30, help='每个路由的请求次数')
+    parser.add_argument('--login', action='append', help='user:password，可重复；默认管理员和 bench_staff')
+    parser.add_argument('--output', help='结果 JSON 路径，默认 bench_results/<时间>.json')
+    parser.add_argument('--compare', help='与之前的结果 JSON 对比')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database):
+        parser.error('%s 不存在，请先运行 gen_data.py 生成数据' % args.database)
+
+    started_at = datetime.now()
+    started = time.perf_counter()
+    results = run(args.database, args.login or DEFAULT_LOGINS, args.requests)
+    report = {
+        'meta': {
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'elapsed': round(time.perf_counter() - started, 2),
+            'database': args.database,
+            'rows': table_counts(args.database),
+            'requests_per_route': args.requests,
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'peak_rss_kb': peak_rss_kb(),
+        'routes': results,
+    }
+
+    output = args.output or os.path.join('bench_results', started_at.strftime('%Y%m%d_%H%M%S') + '.json')
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print('\n峰值内存 %.1f MB，结果已保存到 %s' % (report['peak_rss_kb'] / 1024.0, output))
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""多进程压测：分别以 1、2、4…个 worker 启动 serve.py，用多进程客户端并发请求，比较吞吐随 worker 数的变化
+
+客户端也是多进程（每个进程若干线程），避免压测端自己的 GIL 成为瓶颈；每个请求新建一个连接（serve.py 不做 keep-alive）。
+压测端与服务端在同一台机器上时会争抢 CPU，吞吐的绝对值偏低，但随 worker 数的变化趋势可比。
+数据库一般先用 gen_data.py 生成。
+
+用法：python bench_serve.py [--database hr_system_bench.db] [--workers 1,2,4] [--threads 8] [--concurrency 32]
+                            [--duration 10] [--path / --path /api/employees ...] [--login admin:admin123]
+                            [--session-store cookie|sqlite] [--verbose]
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from bench_routes import percentile
+
+DEFAULT_PATHS = ['/', '/employees', '/notices', '/api/employees', '/api/salaries']
+
+
+def request(port, method, path, cookie=None, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Cookie': cookie} if cookie else {}
+    if body is not None:
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response
+    finally:
+        conn.close()
+
+
+def login(port, username, password):
+    response = request(port, 'POST', '/login', body=urlencode({'username': username, 'password': password}))
+    if response.status != 302 or response.getheader('Location', '').endswith('/login'):
+        raise RuntimeError('账号 %s 登录失败' % username)
+    cookie = SimpleCookie(response.getheader('Set-Cookie'))
+    return '; '.join('%s=%s' % (name, morsel.value) for name, morsel in cookie.items())
+
+
+def client_process(port, threads, paths, deadline, cookie, results):
+    """一个压测进程：threads 个线程共用同一个登录 session，按顺序轮询 paths 直到 deadline"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def loop(offset):
+        mine, failed, i = [], 0, offset
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                status = request(port, 'GET', paths[i % len(paths)], cookie).status
+            except OSError:
+                status = None
+            if status == 200:
+                mine.append(time.perf_counter() - started)
+            else:
+                failed += 1
+            i += 1
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    results.put((latencies, errors[0]))
+
+
+def start_server(options, workers):
+    """启动 serve.py，等全部 worker 就绪"""
+    process = subprocess.Popen(
+        [sys.executable, 'serve.py', '--host', '127.0.0.1', '--port', str(options.port), '--workers', str(workers),
+         '--threads', str(options.threads), '--database', options.database, '--session-store', options.session_store],
+        stdout=subprocess.PIPE, stderr=None if options.verbose else subprocess.DEVNULL, text=True)
+    ready = 0
+    for line in process.stdout:
+        ready += '已就绪' in line
+        if ready >= workers:
+            break
+    if process.poll() is not None:
+        raise RuntimeError('serve.py 启动失败')
+    # 之后的输出丢弃，避免管道写满阻塞主进程
+    threading.Thread(target=process.stdout.read, daemon=True).start()
+    return process
+
+
+def run(options, workers):
+    server = start_server(options, workers)
+    try:
+        # 只登录一次：密码哈希校验很慢，不计入压测
+        cookie = login(options.port, *options.login.split(':', 1))
+        processes = max(1, min(options.concurrency, os.cpu_count() or 1))
+        per_process = [options.concurrency // processes + (i < options.concurrency % processes)
+                       for i in range(processes)]
+        results = multiprocessing.Queue()
+        started = time.time()
+        deadline = started + options.duration
+        clients = [multiprocessing.Process(target=client_process, args=(
+            options.port, threads, options.path or DEFAULT_PATHS, deadline, cookie, results))
+            for threads in per_process]
+        for p in clients:
+            p.start()
+        latencies, errors = [], 0
+        for _ in clients:
+            mine, failed = results.get()
+            latencies.extend(mine)
+            errors += failed
+        for p in clients:
+            p.join()
+        elapsed = time.time() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    latencies.sort()
+    return {
+        'workers': workers,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000 if latencies else 0.0,
+        'p99_ms': percentile(latencies, 99) * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多 worker 吞吐压测')
+    parser.add_argument('--database', default='hr_system_bench.db')
+    parser.add_argument('--workers', default=None, help='逗号分隔的 worker 数，默认 1,2,4… 直到 CPU 核数')
+    parser.add_argument('--threads', type=int, default=8, help='每个 worker 的线程数')
+    parser.add_argument('--concurrency', type=int, default=32, help='并发客户端线程总数')
+    parser.add_argument('--duration', type=float, default=10, help='每组压测秒数')
+    parser.add_argument('--path', action='append', help='请求路径，可重复；默认工作台、员工、通知和两个列表 API')
+    parser.add_argument('--login', default='admin:admin123', help='user:password')
+    parser.add_argument('--session-store', choices=['cookie', 'sqlite'], default='cookie')
+    parser.add_argument('--port', type=int, default=8799)
+    parser.add_argument('--verbose', action='store_true', help='显示服务端的错误和慢查询日志')
+    options = parser.parse_args()
+
+    if not os.path.exists(options.database):
+        parser.error('%s 不存在，请先运行 gen_data.py 生成数据' % options.database)
+    if options.workers:
+        counts = [int(n) for n in options.workers.split(',')]
+    else:
+        cpus = os.cpu_count() or 1
+        counts = [1]
+        while counts[-1] * 2 <= cpus:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != cpus:
+            counts.append(cpus)
+
+    print('CPU %d 核，并发 %d，每组 %.0f 秒，session 存储：%s' % (
+        os.cpu_count() or 1, options.concurrency, options.duration, options.session_store))
+    baseline = None
+    for workers in counts:
+        result = run(options, workers)
+        baseline = baseline or result['rps'] or 1.0
+        print('%2d 个 worker  请求 %7d  失败 %4d  吞吐 %8.1f 请求/秒（%.2fx）  p50 %7.1f ms  p99 %7.1f ms' % (
+            workers, result['requests'], result['errors'], result['rps'], result['rps'] / baseline,
+            result['p50_ms'], result['p99_ms']))
+
+
+if __name__ == '__main__':
+    main()
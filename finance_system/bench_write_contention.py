@@ -0,0 +1,123 @@
+"""写入争用基准：对比默认 rollback journal 与 WAL 存储参数下的并发写入吞吐
+
+用法：python bench_write_contention.py [--writers 8] [--rows 500] [--readers 2]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from db import DEFAULT_STORAGE_PROFILE, connect
+
+SCHEMA = '''
+    CREATE TABLE attendance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        employee_id INTEGER NOT NULL,
+        type VARCHAR(20) NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE salaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        employee_id INTEGER NOT NULL,
+        base_salary DECIMAL(10,2) NOT NULL,
+        bonus DECIMAL(10,2) DEFAULT 0,
+        deduction DECIMAL(10,2) DEFAULT 0,
+        total DECIMAL(10,2) NOT NULL,
+        pay_date DATE NOT NULL
+    );
+'''
+
+
+def open_baseline(path):
+    """与改造前 get_db() 相同：默认参数直接连接"""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def open_tuned(path):
+    return connect(path, DEFAULT_STORAGE_PROFILE, check_same_thread=False)
+
+
+def writer(open_conn, path, worker_id, rows, result):
+    """模拟考勤签到与薪资录入：每行一个事务"""
+    conn = open_conn(path)
+    done = errors = 0
+    for i in range(rows):
+        try:
+            if i % 2:
+                conn.execute('INSERT INTO attendance (employee_id, type, timestamp) VALUES (?, ?, ?)',
+                             (worker_id, '上班', '2024-01-01 09:00'))
+            else:
+                conn.execute('''
+                    INSERT INTO salaries (employee_id, base_salary, bonus, deduction, total, pay_date)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (worker_id, 8000, 500, 100, 8400, '2024-01-31'))
+            conn.commit()
+            done += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+            errors += 1
+    conn.close()
+    result.append((done, errors))
+
+
+def reader(open_conn, path, stop):
+    """模拟列表页的长读"""
+    conn = open_conn(path)
+    while not stop.is_set():
+        try:
+            conn.execute('SELECT * FROM attendance ORDER BY timestamp DESC').fetchall()
+        except sqlite3.OperationalError:
+            pass
+    conn.close()
+
+
+def run(name, open_conn, writers, rows, readers):
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'bench.db')
+        setup = open_conn(path)
+        setup.executescript(SCHEMA)
+        setup.close()
+
+        result, stop = [], threading.Event()
+        reader_threads = [threading.Thread(target=reader, args=(open_conn, path, stop)) for _ in range(readers)]
+        writer_threads = [threading.Thread(target=writer, args=(open_conn, path, i, rows, result))
+                          for i in range(writers)]
+        for t in reader_threads:
+            t.start()
+
+        started = time.perf_counter()
+        for t in writer_threads:
+            t.start()
+        for t in writer_threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        for t in reader_threads:
+            t.join()
+
+        done = sum(r[0] for r in result)
+        errors = sum(r[1] for r in result)
+        print('%-10s 成功 %6d 行  失败 %5d 行  耗时 %6.2fs  吞吐 %8.1f 行/秒'
+              % (name, done, errors, elapsed, done / elapsed))
+        return done / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite 写入争用基准')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=500, help='每个写线程写入的行数')
+    parser.add_argument('--readers', type=int, default=2)
+    args = parser.parse_args()
+
+    baseline = run('默认参数', open_baseline, args.writers, args.rows, args.readers)
+    tuned = run('WAL 参数', open_tuned, args.writers, args.rows, args.readers)
+    print('吞吐提升：%.2fx' % (tuned / baseline))
+
+
+if __name__ == '__main__':
+    main()
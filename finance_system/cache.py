@@ -0,0 +1,94 @@
+import threading
+import time
+
+# 已注册的缓存，供指标接口汇总
+CACHES = {}
+
+
+class CachedValue:
+    """进程内单值缓存：写操作调用 invalidate()，可选 TTL 兜底（多进程部署时其他进程的写入靠 TTL 过期）"""
+
+    def __init__(self, name, loader, ttl=None):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        CACHES[name] = self
+
+    def _fresh(self):
+        if self._loaded_at is None:
+            return False
+        return self.ttl is None or time.monotonic() - self._loaded_at < self.ttl
+
+    def get(self):
+        with self._lock:
+            if self._fresh():
+                self.hits += 1
+                return self._value
+            self.misses += 1
+            self._value = self.loader()
+            self._loaded_at = time.monotonic()
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._loaded_at = None
+            self.invalidations += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'invalidations': self.invalidations,
+            'ttl': self.ttl,
+        }
+
+
+class VersionedValue:
+    """按版本号失效的进程内缓存：版本号由调用方从数据库读出（多进程共享），与缓存时不同则重新加载"""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        CACHES[name] = self
+
+    def get(self, version, *args):
+        with self._lock:
+            if self._version is not None and self._version == version:
+                self.hits += 1
+                return self._value
+            if self._version is not None:
+                self.invalidations += 1
+            self.misses += 1
+            self._value = self.loader(*args)
+            self._version = version
+            return self._value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'invalidations': self.invalidations,
+            'version': list(self._version) if isinstance(self._version, tuple) else self._version,
+        }
+
+
+def cache_stats():
+    """所有缓存的命中指标"""
+    return {name: cache.stats() for name, cache in CACHES.items()}
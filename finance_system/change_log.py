@@ -0,0 +1,238 @@
+"""变更数据捕获（CDC）：员工、部门、职位、考勤、薪资、通知的增删改由触发器顺序写入 change_log
+
+seq 为 AUTOINCREMENT 主键，压缩后也不会复用；SQLite 同一时刻只有一个写事务，seq 的顺序即提交顺序，
+下游按 seq 增量拉取不会漏掉晚提交的小 seq。每条记录包含表名、行 id、操作（I/U/D）和变更后的整行 JSON
+（删除为 NULL），没有实际变化的 UPDATE 不记录。考勤归档删除的是已搬到归档文件的冷数据，不算业务删除，不记录。
+
+下游首次同步：在同一个只读快照里读取 last_seq 和全表，之后从 last_seq 开始增量拉取；
+压缩会删除 CHANGE_RETENTION_DAYS 天之前的记录，游标早于压缩位置时增量拉取报错，需要重新全量同步。
+
+用法：python change_log.py stats | compact [--keep-days 7] | tail [--after 0] [--limit 20] [--table employees]
+"""
+import argparse
+import json
+
+CAPTURED_TABLES = ('employees', 'departments', 'positions', 'attendance', 'salaries', 'notices')
+FEED_BATCH_SIZE = 500
+MAX_FEED_BATCH_SIZE = 5000
+CHANGE_RETENTION_DAYS = 7
+COMPACT_BATCH_SIZE = 10000
+CHANGE_COLUMNS = 'seq, table_name, row_id, op, data, changed_at'
+
+# 归档（attendance_archive.archive_month）删除热表中已搬走的打卡，边界之前的删除不写入变更日志
+ARCHIVE_BOUNDARY = "COALESCE((SELECT end_day FROM attendance_archives ORDER BY month DESC LIMIT 1), '')"
+
+
+class ChangesCompacted(Exception):
+    """请求的游标早于压缩位置，中间的变更已被删除"""
+
+
+def create_change_schema(conn):
+    """创建变更日志表和捕获触发器；表结构变化（增加列）后触发器按新列重建"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D')),
+            data TEXT,
+            changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # 只订阅部分表的下游按 (表, seq) 范围扫描
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_change_log_table ON change_log(table_name, seq)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            compacted_through INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO change_log_state (id) VALUES (1)')
+
+    for table in CAPTURED_TABLES:
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(%s)' % table)]
+        for name, sql in change_triggers(table, columns).items():
+            existing = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                                      (name,)).fetchone()
+            if existing is not None and existing[0] == sql:
+                continue
+            cursor.execute('DROP TRIGGER IF EXISTS %s' % name)
+            cursor.execute(sql)
+    conn.commit()
+
+
+def change_triggers(table, columns):
+    """按列生成 {触发器名: CREATE TRIGGER 语句}"""
+    def row_json(alias):
+        return 'json_object(%s)' % ', '.join("'%s', %s.%s" % (column, alias, column) for column in columns)
+
+    changed = ' OR '.join('NEW.%s IS NOT OLD.%s' % (column, column) for column in columns)
+    delete_when = ' WHEN OLD.timestamp >= %s' % ARCHIVE_BOUNDARY if table == 'attendance' else ''
+    return {
+        'trg_cdc_%s_ins' % table: (
+            "CREATE TRIGGER trg_cdc_%s_ins AFTER INSERT ON %s BEGIN "
+            "INSERT INTO change_log (table_name, row_id, op, data) VALUES ('%s', NEW.id, 'I', %s); END"
+            % (table, table, table, row_json('NEW'))),
+        'trg_cdc_%s_upd' % table: (
+            "CREATE TRIGGER trg_cdc_%s_upd AFTER UPDATE ON %s WHEN %s BEGIN "
+            "INSERT INTO change_log (table_name, row_id, op, data) VALUES ('%s', NEW.id, 'U', %s); END"
+            % (table, table, changed, table, row_json('NEW'))),
+        'trg_cdc_%s_del' % table: (
+            "CREATE TRIGGER trg_cdc_%s_del AFTER DELETE ON %s%s BEGIN "
+            "INSERT INTO change_log (table_name, row_id, op, data) VALUES ('%s', OLD.id, 'D', NULL); END"
+            % (table, table, delete_when, table)),
+    }
+
+
+def last_seq(conn):
+    """当前最大的 seq（AUTOINCREMENT 计数器，压缩后仍保留）"""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+
+def compacted_through(conn):
+    return conn.execute('SELECT compacted_through FROM change_log_state WHERE id = 1').fetchone()[0]
+
+
+def parse_tables(values):
+    """?table=employees&table=salaries 或逗号分隔；未知表名抛 ValueError"""
+    tables = []
+    for value in values:
+        for table in value.split(','):
+            table = table.strip()
+            if not table:
+                continue
+            if table not in CAPTURED_TABLES:
+                raise ValueError('不支持的表：%s（可选 %s）' % (table, '、'.join(CAPTURED_TABLES)))
+            if table not in tables:
+                tables.append(table)
+    return tables
+
+
+def change_dict(row):
+    """change_log 的一行 -> 下游看到的变更"""
+    return {
+        'seq': row['seq'],
+        'table': row['table_name'],
+        'id': row['row_id'],
+        'op': row['op'],
+        'data': json.loads(row['data']) if row['data'] is not None else None,
+        'changed_at': row['changed_at'],
+    }
+
+
+def changes_after(conn, after=0, limit=FEED_BATCH_SIZE, tables=None):
+    """seq 大于 after 的变更，按 seq 升序最多 limit 条
+
+    返回 {changes, next_after, has_more, last_seq}：下游处理完本批后以 next_after 作为下一次的 after。
+    after 早于压缩位置时抛 ChangesCompacted。
+    """
+    if after < compacted_through(conn):
+        raise ChangesCompacted('seq %d 及之前的变更已被压缩，请重新全量同步' % compacted_through(conn))
+
+    sql = 'SELECT %s FROM change_log WHERE seq > ?' % CHANGE_COLUMNS
+    params = [after]
+    if tables:
+        sql += ' AND table_name IN (%s)' % ', '.join('?' * len(tables))
+        params.extend(tables)
+    sql += ' ORDER BY seq LIMIT ?'
+    params.append(limit + 1)
+    rows = conn.execute(sql, params).fetchall()
+
+    changes = [change_dict(row) for row in rows[:limit]]
+    return {
+        'changes': changes,
+        'next_after': changes[-1]['seq'] if changes else after,
+        'has_more': len(rows) > limit,
+        'last_seq': last_seq(conn),
+    }
+
+
+def feed_args(args):
+    """解析 ?after=&limit=&table=，参数错误抛 ValueError"""
+    try:
+        after = int(args.get('after', 0))
+        limit = int(args.get('limit', FEED_BATCH_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError('after 和 limit 必须是整数')
+    if after < 0:
+        raise ValueError('after 不能为负数')
+    return after, max(1, min(limit, MAX_FEED_BATCH_SIZE)), parse_tables(args.getlist('table'))
+
+
+def compact(conn, keep_days=CHANGE_RETENTION_DAYS, batch_size=COMPACT_BATCH_SIZE):
+    """删除 keep_days 天之前的变更，每批一个事务；返回删除条数
+
+    先推进压缩位置再删除：删除过程中游标早于该位置的下游已会收到 ChangesCompacted，不会读到残缺的区间。
+    """
+    row = conn.execute("SELECT seq FROM change_log WHERE changed_at >= datetime('now', ?) ORDER BY seq LIMIT 1",
+                       ('-%d days' % keep_days,)).fetchone()
+    through = row[0] - 1 if row else last_seq(conn)
+    start = conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+    if start is None or through < start:
+        return 0
+
+    conn.execute('UPDATE change_log_state SET compacted_through = MAX(compacted_through, ?) WHERE id = 1',
+                 (through,))
+    conn.commit()
+    deleted = 0
+    low = start - 1
+    while low < through:
+        high = min(low + batch_size, through)
+        deleted += conn.execute('DELETE FROM change_log WHERE seq > ? AND seq <= ?', (low, high)).rowcount
+        conn.commit()
+        low = high
+    return deleted
+
+
+def change_stats(conn):
+    """各表的变更条数与日志范围"""
+    by_table = dict(conn.execute('SELECT table_name, COUNT(*) FROM change_log GROUP BY table_name').fetchall())
+    first, count = conn.execute('SELECT MIN(seq), COUNT(*) FROM change_log').fetchone()
+    return {
+        'entries': count,
+        'first_seq': first,
+        'last_seq': last_seq(conn),
+        'compacted_through': compacted_through(conn),
+        'tables': {table: by_table.get(table, 0) for table in CAPTURED_TABLES},
+    }
+
+
+def main():
+    from db import connect
+    from init_db import DATABASE, create_schema
+
+    parser = argparse.ArgumentParser(description='变更日志维护')
+    parser.add_argument('command', choices=['stats', 'compact', 'tail'])
+    parser.add_argument('--database', default=DATABASE)
+    parser.add_argument('--keep-days', type=int, default=CHANGE_RETENTION_DAYS, help='compact 保留的天数')
+    parser.add_argument('--after', type=int, default=None, help='tail 的起始 seq，默认最近 --limit 条')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--table', action='append', default=[])
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    create_schema(conn)
+    if args.command == 'stats':
+        stats = change_stats(conn)
+        print('变更 %(entries)d 条，seq %(first_seq)s ~ %(last_seq)d，已压缩到 %(compacted_through)d' % stats)
+        for table, count in stats['tables'].items():
+            print('  %-12s %d' % (table, count))
+    elif args.command == 'compact':
+        deleted = compact(conn, args.keep_days)
+        print('已删除 %d 条 %d 天前的变更，压缩位置 %d' % (deleted, args.keep_days, compacted_through(conn)))
+    else:
+        after = args.after if args.after is not None else max(compacted_through(conn), last_seq(conn) - args.limit)
+        try:
+            batch = changes_after(conn, after, args.limit, parse_tables(args.table))
+        except (ChangesCompacted, ValueError) as e:
+            parser.exit(1, '%s\n' % e)
+        for change in batch['changes']:
+            print('%(seq)8d %(changed_at)s %(op)s %(table)s#%(id)d' % change,
+                  json.dumps(change['data'], ensure_ascii=False) if change['data'] else '')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
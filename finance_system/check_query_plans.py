@@ -0,0 +1,172 @@
+"""查询计划回归检查：以各个角色访问全部 GET 路由，记录实际执行的 SQL，再加上 app.py 中直接写在 execute() 里的
+常量 SQL（POST 路由的语句，不实际执行），逐条 EXPLAIN QUERY PLAN。计划中出现全表扫描（SCAN 且没有用索引）
+或临时 B 树（USE TEMP B-TREE，排序/分组/去重）而又不在 ALLOWED_PLANS 中时判为失败，退出码为 1。
+
+模板只渲染视图传入的数据，不直接执行 SQL；上下文处理器（侧栏通知、身份刷新）的查询随页面请求一并记录。
+计划与数据量和统计信息有关，应在 gen_data.py 生成的数据库上运行（会执行 GET 路由，可能顺带刷新汇总表）。
+
+用法：python check_query_plans.py [--database hr_system_bench.db] [--login admin:admin123 ...] [--verbose]
+"""
+import argparse
+import ast
+import logging
+import os
+import sqlite3
+import sys
+
+import db
+from bench_routes import discover_routes
+
+PLANNED = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# 允许的计划：(语句片段, 计划行前缀, 原因)。语句片段在空白规整后的 SQL 中匹配，
+# 计划行前缀为 None 表示该语句的全部计划行都允许
+ALLOWED_PLANS = [
+    ('FROM sqlite_', 'SCAN sqlite_', '系统表'),
+    ('FROM dashboard_stats', 'SCAN dashboard_stats', '工作台统计物化表只有几行'),
+    ('FROM salary_monthly_bands', None, '薪资分布聚合表（月份 × 部门 × 档位），分位数计算在很小的中间结果上排序'),
+    ('FROM departments d LEFT JOIN employees e ON d.id = e.department_id GROUP BY d.id ORDER BY d.name', None,
+     '部门表很小，按部门分组计数后按名称排序'),
+    ('WHERE e.role IN (', 'USE TEMP B-TREE FOR ORDER BY', '多个角色的 IN 查询无法按姓名有序合并，排序的只是候选上级'),
+    ('FROM payroll_runs r', 'SCAN r', '按主键倒序取最近几次核算，取满 LIMIT 即停止'),
+    ('FROM employee_closure WHERE ancestor_id = ? AND depth > 0', 'USE TEMP B-TREE FOR ORDER BY',
+     '下属集合来自闭包表，分页前在下属范围内排序'),
+    ('ORDER BY c.depth, e.name', 'USE TEMP B-TREE FOR RIGHT PART OF ORDER BY',
+     '下属列表 API 按层级走索引，同一层内按姓名排序'),
+    ('COUNT(r.day) as days_present', 'SCAN e', '月度考勤报表每个员工一行，本来就要遍历员工'),
+]
+
+
+def normalize(sql):
+    return ' '.join(sql.split())
+
+
+def problems(plan):
+    """计划中的全表扫描和临时 B 树"""
+    found = []
+    for row in plan:
+        detail = row[3]
+        if 'USE TEMP B-TREE' in detail:
+            found.append(detail)
+        elif detail.startswith('SCAN ') and not detail.startswith('SCAN (subquery-') \
+                and 'USING' not in detail and 'VIRTUAL TABLE' not in detail and detail != 'SCAN CONSTANT ROW':
+            found.append(detail)
+    return found
+
+
+def allowed(sql, detail):
+    for fragment, prefix, reason in ALLOWED_PLANS:
+        if fragment in sql and (prefix is None or detail.startswith(prefix)):
+            return fragment
+    return None
+
+
+def static_statements(path):
+    """app.py 中 execute()/executemany() 的常量 SQL -> 行号"""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    statements = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and node.func.attr in ('execute', 'executemany') and node.args \
+                and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):
+            statements.setdefault(normalize(node.args[0].value), 'app.py:%d' % node.lineno)
+    return statements
+
+
+def capture(app, database, logins):
+    """以每个账号访问全部 GET 路由，记录执行过的 SQL -> (参数, 来源路由)"""
+    captured = {}
+    current = ['login']
+
+    def hook(conn, sql, parameters, elapsed):
+        params, sources = captured.setdefault(normalize(sql), (parameters, set()))
+        sources.add(current[0])
+
+    db.add_query_hook(hook)
+    routes = discover_routes(app, database)
+    for login in logins:
+        username, password = login.split(':', 1)
+        client = app.test_client()
+        current[0] = 'login'
+        response = client.post('/login', data={'username': username, 'password': password})
+        if response.status_code != 302 or response.headers.get('Location', '').endswith('/login'):
+            print('账号 %s 登录失败，跳过' % username)
+            continue
+        for endpoint, path in routes:
+            current[0] = endpoint
+            response = client.get(path)
+            response.get_data()
+            response.close()
+            if response.status_code >= 500:
+                print('%s 以 %s 访问返回 %d' % (path, username, response.status_code))
+    return captured
+
+
+def check(database, logins, verbose=False):
+    """返回失败的语句数"""
+    from app import app
+
+    app.config['DATABASE'] = database
+    app.config['TESTING'] = True
+    logging.getLogger('hr_system.slow_query').setLevel(logging.ERROR)
+
+    statements = {sql: (params, sorted(sources)) for sql, (params, sources) in
+                  capture(app, database, logins).items()}
+    for sql, location in static_statements(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')).items():
+        statements.setdefault(sql, (None, [location]))
+
+    conn = sqlite3.connect(db.readonly_uri(database), uri=True)
+    failures, used = 0, set()
+    checked = 0
+    for sql, (params, sources) in statements.items():
+        if not sql.upper().startswith(PLANNED):
+            continue
+        if params is None or not isinstance(params, (list, tuple, dict)):
+            params = [None] * sql.count('?')
+        try:
+            plan = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+        except sqlite3.Error as e:
+            print('无法分析（%s）：%s\n    %s' % (e, ', '.join(sources), sql[:200]))
+            failures += 1
+            continue
+        checked += 1
+        bad = []
+        for detail in problems(plan):
+            fragment = allowed(sql, detail)
+            if fragment is None:
+                bad.append(detail)
+            else:
+                used.add(fragment)
+        if bad or verbose:
+            print('%s %s\n    %s' % ('失败' if bad else '通过', ', '.join(sources), sql[:300]))
+            for row in plan:
+                print('    %s %s' % ('✗' if row[3] in bad else ' ', row[3]))
+        failures += bool(bad)
+    conn.close()
+
+    for fragment, prefix, reason in ALLOWED_PLANS:
+        if fragment not in used:
+            print('提示：白名单「%s」本次没有用到，相应查询可能已经改掉' % fragment[:60])
+    print('检查 %d 条语句，%d 条失败' % (checked, failures))
+    return failures
+
+
+def main():
+    from gen_data import BENCH_PASSWORD, BENCH_USERS
+
+    parser = argparse.ArgumentParser(description='查询计划回归检查')
+    parser.add_argument('--database', default='hr_system_bench.db')
+    parser.add_argument('--login', action='append',
+                        help='user:password，可重复；默认管理员和 gen_data.py 生成的各角色账号')
+    parser.add_argument('--verbose', action='store_true', help='打印全部语句的计划')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database):
+        parser.error('%s 不存在，请先运行 gen_data.py 生成数据' % args.database)
+    logins = args.login or ['admin:admin123'] + ['%s:%s' % (user, BENCH_PASSWORD) for user in BENCH_USERS]
+    sys.exit(1 if check(args.database, logins, args.verbose) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""打卡写缓冲（group commit）：请求线程把打卡放入有界队列，后台线程每 N 毫秒或攒满 M 条
+用一个事务 executemany 写入，提交后逐条确认；队列满时直接拒绝，由调用方返回 503 让客户端重试。
+整批违反约束时逐条重试，只有出错的打卡失败；写线程意外退出后不再接收新的打卡
+"""
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from attendance_rollup import refresh_dirty
+from db import connect
+
+CLOCK_IN_TYPES = ('上班', '下班', '外勤')
+
+INSERT_PUNCH = 'INSERT INTO attendance (employee_id, type, timestamp) VALUES (?, ?, ?)'
+
+
+logger = logging.getLogger('hr_system.clockin')
+
+
+class QueueFull(Exception):
+    """写缓冲已满"""
+
+
+class WriterStopped(QueueFull):
+    """写线程已退出，打卡无法写入"""
+
+
+class Punch:
+    """一条待写入的打卡；写入提交（或失败）后 done 被置位"""
+
+    __slots__ = ('row', 'queued_at', 'done', 'error', 'batch_size', 'committed_at')
+
+    def __init__(self, row):
+        self.row = row
+        self.queued_at = time.monotonic()
+        self.done = threading.Event()
+        self.error = None
+        self.batch_size = 0
+        self.committed_at = None
+
+    def wait(self, timeout=None):
+        """等待写入确认；超时返回 False（打卡仍在队列中，稍后会写入）"""
+        if not self.done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+    @property
+    def latency(self):
+        return self.committed_at - self.queued_at if self.committed_at else None
+
+
+class PunchBuffer:
+    """有界打卡队列 + 单个后台写线程"""
+
+    def __init__(self, database, profile=None, batch_size=500, flush_interval=0.002, max_queue=10000):
+        self.database = database
+        self.profile = profile
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(max_queue)
+        self._closed = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self.accepted = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.written = 0
+        self.failed = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name='punch-buffer', daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def submit(self, employee_id, att_type, timestamp):
+        """放入队列并立即返回 Punch，调用方用 punch.wait() 等待写入确认"""
+        if self._closed.is_set():
+            raise QueueFull('写缓冲已关闭')
+        self._ensure_started()
+        if not self._thread.is_alive():
+            raise WriterStopped('打卡写线程已停止，请联系管理员')
+        punch = Punch((employee_id, att_type, timestamp))
+        try:
+            self._queue.put_nowait(punch)
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise QueueFull('打卡队列已满，请稍后重试')
+        with self._stats_lock:
+            self.accepted += 1
+        if not self._thread.is_alive():
+            # 入队的同时写线程退出了：它已经不会再取队列
+            self._drain(WriterStopped('打卡写线程已停止，请联系管理员'))
+        return punch
+
+    def _collect(self):
+        """阻塞到第一条打卡，取走队列中已有的打卡，再在 flush_interval 内尽量凑满一批"""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _fail(self, punches, error):
+        self.failed += len(punches)
+        for punch in punches:
+            punch.error = error
+            punch.done.set()
+
+    def _flush(self, conn, batch):
+        """一个事务写入一批；整批违反约束时逐条重试，只让出错的打卡失败"""
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(INSERT_PUNCH, [punch.row for punch in batch])
+            conn.commit()
+            written = batch
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            written = self._flush_each(conn, batch)
+        except Exception as e:
+            conn.rollback()
+            self._fail(batch, e)
+            return
+        committed_at = time.monotonic()
+        self.flushes += 1
+        self.written += len(written)
+        for punch in written:
+            punch.batch_size = len(written)
+            punch.committed_at = committed_at
+            punch.done.set()
+
+    def _flush_each(self, conn, batch):
+        """逐条写入（同一个事务），返回写入成功的打卡；失败的打卡带着各自的错误确认"""
+        written, failed = [], []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for punch in batch:
+                try:
+                    conn.execute(INSERT_PUNCH, punch.row)
+                    written.append(punch)
+                except sqlite3.IntegrityError as e:
+                    punch.error = e
+                    failed.append(punch)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            self._fail(batch, e)
+            return []
+        self.failed += len(failed)
+        for punch in failed:
+            punch.done.set()
+        return written
+
+    def _run(self):
+        try:
+            self._write_loop()
+        except Exception as e:
+            # 写线程退出后 submit 拒绝新的打卡；已在队列中的打卡以错误确认，不让请求等到超时
+            logger.exception('打卡写线程异常退出')
+            self._drain(e)
+
+    def _drain(self, error):
+        while True:
+            try:
+                punch = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._fail([punch], error)
+
+    def _write_loop(self):
+        conn = connect(self.database, self.profile, check_same_thread=False)
+        pending_rollup = False
+        try:
+            while not (self._closed.is_set() and self._queue.empty()):
+                batch = self._collect()
+                if batch:
+                    self._flush(conn, batch)
+                    pending_rollup = True
+                # 考勤汇总在队列空闲时再重算，不占用高峰期的写入
+                if pending_rollup and self._queue.empty():
+                    try:
+                        refresh_dirty(conn)
+                        pending_rollup = False
+                    except Exception:
+                        conn.rollback()
+        finally:
+            conn.close()
+
+    def close(self, timeout=5.0):
+        """停止接收，写完队列中剩余的打卡"""
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'flushes': self.flushes,
+            'written': self.written,
+            'failed': self.failed,
+            'writer_alive': self._thread is not None and self._thread.is_alive(),
+            'avg_batch': round(self.written / self.flushes, 1) if self.flushes else 0.0,
+        }
+
+
+_buffer_lock = threading.Lock()
+
+
+def get_punch_buffer(app):
+    """获取（必要时创建）应用的打卡写缓冲，进程退出前写完剩余打卡"""
+    buffer = app.extensions.get('punch_buffer')
+    if buffer is not None:
+        return buffer
+    with _buffer_lock:
+        buffer = app.extensions.get('punch_buffer')
+        if buffer is None:
+            buffer = PunchBuffer(
+                app.config['DATABASE'],
+                profile=app.config.get('DB_STORAGE_PROFILE'),
+                batch_size=app.config.get('CLOCKIN_BATCH_SIZE', 500),
+                flush_interval=app.config.get('CLOCKIN_FLUSH_MS', 2) / 1000.0,
+                max_queue=app.config.get('CLOCKIN_QUEUE_SIZE', 10000),
+            )
+            atexit.register(buffer.close)
+            app.extensions['punch_buffer'] = buffer
+    return buffer
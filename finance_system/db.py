@@ -0,0 +1,473 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from urllib.request import pathname2url
+
+from flask import current_app, g, has_request_context, request
+
+# 默认存储参数：WAL 让读写互不阻塞，busy_timeout 让写者排队而不是直接报错
+DEFAULT_STORAGE_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,       # 负数单位为 KiB，约 16MB
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,       # 毫秒
+    'busy_retries': 5,          # busy_timeout 之后仍锁定时的重试次数
+    'busy_backoff': 0.05,       # 首次重试等待秒数，之后指数增长
+}
+
+# SQLite 的 PRAGMA 取值只能内联，这里只接受白名单内的值
+_PRAGMA_CHOICES = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY'},
+}
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+# 连接角色：只读连接（mode=ro + query_only，读 WAL 快照）与写连接（小连接池，写者在池中排队）
+READER = 'reader'
+WRITER = 'writer'
+SAFE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+
+class PoolTimeout(Exception):
+    """连接池等待超时"""
+
+
+def is_busy_error(exc):
+    """判断是否为 SQLITE_BUSY / SQLITE_LOCKED 错误"""
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    code = getattr(exc, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(exc)
+    return 'locked' in message or 'busy' in message
+
+
+def retry_on_busy(fn, retries=5, backoff=0.05):
+    """执行 fn，遇到数据库锁定时按指数退避（带抖动）重试"""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if attempt == retries or not is_busy_error(e):
+                raise
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+
+# 语句完成后的回调 hook(conn, sql, parameters, elapsed)，用于计数、计时和慢查询日志；
+# elapsed 包括取结果行的时间（见 TimedCursor）
+_query_hooks = []
+
+
+def add_query_hook(hook):
+    if hook not in _query_hooks:
+        _query_hooks.append(hook)
+
+
+def _notify(conn, sql, parameters, elapsed):
+    for hook in _query_hooks:
+        hook(conn, sql, parameters, elapsed)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """累计语句执行和取行的耗时，结果取完或游标关闭时通知 hook
+
+    大结果集的大部分时间花在 fetchall/fetchmany 上，只计 execute() 会低估正是需要发现的慢查询；
+    这里只累计 SQLite 本身的耗时，两次取行之间调用方的处理时间不计入。
+    没有取完就丢弃的游标（如 fetchone 取单行）由连接在下一条语句、提交、请求结束或归还时结束计时
+    （PooledConnection.finish_query），不依赖垃圾回收。
+    """
+
+    _query = None
+
+    def start(self, sql, parameters, elapsed):
+        if self.description is None:
+            # 不返回行的语句（写入、DDL）执行完即结束
+            _notify(self.connection, sql, parameters, elapsed)
+        else:
+            self._query = self.connection._open_query = [sql, parameters, elapsed]
+
+    def _timed(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            result = fetch(*args)
+        finally:
+            if self._query is not None:
+                self._query[2] += time.perf_counter() - started
+        return result
+
+    def _finish(self):
+        query, self._query = self._query, None
+        # 连接已经结束过这条语句的计时（执行了下一条语句）时不再重复通知
+        if query is not None and self.connection._open_query is query:
+            self.connection.finish_query()
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(super().fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def close(self):
+        self._finish()
+        super().close()
+
+
+class PooledConnection(sqlite3.Connection):
+    """连接池中的连接：写语句和提交在锁定时自动重试，语句完成后通知已注册的 hook"""
+
+    busy_retries = DEFAULT_STORAGE_PROFILE['busy_retries']
+    busy_backoff = DEFAULT_STORAGE_PROFILE['busy_backoff']
+    _open_query = None  # 最近一条还没取完结果的查询 [sql, 参数, 已累计耗时]
+
+    def finish_query(self):
+        """结束最近一条还没取完结果的查询的计时并通知 hook"""
+        query, self._open_query = self._open_query, None
+        if query is not None:
+            _notify(self, *query)
+
+    def execute(self, sql, parameters=()):
+        if not _query_hooks:
+            return retry_on_busy(lambda: super(PooledConnection, self).execute(sql, parameters),
+                                 self.busy_retries, self.busy_backoff)
+        self.finish_query()
+        cursor = self.cursor(TimedCursor)
+        started = time.perf_counter()
+        retry_on_busy(lambda: cursor.execute(sql, parameters), self.busy_retries, self.busy_backoff)
+        cursor.start(sql, parameters, time.perf_counter() - started)
+        return cursor
+
+    def executemany(self, sql, seq_of_parameters):
+        # 参数可能是生成器，重试前先物化
+        if not isinstance(seq_of_parameters, (list, tuple)):
+            seq_of_parameters = list(seq_of_parameters)
+        self.finish_query()
+        started = time.perf_counter()
+        cursor = retry_on_busy(lambda: super(PooledConnection, self).executemany(sql, seq_of_parameters),
+                               self.busy_retries, self.busy_backoff)
+        if _query_hooks:
+            _notify(self, sql, None, time.perf_counter() - started)
+        return cursor
+
+    def commit(self):
+        self.finish_query()
+        return retry_on_busy(super().commit, self.busy_retries, self.busy_backoff)
+
+
+def apply_storage_profile(conn, profile=None, readonly=False):
+    """在连接上应用存储参数（每个新连接都要执行一次）；只读连接不改 journal_mode（由写连接持久化）"""
+    profile = {**DEFAULT_STORAGE_PROFILE, **(profile or {})}
+    # busy_timeout 必须最先设置，后续 PRAGMA 本身也可能遇到锁
+    conn.execute('PRAGMA busy_timeout = %d' % int(profile['busy_timeout']))
+    if readonly:
+        conn.execute('PRAGMA query_only = 1')
+    for name in ('synchronous', 'temp_store') if readonly else ('journal_mode', 'synchronous', 'temp_store'):
+        value = str(profile[name]).upper()
+        if value not in _PRAGMA_CHOICES[name]:
+            raise ValueError('无效的 %s 取值：%s' % (name, profile[name]))
+        conn.execute('PRAGMA %s = %s' % (name, value)).fetchall()
+    conn.execute('PRAGMA cache_size = %d' % int(profile['cache_size']))
+    conn.execute('PRAGMA mmap_size = %d' % int(profile['mmap_size'])).fetchall()
+    if isinstance(conn, PooledConnection):
+        conn.busy_retries = int(profile['busy_retries'])
+        conn.busy_backoff = float(profile['busy_backoff'])
+    return conn
+
+
+def readonly_uri(database):
+    return 'file:%s?mode=ro' % pathname2url(os.path.abspath(database))
+
+
+def connect(database, profile=None, readonly=False, **kwargs):
+    """按存储参数打开一个连接（连接池和命令行脚本共用）
+
+    readonly=True 时以 mode=ro URI 打开并开启 query_only，任何写入都会直接报错。
+    """
+    kwargs.setdefault('factory', PooledConnection)
+    if readonly:
+        conn = sqlite3.connect(readonly_uri(database), uri=True, **kwargs)
+    else:
+        conn = sqlite3.connect(database, **kwargs)
+    conn.row_factory = sqlite3.Row
+    if isinstance(conn, PooledConnection):
+        conn.role = READER if readonly else WRITER
+    return apply_storage_profile(conn, profile, readonly)
+
+
+class ConnectionPool:
+    """SQLite 连接池：按线程复用、限制最大连接数、借出前做健康检查；role 为 READER 时只打开只读连接"""
+
+    def __init__(self, database, max_size=8, timeout=5.0, check_interval=30.0, profile=None, role=WRITER):
+        self.database = database
+        self.profile = profile
+        self.role = role
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()        # (conn, 上次使用线程, 归还时间)
+        self._size = 0              # 已创建且未丢弃的连接数
+        self._local = threading.local()
+
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.discarded = 0
+        self.hold_time = 0.0        # 连接借出的累计时长，只读连接偏高说明有长报表
+
+    def _connect(self):
+        return connect(self.database, self.profile, readonly=self.role == READER, check_same_thread=False)
+
+    def _healthy(self, conn, idle_since):
+        """空闲超过 check_interval 的连接先 SELECT 1 确认可用"""
+        if time.monotonic() - idle_since < self.check_interval:
+            return True
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _take_idle(self):
+        """优先取回本线程上次用过的连接，否则取最近归还的"""
+        ident = threading.get_ident()
+        for i, item in enumerate(self._idle):
+            if item[1] == ident:
+                del self._idle[i]
+                return item
+        return self._idle.pop()
+
+    def acquire(self):
+        """借出一个连接，池满时最多等待 timeout 秒"""
+        deadline = None
+        with self._cond:
+            while True:
+                while self._idle:
+                    conn, _, idle_since = self._take_idle()
+                    if self._healthy(conn, idle_since):
+                        self.hits += 1
+                        conn.acquired_at = time.monotonic()
+                        return conn
+                    self._discard(conn)
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    self.misses += 1
+                    break
+
+                if deadline is None:
+                    self.waits += 1
+                    started = time.monotonic()
+                    deadline = started + self.timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.wait_time += time.monotonic() - started
+                    raise PoolTimeout('数据库连接池（%s）已满，等待超时' % self.role)
+                self._cond.wait(remaining)
+                self.wait_time += time.monotonic() - started
+                started = time.monotonic()
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        conn.acquired_at = time.monotonic()
+        return conn
+
+    def release(self, conn):
+        """归还连接；未提交的事务（包括只读连接的快照）一律回滚"""
+        held = time.monotonic() - getattr(conn, 'acquired_at', time.monotonic())
+        with self._cond:
+            self.hold_time += held
+        try:
+            conn.finish_query()
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append((conn, threading.get_ident(), time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        self._size -= 1
+        self.discarded += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        """关闭所有空闲连接（借出中的连接归还后仍可继续使用）"""
+        with self._cond:
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._discard(conn)
+
+    def stats(self):
+        """连接池指标"""
+        with self._cond:
+            total = self.hits + self.misses
+            return {
+                'role': self.role,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 4),
+                'discarded': self.discarded,
+                'hold_time': round(self.hold_time, 4),
+            }
+
+
+_pool_lock = threading.Lock()
+
+
+def get_pool(app=None, role=WRITER):
+    """获取（必要时创建）应用的读或写连接池"""
+    app = app or current_app
+    pools = app.extensions.setdefault('db_pools', {})
+    pool = pools.get(role)
+    if pool is not None:
+        return pool
+
+    if role == READER:
+        # 写连接池建池时补齐表结构并把数据库切到 WAL，只读连接要在这之后打开
+        get_pool(app, WRITER)
+
+    with _pool_lock:
+        pool = pools.get(role)
+        if pool is None:
+            pool = ConnectionPool(
+                app.config['DATABASE'],
+                max_size=app.config.get('DB_POOL_SIZE' if role == READER else 'DB_WRITER_POOL_SIZE', 8),
+                timeout=app.config.get('DB_POOL_TIMEOUT', 5.0),
+                check_interval=app.config.get('DB_POOL_CHECK_INTERVAL', 30.0),
+                profile=app.config.get('DB_STORAGE_PROFILE'),
+                role=role,
+            )
+
+            # 首次建池时补齐表结构和索引（对已有数据库相当于在线迁移）
+            schema = app.extensions.get('db_schema')
+            if role == WRITER and schema is not None:
+                conn = pool.acquire()
+                try:
+                    schema(conn)
+                finally:
+                    pool.release(conn)
+            pools[role] = pool
+    return pool
+
+
+def pool_stats(app=None):
+    """各角色连接池的指标"""
+    app = app or current_app
+    return {role: get_pool(app, role).stats() for role in (READER, WRITER)}
+
+
+def writes(f):
+    """标记会写数据库的 GET 视图（如删除链接），get_db() 为其分配写连接"""
+    f.db_writes = True
+    return f
+
+
+def _request_writes():
+    """当前请求是否需要写连接：请求之外、非 GET/HEAD/OPTIONS 请求或用 @writes 标记过的视图"""
+    if not has_request_context() or request.method not in SAFE_METHODS:
+        return True
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'db_writes', False)
+
+
+def get_read_db():
+    """只读连接（同一请求内复用）：借出时开启读事务，请求内的所有查询读同一个 WAL 快照，
+    长报表既不阻塞写入，也不会读到报表生成过程中提交的半截数据"""
+    if 'read_db' not in g:
+        conn = get_pool(role=READER).acquire()
+        # 绕过查询 hook，不计入每请求查询数
+        sqlite3.Connection.execute(conn, 'BEGIN')
+        g.read_db = conn
+    return g.read_db
+
+
+def get_write_db():
+    """写连接（同一请求内复用）"""
+    if 'db' not in g:
+        g.db = get_pool(role=WRITER).acquire()
+    return g.db
+
+
+def get_db():
+    """获取当前请求的数据库连接：只读请求分到只读连接，写请求分到写连接"""
+    return get_write_db() if _request_writes() else get_read_db()
+
+
+def finish_queries():
+    """结束当前请求的连接上还没取完结果的查询计时（请求计数、Server-Timing 统计前调用）"""
+    for key in ('db', 'read_db'):
+        conn = g.get(key)
+        if conn is not None:
+            conn.finish_query()
+
+
+def close_db(exc=None):
+    """应用上下文结束时把连接还给各自的连接池"""
+    for key, role in (('db', WRITER), ('read_db', READER)):
+        conn = g.pop(key, None)
+        if conn is not None:
+            get_pool(role=role).release(conn)
+
+
+def init_app(app, schema=None):
+    """注册连接池配置和请求结束时的归还钩子
+
+    schema 为建表函数，接收一个连接，在写连接池创建时执行一次。
+    DB_POOL_SIZE 为只读连接数（每个请求线程最多占一个，应不小于线程数），DB_WRITER_POOL_SIZE 为写连接数。
+    """
+    app.extensions['db_schema'] = schema
+    app.config.setdefault('DB_POOL_SIZE', 8)
+    app.config.setdefault('DB_WRITER_POOL_SIZE', 2)
+    app.config.setdefault('DB_POOL_TIMEOUT', 5.0)
+    app.config.setdefault('DB_POOL_CHECK_INTERVAL', 30.0)
+    app.config.setdefault('DB_STORAGE_PROFILE', dict(DEFAULT_STORAGE_PROFILE))
+    app.teardown_appcontext(close_db)
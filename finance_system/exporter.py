@@ -0,0 +1,115 @@
+"""考勤、薪资、员工数据流式导出（CSV / NDJSON，可选 gzip），内存中最多保留一批数据"""
+import csv
+import io
+import json
+import zlib
+
+from pagination import date_range_clauses
+
+EXPORT_BATCH_SIZE = 1000
+
+# 导出类型 -> (SELECT 语句, 日期筛选列)
+EXPORTS = {
+    'attendance': ('''
+        SELECT a.id, a.employee_id, e.name as emp_name, e.department_id, a.type, a.timestamp
+        FROM attendance a
+        JOIN employees e ON a.employee_id = e.id
+    ''', 'a.timestamp'),
+    'salaries': ('''
+        SELECT s.id, s.employee_id, e.name as emp_name, e.department_id,
+               s.base_salary, s.bonus, s.deduction, s.total, s.pay_date
+        FROM salaries s
+        JOIN employees e ON s.employee_id = e.id
+    ''', 's.pay_date'),
+    'employees': ('''
+        SELECT e.id, e.name, e.gender, e.phone, e.email, e.department_id, d.name as dept_name,
+               e.position_id, p.title as pos_title, e.manager_id, e.role, e.join_date, e.created_at
+        FROM employees e
+        LEFT JOIN departments d ON e.department_id = d.id
+        LEFT JOIN positions p ON e.position_id = p.id
+    ''', 'e.join_date'),
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def export_query(kind, args):
+    """按日期范围和部门筛选生成导出 SQL
+
+    有日期筛选时按 (日期列, 主键) 输出，直接沿日期索引读取范围内的行；否则按主键顺序输出
+    """
+    select_sql, date_column = EXPORTS[kind]
+    alias = date_column.split('.')[0]
+    clauses, params = date_range_clauses(date_column, args.get('date_from'), args.get('date_to'))
+    by_date = bool(clauses)
+    try:
+        department_id = int(args.get('department_id', ''))
+    except ValueError:
+        department_id = None
+    if department_id is not None:
+        clauses.append('e.department_id = ?')
+        params.append(department_id)
+
+    sql = select_sql
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    if by_date:
+        sql += ' ORDER BY %s, %s.id' % (date_column, alias)
+    else:
+        sql += ' ORDER BY %s.id' % alias
+    return sql, params
+
+
+def iter_batches(cursor, batch_size=EXPORT_BATCH_SIZE):
+    """游标逐批读取，每次只在内存中保留一批"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def _csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # 带 BOM，Excel 直接打开不乱码
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(tuple(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(columns, batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows)
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31：gzip 格式
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(conn, kind, args, fmt='csv', gzip=False, batch_size=EXPORT_BATCH_SIZE):
+    """生成导出内容的字节流"""
+    sql, params = export_query(kind, args)
+    cursor = conn.execute(sql, params)
+    columns = [col[0] for col in cursor.description]
+    batches = iter_batches(cursor, batch_size)
+    texts = _ndjson_chunks(columns, batches) if fmt == 'ndjson' else _csv_chunks(columns, batches)
+    chunks = (text.encode('utf-8') for text in texts if text)
+    return _gzip_chunks(chunks) if gzip else chunks
+
+
+def export_filename(kind, fmt, gzip=False):
+    return '%s.%s%s' % (kind, fmt, '.gz' if gzip else '')
@@ -0,0 +1,319 @@
+"""合成数据生成器：按规模生成部门、岗位、多级上下级员工、多年考勤打卡和月度薪资，供压测使用
+
+打卡与薪资在去掉二级索引和触发器的情况下分批写入，写完后由 create_schema() 重建索引和触发器，
+考勤日汇总在生成时直接算出（与 summarize_day() 结果一致），统计表和闭包表最后统一重建。
+
+用法：python gen_data.py [--scale small|medium|large] [--employees N] [--years 2] [--database hr_system_bench.db]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from attendance_rollup import WORK_START, workdays
+from db import connect
+from init_db import DATABASE, create_schema
+from stats import rebuild_stats
+
+SCALES = {'small': 1000, 'medium': 10000, 'large': 100000}
+INSERT_BATCH_SIZE = 50000
+FANOUT = 8                   # 每个上级的直属下属数
+ABSENCE_RATE = 0.03
+LATE_RATE = 0.08
+FIELD_RATE = 0.03            # 以外勤代替上班签到的比例
+
+# 写入期间不需要崩溃保护，关闭日志和同步
+LOAD_PROFILE = {'journal_mode': 'OFF', 'synchronous': 'OFF', 'cache_size': -262144, 'temp_store': 'FILE'}
+
+DEPARTMENTS = ['人事部', '技术部', '市场部', '财务部', '销售部', '运营部', '产品部', '客服部',
+               '法务部', '采购部', '行政部', '研发中心']
+POSITIONS = [('经理', 'M1'), ('主管', 'M2'), ('组长', 'L1'), ('员工', 'E1')]
+# 层级 -> (角色, 岗位, 基本工资区间)
+LEVELS = [
+    ('领导', '经理', (30000, 45000)),
+    ('主管', '主管', (18000, 28000)),
+    ('组长', '组长', (12000, 18000)),
+    ('普通职员', '员工', (6000, 12000)),
+]
+INTERN = ('实习生', '员工', (3000, 4500))
+INTERN_RATE = 0.1
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈'
+GIVEN = '伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰萍红鹏辉飞鑫宇浩晨阳婷雪琳欣怡佳'
+NOTICE_PRIORITIES = ('normal', 'normal', 'normal', 'high')
+
+# 压测登录账号：用户名 -> 对应员工的角色（密码统一为 bench123，管理员沿用 admin/admin123）
+BENCH_USERS = {
+    'bench_leader': '领导',
+    'bench_supervisor': '主管',
+    'bench_staff': '普通职员',
+    'bench_intern': '实习生',
+}
+BENCH_PASSWORD = 'bench123'
+
+# 一天内每一秒对应的 HH:MM:SS，避免在热循环里格式化时间
+TIME_OF_DAY = ['%02d:%02d:%02d' % (s // 3600, s // 60 % 60, s % 60) for s in range(86400)]
+
+
+def _seconds(hms):
+    h, m, s = (int(part) for part in hms.split(':'))
+    return h * 3600 + m * 60 + s
+
+
+WORK_START_SECONDS = _seconds(WORK_START)
+
+
+def _batched(rows, size=INSERT_BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_rows(conn, sql, rows):
+    count = 0
+    for batch in _batched(rows):
+        conn.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+def drop_derived_objects(conn):
+    """删除全部二级索引和触发器，由 create_schema() 在写入结束后重建"""
+    objects = conn.execute('''
+        SELECT type, name FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+    ''').fetchall()
+    for kind, name in objects:
+        conn.execute('DROP %s IF EXISTS "%s"' % (kind.upper(), name))
+    conn.commit()
+
+
+def build_employees(rng, count, department_ids, position_ids, start):
+    """生成员工行：各部门内按 FANOUT 组成多级上下级树，层级决定角色和岗位"""
+    rows, salary_ranges = [], {}
+    per_department = [count // len(department_ids) + (1 if i < count % len(department_ids) else 0)
+                      for i in range(len(department_ids))]
+    employee_id = 0
+    for department_id, size in zip(department_ids, per_department):
+        first_id, depths = employee_id + 1, []
+        for k in range(size):
+            employee_id += 1
+            if k == 0:
+                manager_id, depth = None, 0
+            else:
+                parent = (k - 1) // FANOUT
+                manager_id, depth = first_id + parent, depths[parent] + 1
+            depths.append(depth)
+            role, position, salary_range = LEVELS[min(depth, len(LEVELS) - 1)]
+            if depth >= len(LEVELS) - 1 and rng.random() < INTERN_RATE:
+                role, position, salary_range = INTERN
+            # 管理层和六成员工在统计区间开始前入职，其余在区间内陆续入职
+            if depth < 2 or rng.random() < 0.6:
+                join_date = start - timedelta(days=rng.randrange(1, 5 * 365))
+            else:
+                join_date = start + timedelta(days=rng.randrange(0, max(1, (date.today() - start).days)))
+            name = rng.choice(SURNAMES) + ''.join(rng.choice(GIVEN) for _ in range(rng.randint(1, 2)))
+            rows.append((
+                employee_id, name, rng.choice(('男', '女')), '1%010d' % rng.randrange(10 ** 10),
+                'emp%d@company.com' % employee_id, department_id, position_ids[position], manager_id,
+                role, join_date.isoformat(), join_date.isoformat() + ' 09:00:00',
+            ))
+            salary_ranges[employee_id] = salary_range
+    return rows, salary_ranges
+
+
+ON_TIME_FROM = 8 * 3600 + 15 * 60
+CHECK_OUT_FROM = 17 * 3600 + 30 * 60
+
+
+def attendance_day(rng, active, day):
+    """生成一天内在职员工的打卡，每人一行：(员工, 日期, 签到类型, 签到, 签退, 工作分钟, 迟到分钟)
+
+    汇总字段按 summarize_day() 的规则直接算出，签到/签退两条原始打卡再由 SQL 从这一行展开。
+    """
+    rows = []
+    random_ = rng.random
+    on_time_span = WORK_START_SECONDS - ON_TIME_FROM + 1
+    for employee_id in active:
+        if random_() < ABSENCE_RATE:
+            continue
+        if random_() < LATE_RATE:
+            seconds_in = WORK_START_SECONDS + 1 + int(random_() * 1800)
+            late = max(1, (seconds_in - WORK_START_SECONDS) // 60)
+        else:
+            seconds_in = ON_TIME_FROM + int(random_() * on_time_span)
+            late = 0
+        seconds_out = CHECK_OUT_FROM + int(random_() * 7200)
+        rows.append((employee_id, day, '外勤' if random_() < FIELD_RATE else '上班',
+                     TIME_OF_DAY[seconds_in], TIME_OF_DAY[seconds_out], (seconds_out - seconds_in) // 60, late))
+    return rows
+
+
+def salary_rows(rng, employees, salary_ranges, months):
+    """每月末为在职员工生成一条薪资（金额按分计算）"""
+    for pay_date in months:
+        for row in employees:
+            employee_id, join_date = row[0], row[9]
+            if join_date > pay_date:
+                continue
+            low, high = salary_ranges[employee_id]
+            base = rng.randrange(low, high + 1, 100) * 100
+            bonus = rng.choice((0, 0, 50000, 100000, 200000))
+            deduction = rng.choice((0, 0, 0, 5000, 10000))
+            yield employee_id, base / 100, bonus / 100, deduction / 100, (base + bonus - deduction) / 100, pay_date
+
+
+def month_ends(start, end):
+    """[start, end] 内每个月的最后一天"""
+    result, month = [], start.replace(day=1)
+    while True:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        last_day = next_month - timedelta(days=1)
+        if last_day > end:
+            return result
+        result.append(last_day.isoformat())
+        month = next_month
+
+
+def generate(database, employees, years, seed=42, departments=None):
+    rng = random.Random(seed)
+    end = date.today() - timedelta(days=1)
+    start = end - timedelta(days=int(years * 365))
+    departments = departments or min(len(DEPARTMENTS), max(3, employees // 1000))
+    timings = {}
+
+    def phase(name, started):
+        timings[name] = round(time.perf_counter() - started, 2)
+        print('  %-12s %6.2fs' % (name, timings[name]))
+
+    conn = connect(database, LOAD_PROFILE)
+    create_schema(conn)
+    drop_derived_objects(conn)
+
+    started = time.perf_counter()
+    department_names = [DEPARTMENTS[i] if i < len(DEPARTMENTS) else '部门%d' % (i + 1) for i in range(departments)]
+    conn.executemany('INSERT INTO departments (name, description) VALUES (?, ?)',
+                     [(name, '%s（合成数据）' % name) for name in department_names])
+    conn.executemany('INSERT INTO positions (title, level) VALUES (?, ?)', POSITIONS)
+    department_ids = [row[0] for row in conn.execute('SELECT id FROM departments ORDER BY id')]
+    position_ids = {row[0]: row[1] for row in conn.execute('SELECT title, id FROM positions')}
+
+    employee_rows, salary_ranges = build_employees(rng, employees, department_ids, position_ids, start)
+    insert_rows(conn, '''
+        INSERT INTO employees (id, name, gender, phone, email, department_id, position_id, manager_id,
+                               role, join_date, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', employee_rows)
+
+    users = [('admin', generate_password_hash('admin123'), 'admin@company.com', '管理员', None)]
+    bench_hash = generate_password_hash(BENCH_PASSWORD)
+    for username, role in BENCH_USERS.items():
+        match = next((row for row in employee_rows if row[8] == role), None)
+        if match:
+            users.append((username, bench_hash, match[4], role, match[0]))
+    conn.executemany('INSERT INTO users (username, password, email, role, employee_id) VALUES (?, ?, ?, ?, ?)',
+                     users)
+    conn.executemany('''
+        INSERT INTO notices (title, content, author_id, priority, is_active, created_at)
+        VALUES (?, ?, 1, ?, ?, ?)
+    ''', [('通知 %d' % i, '合成通知内容 %d' % i, rng.choice(NOTICE_PRIORITIES), 1 if i % 5 else 0,
+           (start + timedelta(days=i * 7)).isoformat() + ' 10:00:00') for i in range(1, 51)])
+    conn.commit()
+    phase('员工', started)
+
+    # 每人每天只从 Python 绑定一行到临时表，再用两条 INSERT ... SELECT 展开成签到、签退打卡：
+    # 绑定参数的开销减半，sqlite_sequence 每天只更新两次，考勤 id 仍随时间递增
+    started = time.perf_counter()
+    conn.execute('''
+        CREATE TEMP TABLE stage_daily (employee_id INTEGER, day TEXT, in_type TEXT, first_in TEXT,
+                                       last_out TEXT, worked_minutes INTEGER, late_minutes INTEGER)
+    ''')
+    by_join = sorted((row[9], row[0]) for row in employee_rows)
+    active, joined, staged = [], 0, 0
+    for day in workdays(start, end + timedelta(days=1)):
+        while joined < len(by_join) and by_join[joined][0] <= day:
+            active.append(by_join[joined][1])
+            joined += 1
+        rows = attendance_day(rng, active, day)
+        conn.executemany('INSERT INTO temp.stage_daily VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        conn.execute('''
+            INSERT INTO attendance (employee_id, type, timestamp)
+            SELECT employee_id, in_type, day || ' ' || first_in FROM temp.stage_daily WHERE rowid > ?
+        ''', (staged,))
+        conn.execute('''
+            INSERT INTO attendance (employee_id, type, timestamp)
+            SELECT employee_id, '下班', day || ' ' || last_out FROM temp.stage_daily WHERE rowid > ?
+        ''', (staged,))
+        staged += len(rows)
+    # 汇总表主键为 (employee_id, day)，排序后一次写入，避免逐天插入造成的随机写
+    conn.execute('''
+        INSERT INTO attendance_daily (employee_id, day, first_in, last_out, punches, worked_minutes, late_minutes)
+        SELECT employee_id, day, first_in, last_out, 2, worked_minutes, late_minutes
+        FROM temp.stage_daily ORDER BY employee_id, day
+    ''')
+    conn.execute('DROP TABLE temp.stage_daily')
+    conn.commit()
+    punches = staged * 2
+    phase('考勤', started)
+
+    started = time.perf_counter()
+    salaries = insert_rows(conn, '''
+        INSERT INTO salaries (employee_id, base_salary, bonus, deduction, total, pay_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', salary_rows(rng, employee_rows, salary_ranges, month_ends(start, end)))
+    conn.commit()
+    phase('薪资', started)
+
+    # 重建索引、触发器、闭包表，再按基表重算统计
+    started = time.perf_counter()
+    create_schema(conn)
+    rebuild_stats(conn)
+    phase('索引与汇总', started)
+    conn.close()
+
+    # 切回默认存储参数（WAL 模式会持久化到文件）
+    connect(database).close()
+    return {'employees': len(employee_rows), 'attendance': punches, 'salaries': salaries,
+            'departments': departments, 'timings': timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成压测用合成数据')
+    parser.add_argument('--scale', choices=SCALES, default='medium')
+    parser.add_argument('--employees', type=int, help='员工数（覆盖 --scale）')
+    parser.add_argument('--years', type=float, default=2, help='考勤与薪资覆盖的年数')
+    parser.add_argument('--departments', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default='hr_system_bench.db')
+    parser.add_argument('--force', action='store_true', help='目标文件已存在时覆盖')
+    args = parser.parse_args()
+
+    if os.path.abspath(args.database) == os.path.abspath(DATABASE):
+        print('不能覆盖业务数据库 %s' % DATABASE)
+        sys.exit(2)
+    if os.path.exists(args.database):
+        if not args.force:
+            print('%s 已存在，使用 --force 覆盖' % args.database)
+            sys.exit(2)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.database + suffix):
+                os.remove(args.database + suffix)
+
+    employees = args.employees or SCALES[args.scale]
+    print('生成 %d 名员工、%.1f 年数据到 %s' % (employees, args.years, args.database))
+    started = time.perf_counter()
+    result = generate(args.database, employees, args.years, args.seed, args.departments)
+    print('完成：员工 %(employees)d 人，考勤 %(attendance)d 条，薪资 %(salaries)d 条' % result
+          + '，总耗时 %.1fs' % (time.perf_counter() - started))
+
+
+if __name__ == '__main__':
+    main()
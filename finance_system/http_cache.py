@@ -0,0 +1,124 @@
+"""静态资源指纹与 HTTP 缓存
+
+启动时计算 static 目录下每个文件的内容哈希，url_for('static', filename='css/a.css') 生成 /static/css/a.<哈希>.css；
+带哈希的 URL 内容永不变化，返回 Cache-Control: immutable（缓存一年），浏览器不再回源验证。
+可压缩的文本文件在启动时预先压缩为 gzip（安装了 brotli 模块时还有 br），按 Accept-Encoding 直接返回压缩后的字节，
+不需要构建步骤。不带哈希或哈希已过期（重载前渲染的页面）的 URL 仍按原文件返回，只做普通的条件请求。
+调试模式（app.debug）下不加指纹，修改静态文件后刷新即可生效。
+
+列表页（CONDITIONAL_ENDPOINTS）返回基于响应内容的 ETag，Cache-Control: private, no-cache；
+浏览器带 If-None-Match 再次访问且内容未变时返回 304，不再传输页面。
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import request
+from werkzeug.exceptions import NotFound
+from werkzeug.wrappers import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HASH_LENGTH = 12
+IMMUTABLE = 'public, max-age=31536000, immutable'
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 256
+
+# 带 ETag 的 HTML 列表页
+CONDITIONAL_ENDPOINTS = {'employees', 'departments', 'positions', 'attendance', 'salaries', 'notices'}
+
+
+class Asset:
+    """一个静态文件：原始字节、指纹 URL 和预压缩的版本"""
+
+    __slots__ = ('filename', 'hashed', 'digest', 'mimetype', 'variants')
+
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        root, ext = os.path.splitext(filename)
+        self.hashed = '%s.%s%s' % (root, self.digest, ext)
+        self.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        # 按优先顺序：编码 -> 字节；只保留比原文件小的压缩版本
+        self.variants = {}
+        if self.mimetype.startswith(COMPRESSIBLE) and len(data) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(data, quality=11)
+            self.variants['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+            self.variants = {encoding: body for encoding, body in self.variants.items() if len(body) < len(data)}
+        self.variants[None] = data
+
+    def response(self):
+        """按 Accept-Encoding 选择编码，返回带长期缓存头的响应"""
+        accepted = request.accept_encodings
+        encoding = next((e for e in self.variants if e is None or accepted[e]), None)
+        response = Response(self.variants[encoding], mimetype=self.mimetype)
+        if encoding is not None:
+            response.content_encoding = encoding
+        if len(self.variants) > 1:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.set_etag('%s-%s' % (self.digest, encoding or 'identity'))
+        return response.make_conditional(request)
+
+
+def scan_assets(static_folder):
+    """读取 static 目录下的全部文件，返回 {原文件名: Asset}"""
+    assets = {}
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                assets[filename] = Asset(filename, f.read())
+    return assets
+
+
+def init_app(app):
+    """计算静态资源指纹，接管 static 路由，并给列表页加上 ETag 条件请求"""
+    app.config.setdefault('ASSET_FINGERPRINT', True)
+    assets = scan_assets(app.static_folder) if app.static_folder and os.path.isdir(app.static_folder) else {}
+    by_hash = {asset.hashed: asset for asset in assets.values()}
+    app.extensions['assets'] = assets
+    send_static_file = app.view_functions['static']
+
+    def fingerprinting():
+        return app.config['ASSET_FINGERPRINT'] and not app.debug
+
+    @app.url_defaults
+    def _fingerprint_url(endpoint, values):
+        if endpoint == 'static' and fingerprinting():
+            asset = assets.get(values.get('filename'))
+            if asset is not None:
+                values['filename'] = asset.hashed
+
+    def static(filename):
+        asset = by_hash.get(filename)
+        if asset is not None and fingerprinting():
+            return asset.response()
+        try:
+            return send_static_file(filename=filename)
+        except NotFound:
+            # 哈希已过期的 URL（旧页面引用）：去掉哈希按原文件返回
+            root, ext = os.path.splitext(filename)
+            original, _, digest = root.rpartition('.')
+            if not original or len(digest) != HASH_LENGTH:
+                raise
+            return send_static_file(filename=original + ext)
+
+    app.view_functions['static'] = static
+
+    @app.after_request
+    def _conditional_page(response):
+        if request.endpoint in CONDITIONAL_ENDPOINTS and request.method in ('GET', 'HEAD') \
+                and response.status_code == 200 and response.mimetype == 'text/html' \
+                and not response.is_streamed:
+            response.add_etag()
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.make_conditional(request)
+        return response
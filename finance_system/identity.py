@@ -0,0 +1,109 @@
+"""登录身份：users.employee_id 关联员工档案，登录后把员工 id 和角色缓存在 session 中
+
+编辑、删除员工时调用 invalidate_user()，本进程内下一次请求立即重新加载；
+多进程部署时其他进程依靠 IDENTITY_TTL 过期重新加载（与 cache.CachedValue 相同的兜底方式）。
+"""
+import threading
+import time
+
+IDENTITY_TTL = 300  # 秒
+
+IDENTITY_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_identity_employees_del AFTER DELETE ON employees BEGIN
+        UPDATE users SET employee_id = NULL WHERE employee_id = OLD.id;
+    END;
+'''
+
+# user_id -> 最近一次失效时间；早于 _retention 秒的记录已不影响任何 session（身份到期也会重新加载），写入时清理
+_invalidated = {}
+_retention = IDENTITY_TTL
+_lock = threading.Lock()
+
+
+def create_identity_schema(conn):
+    """补齐 users.employee_id 列和邮箱索引；新增该列时按邮箱回填已有账号"""
+    cursor = conn.cursor()
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(users)')]
+    added = 'employee_id' not in columns
+    if added:
+        cursor.execute('ALTER TABLE users ADD COLUMN employee_id INTEGER REFERENCES employees(id) ON DELETE SET NULL')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_employee ON users(employee_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_email ON employees(email)')
+    # 未开启 foreign_keys，删除员工时由触发器解除关联
+    cursor.executescript(IDENTITY_TRIGGERS)
+    if added:
+        link_users(conn)
+    conn.commit()
+
+
+def link_users(conn):
+    """按邮箱为尚未关联的账号补上员工 id（同一邮箱有多份档案时取最早的一份），返回关联的账号 id
+
+    不提交事务；调用方提交后对返回的账号调用 invalidate_user()
+    """
+    user_ids = [row[0] for row in conn.execute('''
+        SELECT id FROM users
+        WHERE employee_id IS NULL AND email IS NOT NULL
+          AND EXISTS (SELECT 1 FROM employees e WHERE e.email = users.email)
+    ''')]
+    if user_ids:
+        conn.execute('''
+            UPDATE users SET employee_id = (
+                SELECT e.id FROM employees e WHERE e.email = users.email ORDER BY e.id LIMIT 1
+            )
+            WHERE employee_id IS NULL AND email IS NOT NULL
+              AND EXISTS (SELECT 1 FROM employees e WHERE e.email = users.email)
+        ''')
+    return user_ids
+
+
+def link_employee(conn, employee_id, email):
+    """新建员工档案时关联同邮箱、尚未关联的账号"""
+    if not email:
+        return
+    users = conn.execute('SELECT id FROM users WHERE email = ? AND employee_id IS NULL', (email,)).fetchall()
+    for user in users:
+        conn.execute('UPDATE users SET employee_id = ? WHERE id = ?', (employee_id, user['id']))
+        invalidate_user(user['id'])
+
+
+def users_of_employee(conn, employee_id):
+    return [row['id'] for row in conn.execute('SELECT id FROM users WHERE employee_id = ?', (employee_id,))]
+
+
+def invalidate_user(user_id):
+    now = time.time()
+    with _lock:
+        for stale_id in [uid for uid, at in _invalidated.items() if now - at >= _retention]:
+            del _invalidated[stale_id]
+        _invalidated[user_id] = now
+
+
+def store_identity(session, user):
+    """登录或重新加载后把身份写入 session"""
+    session['user_role'] = user['role']
+    session['employee_id'] = user['employee_id']
+    session['identity_loaded_at'] = time.time()
+
+
+def _stale(session, ttl):
+    global _retention
+    loaded_at = session.get('identity_loaded_at')
+    if loaded_at is None or time.time() - loaded_at >= ttl:
+        return True
+    with _lock:
+        _retention = max(_retention, ttl)
+        return _invalidated.get(session['user_id'], 0) >= loaded_at
+
+
+def refresh_identity(session, get_conn, ttl=IDENTITY_TTL):
+    """session 中的身份过期或已失效时重新加载；账号已被删除时返回 False"""
+    if 'user_id' not in session or not _stale(session, ttl):
+        return True
+    user = get_conn().execute('SELECT role, employee_id FROM users WHERE id = ?',
+                              (session['user_id'],)).fetchone()
+    if user is None:
+        return False
+    store_identity(session, user)
+    return True
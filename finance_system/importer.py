@@ -0,0 +1,374 @@
+"""批量导入员工、考勤、薪资数据（CSV / JSON Lines，流式分批写入）
+
+用法：python importer.py employees|attendance|salaries 文件路径 [--format csv|jsonl] [--batch-size 1000]
+"""
+import argparse
+import codecs
+import csv
+import json
+import sqlite3
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from attendance_rollup import refresh_dirty
+from identity import invalidate_user, link_users
+
+ATTENDANCE_TYPES = ('上班', '下班', '外勤')
+ROLES = ('管理员', '领导', '主管', '组长', '普通职员', '实习生')
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+    """单行数据校验失败"""
+
+
+class ImportResult:
+    """导入结果统计"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.total = 0
+        self.inserted = 0
+        self.failed = 0
+        self.linked_users = 0   # 按邮箱关联到新员工档案的已有账号数
+        self.errors = []        # [(行号, 错误信息)]，最多保留 MAX_REPORTED_ERRORS 条
+        self.elapsed = 0.0
+
+    def add_error(self, line_no, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_no, message))
+
+    @property
+    def rows_per_sec(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'total': self.total,
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'linked_users': self.linked_users,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+        }
+
+
+# ---------- 读取 ----------
+
+class TextLines:
+    """把二进制流逐行解码为文本（兼容带 BOM 的 UTF-8）
+
+    整块解码时一个坏字节会在读到中途抛出 UnicodeDecodeError，而此前的批次已经提交；
+    这里逐行解码，无法解码的行按替换字符继续，记下行号由读取函数报告为该行的错误。
+    """
+
+    def __init__(self, binary_stream):
+        self.binary_stream = binary_stream
+        self.bad_lines = []
+
+    def __iter__(self):
+        for line_no, raw in enumerate(self.binary_stream, 1):
+            if line_no == 1 and raw.startswith(codecs.BOM_UTF8):
+                raw = raw[len(codecs.BOM_UTF8):]
+            try:
+                yield raw.decode('utf-8')
+            except UnicodeDecodeError:
+                self.bad_lines.append(line_no)
+                yield raw.decode('utf-8', 'replace')
+
+    def pop_bad_line(self, last_line):
+        """第 last_line 行及之前第一个无法解码、尚未报告的行号，没有则返回 None"""
+        bad = None
+        while self.bad_lines and self.bad_lines[0] <= last_line:
+            line_no = self.bad_lines.pop(0)
+            if bad is None:
+                bad = line_no
+        return bad
+
+
+DECODE_ERROR = '不是有效的 UTF-8 编码'
+
+
+def _bad_line(stream, last_line):
+    pop_bad_line = getattr(stream, 'pop_bad_line', None)
+    return pop_bad_line(last_line) if pop_bad_line else None
+
+
+def read_csv(stream):
+    """逐行读取 CSV（首行为表头），产出 (行号, dict)；无法解码的行产出异常对象"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        bad_line = _bad_line(stream, reader.line_num)
+        if bad_line is not None:
+            yield bad_line, RowError(DECODE_ERROR)
+        else:
+            yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    """逐行读取 JSON Lines，产出 (行号, dict)；无法解码或解析的行产出异常对象"""
+    for line_no, line in enumerate(stream, 1):
+        if _bad_line(stream, line_no) is not None:
+            yield line_no, RowError(DECODE_ERROR)
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('每行必须是 JSON 对象')
+        except ValueError as e:
+            row = RowError('JSON 解析失败：%s' % e)
+        yield line_no, row
+
+
+def open_text(binary_stream):
+    """把上传文件的二进制流包装为逐行解码的文本"""
+    return TextLines(binary_stream)
+
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+# ---------- 字段校验 ----------
+
+def _text(row, name, required=False):
+    value = row.get(name)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError('缺少字段 %s' % name)
+    return value or None
+
+
+def _ref(row, name, valid_ids, required=False):
+    value = _text(row, name, required)
+    if value is None:
+        return None
+    try:
+        ref = int(value)
+    except ValueError:
+        raise RowError('%s 不是整数：%s' % (name, value))
+    if ref not in valid_ids:
+        raise RowError('%s 不存在：%s' % (name, ref))
+    return ref
+
+
+def _money(row, name, required=False):
+    value = _text(row, name, required)
+    if value is None:
+        return Decimal('0')
+    try:
+        return Decimal(value).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError('%s 不是有效金额：%s' % (name, value))
+
+
+def _date(row, name, required=False):
+    value = _text(row, name, required)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise RowError('%s 日期格式应为 YYYY-MM-DD：%s' % (name, value))
+
+
+def _timestamp(row, name):
+    value = _text(row, name, required=True)
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise RowError('%s 时间格式无效：%s' % (name, value))
+    return value
+
+
+def employee_row(row, refs):
+    role = _text(row, 'role') or '普通职员'
+    if role not in ROLES:
+        raise RowError('未知角色：%s' % role)
+    return (
+        _text(row, 'name', required=True),
+        _text(row, 'gender'),
+        _text(row, 'phone'),
+        _text(row, 'email'),
+        _ref(row, 'department_id', refs['departments']),
+        _ref(row, 'position_id', refs['positions']),
+        _ref(row, 'manager_id', refs['employees']),
+        role,
+        _date(row, 'join_date') or date.today().isoformat(),
+    )
+
+
+def attendance_row(row, refs):
+    att_type = _text(row, 'type', required=True)
+    if att_type not in ATTENDANCE_TYPES:
+        raise RowError('未知考勤类型：%s' % att_type)
+    return (
+        _ref(row, 'employee_id', refs['employees'], required=True),
+        att_type,
+        _timestamp(row, 'timestamp'),
+    )
+
+
+def salary_row(row, refs):
+    base_salary = _money(row, 'base_salary', required=True)
+    bonus = _money(row, 'bonus')
+    deduction = _money(row, 'deduction')
+    total = base_salary + bonus - deduction
+    return (
+        _ref(row, 'employee_id', refs['employees'], required=True),
+        float(base_salary), float(bonus), float(deduction), float(total),
+        _date(row, 'pay_date', required=True),
+    )
+
+
+# 导入类型 -> (行转换函数, INSERT 语句)
+IMPORTERS = {
+    'employees': (employee_row, '''
+        INSERT INTO employees (name, gender, phone, email, department_id, position_id, manager_id, role, join_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''),
+    'attendance': (attendance_row, '''
+        INSERT INTO attendance (employee_id, type, timestamp) VALUES (?, ?, ?)
+    '''),
+    'salaries': (salary_row, '''
+        INSERT INTO salaries (employee_id, base_salary, bonus, deduction, total, pay_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    '''),
+}
+
+
+# ---------- 写入 ----------
+
+def load_reference_ids(conn):
+    """预加载外键校验所需的 id 集合"""
+    return {
+        'departments': {row[0] for row in conn.execute('SELECT id FROM departments')},
+        'positions': {row[0] for row in conn.execute('SELECT id FROM positions')},
+        'employees': {row[0] for row in conn.execute('SELECT id FROM employees')},
+    }
+
+
+def _write_batch(conn, sql, batch, result):
+    """一个事务写入一批；整批失败时逐行重试以定位出错行"""
+    try:
+        conn.execute('BEGIN')
+        conn.executemany(sql, [params for _, params in batch])
+        conn.commit()
+        result.inserted += len(batch)
+        return
+    except sqlite3.IntegrityError:
+        conn.rollback()
+
+    conn.execute('BEGIN')
+    for line_no, params in batch:
+        try:
+            conn.execute(sql, params)
+            result.inserted += 1
+        except sqlite3.IntegrityError as e:
+            result.add_error(line_no, '数据库约束失败：%s' % e)
+    conn.commit()
+
+
+def import_rows(conn, kind, rows, batch_size=1000):
+    """把 (行号, dict) 流分批写入 kind 对应的表，单行错误不影响其他行"""
+    if kind not in IMPORTERS:
+        raise ValueError('不支持的导入类型：%s' % kind)
+    convert, sql = IMPORTERS[kind]
+    refs = load_reference_ids(conn)
+    result = ImportResult(kind)
+    if conn.in_transaction:
+        conn.commit()
+
+    started = time.perf_counter()
+    batch = []
+    for line_no, row in rows:
+        result.total += 1
+        try:
+            if isinstance(row, Exception):
+                raise row
+            batch.append((line_no, convert(row, refs)))
+        except RowError as e:
+            result.add_error(line_no, str(e))
+            continue
+
+        if len(batch) >= batch_size:
+            _flush(conn, kind, sql, batch, refs, result)
+            batch = []
+    if batch:
+        _flush(conn, kind, sql, batch, refs, result)
+    if kind == 'attendance':
+        refresh_dirty(conn)
+    if kind == 'employees':
+        _link_users(conn, result)
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _flush(conn, kind, sql, batch, refs, result):
+    if kind != 'employees':
+        _write_batch(conn, sql, batch, result)
+        return
+    # 新导入的员工可作为后续批次的上级
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM employees').fetchone()[0]
+    _write_batch(conn, sql, batch, result)
+    refs['employees'].update(row[0] for row in conn.execute('SELECT id FROM employees WHERE id > ?', (last_id,)))
+
+
+def _link_users(conn, result):
+    """新员工档案按邮箱关联已有账号（与界面新建员工时的 link_employee 相同），已登录的账号下一次请求重新加载身份"""
+    conn.execute('BEGIN')
+    user_ids = link_users(conn)
+    conn.commit()
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    result.linked_users = len(user_ids)
+
+
+def import_stream(conn, kind, stream, fmt='csv', batch_size=1000):
+    """从文本流导入"""
+    reader = read_jsonl if fmt == 'jsonl' else read_csv
+    return import_rows(conn, kind, reader(stream), batch_size)
+
+
+def main():
+    from db import connect
+    from init_db import DATABASE, create_schema
+
+    parser = argparse.ArgumentParser(description='批量导入员工、考勤、薪资数据')
+    parser.add_argument('kind', choices=sorted(IMPORTERS))
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'jsonl'))
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--database', default=DATABASE)
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    create_schema(conn)
+    with open(args.path, 'rb') as stream:
+        result = import_stream(conn, args.kind, open_text(stream), args.format or detect_format(args.path),
+                               args.batch_size)
+    conn.close()
+
+    for line_no, message in result.errors:
+        print('第 %d 行：%s' % (line_no, message))
+    print('共 %d 行，成功 %d 行，失败 %d 行，耗时 %.2fs（%.0f 行/秒）'
+          % (result.total, result.inserted, result.failed, result.elapsed, result.rows_per_sec))
+    if result.linked_users:
+        print('按邮箱关联已有账号 %d 个' % result.linked_users)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,23 @@
-import sqlite3
 from werkzeug.security import generate_password_hash
 
+from db import connect
+from attendance_archive import create_archive_schema
+from attendance_rollup import create_rollup_schema
+from change_log import create_change_schema
+from identity import create_identity_schema
+from org_chart import create_org_schema
+from payroll import create_payroll_schema
+from reference import create_reference_schema
+from salary_analytics import create_analytics_schema
+from search import create_search_schema
+from session_store import create_session_schema
+from stats import create_stats_schema
+
 DATABASE = 'hr_system.db'
 
 
-def init_db():
-    conn = sqlite3.connect(DATABASE)
+def create_schema(conn):
+    """创建表和索引（可重复执行，应用启动时也会调用以补齐新增结构）"""
     cursor = conn.cursor()
 
     # 1. 先创建所有表
@@ -16,7 +28,8 @@ def init_db():
             password VARCHAR(100) NOT NULL,
             email VARCHAR(100),
             role VARCHAR(20) DEFAULT '普通职员',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            employee_id INTEGER REFERENCES employees(id) ON DELETE SET NULL
         )
     ''')
 
@@ -103,6 +116,55 @@ def init_db():
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_salaries_emp ON salaries(employee_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_notices_author ON notices(author_id)')
 
+    # 列表页键集分页与筛选用的复合索引
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_time ON attendance(timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_emp_time ON attendance(employee_id, timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_salaries_pay_date ON salaries(pay_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_salaries_emp_pay_date ON salaries(employee_id, pay_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_created ON employees(created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_manager_created ON employees(manager_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_dept_created ON employees(department_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notices_active_created ON notices(is_active, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_join_date ON employees(join_date)')
+    # 通知管理页按发布时间倒序、直属下属按姓名排序（check_query_plans.py 检查不出现临时排序）
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notices_created ON notices(created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notices_author_created ON notices(author_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_manager_name ON employees(manager_id, name)')
+    # 员工列表按部门筛选后按姓名排序（listings.EMPLOYEE_SORTS）
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_dept_name ON employees(department_id, name)')
+
+    conn.commit()
+
+    # 工作台统计物化表及维护触发器
+    create_stats_schema(conn)
+    # 组织架构闭包表及维护触发器
+    create_org_schema(conn)
+    # 考勤日汇总表
+    create_rollup_schema(conn)
+    # 薪资核算记录
+    create_payroll_schema(conn)
+    # 账号与员工档案关联
+    create_identity_schema(conn)
+    # 下拉框参考数据的版本号
+    create_reference_schema(conn)
+    # 员工与通知的全文索引
+    create_search_schema(conn)
+    # 薪资按部门按月聚合
+    create_analytics_schema(conn)
+    # 考勤冷数据归档记录
+    create_archive_schema(conn)
+    # 服务端 session
+    create_session_schema(conn)
+    # 变更日志（放在最后：捕获触发器按各表最终的列生成）
+    create_change_schema(conn)
+
+
+def init_db():
+    # 按默认存储参数打开（含 journal_mode=WAL，该设置会持久化到数据库文件）
+    conn = connect(DATABASE)
+    create_schema(conn)
+    cursor = conn.cursor()
+
     # 3. 插入默认数据
     cursor.execute("INSERT OR IGNORE INTO departments (name, description) VALUES ('人事部', '负责公司人事管理')")
     cursor.execute("INSERT OR IGNORE INTO departments (name, description) VALUES ('技术部', '负责技术开发')")
@@ -0,0 +1,118 @@
+"""考勤、薪资、员工列表查询（筛选 + 键集分页），HTML 页面与 JSON 接口共用"""
+from pagination import date_range_clauses, fetch_page, page_size
+
+ATTENDANCE_SELECT = '''
+    SELECT a.*, e.name as emp_name
+    FROM attendance a
+    JOIN employees e ON a.employee_id = e.id
+'''
+
+SALARY_SELECT = '''
+    SELECT s.*, e.name as emp_name
+    FROM salaries s
+    JOIN employees e ON s.employee_id = e.id
+'''
+
+EMPLOYEE_SELECT = '''
+    SELECT e.*, d.name as dept_name, p.title as pos_title, m.name as manager_name
+    FROM employees e
+    LEFT JOIN departments d ON e.department_id = d.id
+    LEFT JOIN positions p ON e.position_id = p.id
+    LEFT JOIN employees m ON e.manager_id = m.id
+'''
+
+
+def _int_arg(args, name):
+    try:
+        return int(args.get(name, ''))
+    except ValueError:
+        return None
+
+
+def current_filters(args, names):
+    """提取非空筛选参数，用于回填表单和生成翻页链接"""
+    return {name: args[name] for name in names if args.get(name)}
+
+
+ATTENDANCE_FILTERS = ('employee_id', 'type', 'date_from', 'date_to', 'sort', 'order', 'limit')
+SALARY_FILTERS = ('employee_id', 'date_from', 'date_to', 'sort', 'order', 'limit')
+EMPLOYEE_FILTERS = ('department_id', 'role', 'sort', 'order', 'limit')
+
+# 可排序的列：?sort= 的取值 -> (排序列, 结果行中的字段)，第一项为默认排序。
+# 每一列都有索引，键集分页按 (列, id) 顺着索引取下一页；列必须非空，NULL 无法参与 (列, id) 比较
+ATTENDANCE_SORTS = {
+    'timestamp': ('a.timestamp', 'timestamp'),
+}
+SALARY_SORTS = {
+    'pay_date': ('s.pay_date', 'pay_date'),
+}
+EMPLOYEE_SORTS = {
+    'created_at': ('e.created_at', 'created_at'),
+    'name': ('e.name', 'name'),
+}
+
+
+def sort_order(args, sorts):
+    """?sort=&order=asc|desc -> (排序列, 字段, 是否倒序)；未知的列按默认排序，默认倒序"""
+    column, key = sorts.get(args.get('sort'), next(iter(sorts.values())))
+    return column, key, args.get('order') != 'asc'
+
+
+def attendance_conditions(args):
+    """考勤筛选：员工、类型、日期范围"""
+    clauses, params = date_range_clauses('a.timestamp', args.get('date_from'), args.get('date_to'))
+    employee_id = _int_arg(args, 'employee_id')
+    if employee_id is not None:
+        clauses.append('a.employee_id = ?')
+        params.append(employee_id)
+    if args.get('type'):
+        clauses.append('a.type = ?')
+        params.append(args['type'])
+    return clauses, params
+
+
+def salary_conditions(args):
+    """薪资筛选：员工、发放日期范围"""
+    clauses, params = date_range_clauses('s.pay_date', args.get('date_from'), args.get('date_to'))
+    employee_id = _int_arg(args, 'employee_id')
+    if employee_id is not None:
+        clauses.append('s.employee_id = ?')
+        params.append(employee_id)
+    return clauses, params
+
+
+def employee_conditions(args, manager_id=None):
+    """员工筛选：部门、角色；manager_id 非空时只看其全部下属（闭包表）"""
+    clauses, params = [], []
+    if manager_id is not None:
+        clauses.append('e.id IN (SELECT descendant_id FROM employee_closure WHERE ancestor_id = ? AND depth > 0)')
+        params.append(manager_id)
+    department_id = _int_arg(args, 'department_id')
+    if department_id is not None:
+        clauses.append('e.department_id = ?')
+        params.append(department_id)
+    if args.get('role'):
+        clauses.append('e.role = ?')
+        params.append(args['role'])
+    return clauses, params
+
+
+def attendance_page(conn, args):
+    clauses, params = attendance_conditions(args)
+    column, key, descending = sort_order(args, ATTENDANCE_SORTS)
+    return fetch_page(conn, ATTENDANCE_SELECT, clauses, params, column, 'a.id', key,
+                      args.get('cursor'), page_size(args), descending)
+
+
+def salary_page(conn, args):
+    clauses, params = salary_conditions(args)
+    column, key, descending = sort_order(args, SALARY_SORTS)
+    return fetch_page(conn, SALARY_SELECT, clauses, params, column, 's.id', key,
+                      args.get('cursor'), page_size(args), descending)
+
+
+def employee_page(conn, args, manager_id=None):
+    clauses, params = employee_conditions(args, manager_id)
+    column, key, descending = sort_order(args, EMPLOYEE_SORTS)
+    return fetch_page(conn, EMPLOYEE_SELECT, clauses, params, column, 'e.id', key,
+                      args.get('cursor'), page_size(args), descending)
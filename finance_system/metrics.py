@@ -0,0 +1,165 @@
+"""请求级 SQL 监控：按路由统计查询次数和耗时、慢查询日志（参数脱敏 + 执行计划）、Prometheus /metrics 输出"""
+import logging
+import sqlite3
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+import db
+
+slow_query_logger = logging.getLogger('hr_system.slow_query')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class Histogram:
+    """累计直方图（Prometheus 语义：le 桶为累计计数）"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield '%s_bucket{%s,le="%s"} %d' % (name, labels, bound, cumulative)
+        yield '%s_sum{%s} %.6f' % (name, labels, self.total)
+        yield '%s_count{%s} %d' % (name, labels, self.count)
+
+
+class Metrics:
+    """进程内指标存储"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency = {}     # (route, method) -> Histogram
+        self.request_queries = {}     # (route, method) -> Histogram
+        self.query_latency = {}       # (route, 连接角色) -> Histogram
+        self.requests_total = {}      # (route, method, status) -> int
+        self.slow_queries = {}        # route -> int
+
+    def _histogram(self, store, key, buckets):
+        histogram = store.get(key)
+        if histogram is None:
+            histogram = store[key] = Histogram(buckets)
+        return histogram
+
+    def observe_query(self, route, role, elapsed, slow):
+        with self._lock:
+            self._histogram(self.query_latency, (route, role), LATENCY_BUCKETS).observe(elapsed)
+            if slow:
+                self.slow_queries[route] = self.slow_queries.get(route, 0) + 1
+
+    def observe_request(self, route, method, status, elapsed, queries):
+        with self._lock:
+            self._histogram(self.request_latency, (route, method), LATENCY_BUCKETS).observe(elapsed)
+            self._histogram(self.request_queries, (route, method), QUERY_COUNT_BUCKETS).observe(queries)
+            key = (route, method, status)
+            self.requests_total[key] = self.requests_total.get(key, 0) + 1
+
+    def render(self, extra_gauges=()):
+        """输出 Prometheus 文本格式"""
+        out = []
+        with self._lock:
+            out.append('# TYPE http_request_duration_seconds histogram')
+            for (route, method), histogram in sorted(self.request_latency.items()):
+                out.extend(histogram.lines('http_request_duration_seconds', 'route="%s",method="%s"' % (route, method)))
+            out.append('# TYPE http_request_queries histogram')
+            for (route, method), histogram in sorted(self.request_queries.items()):
+                out.extend(histogram.lines('http_request_queries', 'route="%s",method="%s"' % (route, method)))
+            out.append('# TYPE http_requests_total counter')
+            for (route, method, status), count in sorted(self.requests_total.items()):
+                out.append('http_requests_total{route="%s",method="%s",status="%s"} %d' % (route, method, status, count))
+            out.append('# HELP db_query_duration_seconds 语句执行加取完结果行的耗时')
+            out.append('# TYPE db_query_duration_seconds histogram')
+            for (route, role), histogram in sorted(self.query_latency.items()):
+                out.extend(histogram.lines('db_query_duration_seconds', 'route="%s",role="%s"' % (route, role)))
+            out.append('# TYPE db_slow_queries_total counter')
+            for route, count in sorted(self.slow_queries.items()):
+                out.append('db_slow_queries_total{route="%s"} %d' % (route, count))
+        for name, kind, samples in extra_gauges:
+            out.append('# TYPE %s %s' % (name, kind))
+            for labels, value in samples:
+                out.append('%s{%s} %s' % (name, labels, value) if labels else '%s %s' % (name, value))
+        return '\n'.join(out) + '\n'
+
+
+metrics = Metrics()
+
+
+def redact(parameters):
+    """慢查询日志中的参数只保留类型，不记录具体值"""
+    if parameters is None:
+        return '<批量>'
+    if isinstance(parameters, dict):
+        return {key: '<%s>' % type(value).__name__ for key, value in parameters.items()}
+    return ['<%s>' % type(value).__name__ for value in parameters]
+
+
+def explain(conn, sql, parameters):
+    """获取执行计划（绕过 hook，避免递归计数）"""
+    try:
+        rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, parameters or ())
+        return [row[3] for row in rows.fetchall()]
+    except sqlite3.Error:
+        return []
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _on_query(app):
+    def hook(conn, sql, parameters, elapsed):
+        if not has_request_context():
+            return
+        route = _route()
+        g.query_count = g.get('query_count', 0) + 1
+        g.query_time = g.get('query_time', 0.0) + elapsed
+        slow = elapsed * 1000 >= app.config['SLOW_QUERY_MS']
+        role = getattr(conn, 'role', db.WRITER)
+        metrics.observe_query(route, role, elapsed, slow)
+        if slow:
+            plan = explain(conn, sql, parameters) if parameters is not None else []
+            slow_query_logger.warning('慢查询 %.1fms 路由=%s 连接=%s SQL=%s 参数=%s 执行计划=%s',
+                                      elapsed * 1000, route, role, ' '.join(sql.split()), redact(parameters), plan)
+    return hook
+
+
+def init_app(app):
+    """注册 SQL hook 和请求计时钩子"""
+    app.config.setdefault('SLOW_QUERY_MS', 100)
+    db.add_query_hook(_on_query(app))
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+        g.query_time = 0.0
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get('request_started')
+        if started is not None:
+            db.finish_queries()
+            elapsed = time.perf_counter() - started
+            metrics.observe_request(_route(), request.method, response.status_code, elapsed, g.get('query_count', 0))
+            response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+            response.headers['Server-Timing'] = 'db;dur=%.1f, total;dur=%.1f' % (g.get('query_time', 0.0) * 1000,
+                                                                                 elapsed * 1000)
+        return response
@@ -0,0 +1,461 @@
+"""通知推送：每个进程一个发布/订阅中心，通过 server-sent events（/notices/stream）把通知变更推给浏览器
+
+事件来自 change_log 中 notices 表的变更，事件 id 即 seq：中心的后台线程增量读取变更，一次查询分发给本进程的全部订阅者，
+不需要每个客户端各自轮询数据库。本进程发布、删除通知后调用 publish() 立即唤醒后台线程，
+其他 worker 进程写入的通知最迟 NOTICE_POLL_INTERVAL 秒后送达。
+
+最近 NOTICE_BUFFER_SIZE 条事件保留在内存中（启动时从 change_log 预加载），断线重连时按 Last-Event-ID 补发；
+游标早于缓冲（断线太久或日志已压缩）时发送 reset 事件，由页面自行决定是否刷新。
+
+serve.py 下连接发出首批数据后交给后台线程的 epoll 循环，不再占用请求线程，空闲连接只占一个文件描述符和几百字节内存；
+其他服务器（flask run）下每个连接占用一个线程。连接最长保持 NOTICE_STREAM_MAX_AGE 秒，
+到期断开后浏览器自动重连，借此重新校验登录状态。
+"""
+import atexit
+import json
+import logging
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from change_log import CHANGE_COLUMNS, ChangesCompacted, change_dict, changes_after, compacted_through, last_seq
+from db import connect
+
+NOTICE_PRIORITIES = ('normal', 'medium', 'high')
+NOTICE_FIELDS = ('id', 'title', 'content', 'priority', 'created_at')
+RETRY_MS = 3000
+POLL_BATCH_SIZE = 500
+
+HEARTBEAT = b': ping\n\n'
+POLL_ERROR_LOG_INTERVAL = 60.0  # 秒；读取变更持续出错时每个间隔最多记一条日志
+
+logger = logging.getLogger('hr_system.notice_hub')
+RESET_EVENT = b'event: reset\ndata: {}\n\n'
+
+
+class TooManySubscribers(Exception):
+    """本进程的推送连接已达上限"""
+
+
+def parse_priorities(values):
+    """?priority=high&priority=medium 或逗号分隔；为空表示全部，未知优先级抛 ValueError"""
+    priorities = set()
+    for value in values:
+        for priority in value.split(','):
+            priority = priority.strip()
+            if not priority:
+                continue
+            if priority not in NOTICE_PRIORITIES:
+                raise ValueError('不支持的优先级：%s（可选 %s）' % (priority, '、'.join(NOTICE_PRIORITIES)))
+            priorities.add(priority)
+    return frozenset(priorities)
+
+
+def parse_event_id(value):
+    """Last-Event-ID；缺失或无法识别时返回 None（从当前位置开始推送）"""
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class NoticeEvent:
+    """一条通知变更；frame 只序列化一次，所有订阅者共用"""
+
+    __slots__ = ('seq', 'priority', 'frame')
+
+    def __init__(self, change):
+        self.seq = change['seq']
+        data = change['data']
+        if change['op'] == 'D' or not data['is_active']:
+            # 删除事件不知道原来的优先级，推送给全部订阅者，页面上没有该通知时忽略即可
+            name, payload, self.priority = 'notice-removed', {'id': change['id']}, None
+        else:
+            name, payload, self.priority = 'notice', {field: data[field] for field in NOTICE_FIELDS}, data['priority']
+        self.frame = ('id: %d\nevent: %s\ndata: %s\n\n' % (
+            self.seq, name, json.dumps(payload, ensure_ascii=False))).encode('utf-8')
+
+
+class Subscriber:
+    """一个推送连接：cursor 为已推送到的 seq；sock 不为空表示连接已交给后台线程"""
+
+    __slots__ = ('cursor', 'priorities', 'expires_at', 'sock', 'pending')
+
+    def __init__(self, cursor, priorities, expires_at):
+        self.cursor = cursor
+        self.priorities = priorities
+        self.expires_at = expires_at
+        self.sock = None
+        self.pending = b''
+
+    def wants(self, event):
+        return event.priority is None or not self.priorities or event.priority in self.priorities
+
+
+class NoticeHub:
+    """进程内的通知发布/订阅中心"""
+
+    def __init__(self, database, profile=None, buffer_size=256, poll_interval=1.0, heartbeat=15.0,
+                 max_age=3600.0, max_subscribers=10000, max_pending=64 * 1024):
+        self.database = database
+        self.profile = profile
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.max_age = max_age
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+
+        self._cond = threading.Condition()
+        self._events = deque()
+        # 缓冲中包含 seq 大于 _first_seq 的全部通知事件；_last_seq 为已读到的位置
+        self._first_seq = self._last_seq = 0
+        self._subscribers = set()
+        self._adopting = []
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._conn = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._published = False
+
+        self.subscribed = 0
+        self.published = 0
+        self.polls = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.poll_errors = 0
+        self.last_poll_error = None
+        self._error_streak = 0
+        self._error_logged_at = None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._conn = connect(self.database, self.profile, readonly=True, check_same_thread=False)
+                self._preload()
+                thread = threading.Thread(target=self._run, name='notice-hub', daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def _preload(self):
+        """加载最近 buffer_size 条通知事件，重启后的 worker 也能给重连的浏览器补发"""
+        self._conn.execute('BEGIN')
+        try:
+            rows = self._conn.execute(
+                "SELECT %s FROM change_log WHERE table_name = 'notices' ORDER BY seq DESC LIMIT ?" % CHANGE_COLUMNS,
+                (self.buffer_size,)).fetchall()
+            current = last_seq(self._conn)
+            floor = compacted_through(self._conn)
+        finally:
+            self._conn.commit()
+        with self._cond:
+            self._events.extend(NoticeEvent(change_dict(row)) for row in reversed(rows))
+            self._first_seq = rows[-1]['seq'] - 1 if len(rows) == self.buffer_size else floor
+            self._last_seq = current
+
+    def subscribe(self, last_event_id=None, priorities=frozenset()):
+        """登记一个推送连接；last_event_id 为空时只推送之后的新事件"""
+        self._ensure_started()
+        with self._cond:
+            if self._closed or len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers('推送连接已满，请稍后重试')
+            subscriber = Subscriber(self._last_seq if last_event_id is None else last_event_id, priorities,
+                                    time.monotonic() + self.max_age)
+            self._subscribers.add(subscriber)
+            self.subscribed += 1
+        return subscriber
+
+    def stream(self, subscriber, handoff=None):
+        """响应体：先发重连间隔和补发的事件；服务器提供 handoff 时交出连接，否则在当前线程里持续推送"""
+        adopted = False
+        try:
+            with self._cond:
+                chunk = self._collect(subscriber)
+            yield b'retry: %d\n\n' % RETRY_MS + chunk
+            if handoff is not None:
+                handoff(lambda sock: self._adopt(subscriber, sock))
+                adopted = True
+                return
+            while not self._closed and time.monotonic() < subscriber.expires_at:
+                with self._cond:
+                    chunk = self._collect(subscriber)
+                    if not chunk:
+                        self._cond.wait(self.heartbeat)
+                        chunk = self._collect(subscriber) or HEARTBEAT
+                yield chunk
+        finally:
+            if not adopted:
+                with self._cond:
+                    self._subscribers.discard(subscriber)
+
+    def publish(self):
+        """本进程写入了通知：立即读取变更并推送（尚无订阅者时什么也不做）"""
+        if self._thread is None:
+            return
+        self.published += 1
+        self._published = True
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _collect(self, subscriber):
+        """取出该订阅者尚未收到的事件（调用方持有 _cond）"""
+        if subscriber.cursor < self._first_seq:
+            subscriber.cursor = self._last_seq
+            return RESET_EVENT
+        frames = []
+        for event in reversed(self._events):
+            if event.seq <= subscriber.cursor:
+                break
+            if subscriber.wants(event):
+                frames.append(event.frame)
+        subscriber.cursor = max(subscriber.cursor, self._last_seq)
+        self.delivered += len(frames)
+        return b''.join(reversed(frames))
+
+    def _adopt(self, subscriber, sock):
+        """serve.py 在请求处理完后回调：连接交给后台线程注册"""
+        with self._cond:
+            if self._closed:
+                self._subscribers.discard(subscriber)
+                sock.close()
+                return
+            subscriber.sock = sock
+            self._adopting.append(subscriber)
+        self._wake()
+
+    def _poll(self):
+        """读取新的通知变更，追加到缓冲并分发"""
+        self.polls += 1
+        fresh = []
+        self._conn.execute('BEGIN')
+        try:
+            after = self._last_seq
+            while True:
+                batch = changes_after(self._conn, after, POLL_BATCH_SIZE, ['notices'])
+                fresh.extend(NoticeEvent(change) for change in batch['changes'])
+                after = batch['next_after']
+                if not batch['has_more']:
+                    break
+            current = max(batch['last_seq'], after)
+        except ChangesCompacted:
+            # 后台线程停顿期间日志被压缩：缓冲作废，订阅者收到 reset
+            fresh, current = None, last_seq(self._conn)
+        finally:
+            self._conn.commit()
+
+        with self._cond:
+            if fresh is None:
+                self._events.clear()
+                self._first_seq = current
+            else:
+                self._events.extend(fresh)
+                while len(self._events) > self.buffer_size:
+                    self._first_seq = self._events.popleft().seq
+            self._last_seq = current
+            if fresh is None or fresh:
+                self._cond.notify_all()
+                for subscriber in self._adopted():
+                    chunk = self._collect(subscriber)
+                    if chunk:
+                        self._send(subscriber, chunk)
+
+    def _adopted(self):
+        return [subscriber for subscriber in self._subscribers if subscriber.sock is not None]
+
+    def _send(self, subscriber, data):
+        """非阻塞发送；发不完的留在 pending 等可写，积压超过 max_pending 的慢连接直接断开"""
+        if subscriber.pending:
+            subscriber.pending += data
+            if len(subscriber.pending) > self.max_pending:
+                self._drop(subscriber)
+            return
+        try:
+            sent = subscriber.sock.send(data)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(subscriber)
+            return
+        if sent < len(data):
+            subscriber.pending = data[sent:]
+            self._selector.modify(subscriber.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, subscriber)
+
+    def _flush(self, subscriber):
+        try:
+            sent = subscriber.sock.send(subscriber.pending)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop(subscriber)
+            return
+        subscriber.pending = subscriber.pending[sent:]
+        if not subscriber.pending:
+            self._selector.modify(subscriber.sock, selectors.EVENT_READ, subscriber)
+
+    def _drop(self, subscriber):
+        self._subscribers.discard(subscriber)
+        if subscriber.sock is None:
+            return
+        try:
+            self._selector.unregister(subscriber.sock)
+        except (KeyError, ValueError):
+            pass
+        subscriber.sock.close()
+        subscriber.sock = None
+        self.dropped += 1
+
+    def _register_adopted(self):
+        with self._cond:
+            adopting, self._adopting = self._adopting, []
+            for subscriber in adopting:
+                subscriber.sock.setblocking(False)
+                self._selector.register(subscriber.sock, selectors.EVENT_READ, subscriber)
+                chunk = self._collect(subscriber)
+                if chunk:
+                    self._send(subscriber, chunk)
+
+    def _beat(self):
+        """心跳：发现已断开的连接，并断开到期的连接让浏览器重连"""
+        now = time.monotonic()
+        with self._cond:
+            for subscriber in self._adopted():
+                if now >= subscriber.expires_at:
+                    self._drop(subscriber)
+                else:
+                    self._send(subscriber, HEARTBEAT)
+
+    def _run(self):
+        next_poll = next_beat = time.monotonic()
+        try:
+            while not self._closed:
+                timeout = max(0.0, min(next_poll, next_beat) - time.monotonic())
+                for key, mask in self._selector.select(timeout):
+                    subscriber = key.data
+                    if subscriber is None:
+                        try:
+                            while self._wake_r.recv(4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                        continue
+                    with self._cond:
+                        if subscriber.sock is None:
+                            continue
+                        if mask & selectors.EVENT_READ:
+                            # 浏览器不会再发数据，可读即断开（收到的多余数据丢弃）
+                            try:
+                                if not subscriber.sock.recv(4096):
+                                    self._drop(subscriber)
+                                    continue
+                            except BlockingIOError:
+                                pass
+                            except OSError:
+                                self._drop(subscriber)
+                                continue
+                        if mask & selectors.EVENT_WRITE:
+                            self._flush(subscriber)
+                if self._closed:
+                    break
+                self._register_adopted()
+                now = time.monotonic()
+                if self._published or now >= next_poll:
+                    self._published = False
+                    try:
+                        self._poll()
+                    except Exception as e:
+                        # 数据库暂时不可用时下一轮再读；持续出错（缺表、库损坏）时推送会一直停着，必须留下日志
+                        self._poll_failed(e)
+                    else:
+                        if self._error_streak:
+                            logger.info('通知推送恢复读取变更（此前连续出错 %d 次）', self._error_streak)
+                            self.last_poll_error = None
+                            self._error_streak = 0
+                            self._error_logged_at = None
+                    next_poll = now + self.poll_interval
+                if now >= next_beat:
+                    self._beat()
+                    next_beat = now + self.heartbeat
+        finally:
+            with self._cond:
+                for subscriber in self._adopted():
+                    self._drop(subscriber)
+                self._cond.notify_all()
+            self._conn.close()
+
+    def _poll_failed(self, error):
+        """记下读取变更的错误；日志按 POLL_ERROR_LOG_INTERVAL 限频"""
+        self.poll_errors += 1
+        self._error_streak += 1
+        self.last_poll_error = '%s: %s' % (type(error).__name__, error)
+        now = time.monotonic()
+        if self._error_logged_at is None or now - self._error_logged_at >= POLL_ERROR_LOG_INTERVAL:
+            logger.error('通知推送读取变更失败（已连续 %d 次）：%s', self._error_streak, self.last_poll_error,
+                         exc_info=error)
+            self._error_logged_at = now
+
+    def close(self, timeout=5.0):
+        """断开全部推送连接（浏览器会自动重连到其他 worker）"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            adopted = len(self._adopted())
+            return {
+                'subscribers': len(self._subscribers),
+                'detached': adopted,
+                'threaded': len(self._subscribers) - adopted,
+                'max_subscribers': self.max_subscribers,
+                'buffered_events': len(self._events),
+                'last_seq': self._last_seq,
+                'subscribed': self.subscribed,
+                'published': self.published,
+                'polls': self.polls,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'poll_errors': self.poll_errors,
+                'last_poll_error': self.last_poll_error,
+            }
+
+
+_hub_lock = threading.Lock()
+
+
+def get_notice_hub(app):
+    """获取（必要时创建）应用的通知推送中心，进程退出前断开全部推送连接"""
+    hub = app.extensions.get('notice_hub')
+    if hub is not None:
+        return hub
+    with _hub_lock:
+        hub = app.extensions.get('notice_hub')
+        if hub is None:
+            hub = NoticeHub(
+                app.config['DATABASE'],
+                profile=app.config.get('DB_STORAGE_PROFILE'),
+                buffer_size=app.config.get('NOTICE_BUFFER_SIZE', 256),
+                poll_interval=app.config.get('NOTICE_POLL_INTERVAL', 1.0),
+                heartbeat=app.config.get('NOTICE_HEARTBEAT', 15.0),
+                max_age=app.config.get('NOTICE_STREAM_MAX_AGE', 3600.0),
+                max_subscribers=app.config.get('NOTICE_STREAM_MAX_CLIENTS', 10000),
+            )
+            atexit.register(hub.close)
+            app.extensions['notice_hub'] = hub
+    return hub
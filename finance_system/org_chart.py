@@ -0,0 +1,206 @@
+"""组织架构：员工上下级闭包表（触发器增量维护）与递归查询
+
+用法：python org_chart.py verify | rebuild
+"""
+import sys
+
+from pagination import fetch_page, page_size
+
+MAX_DEPTH = 32
+
+CLOSURE_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_closure_employees_ins AFTER INSERT ON employees BEGIN
+        INSERT OR IGNORE INTO employee_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, NEW.id, depth + 1 FROM employee_closure WHERE descendant_id = NEW.manager_id
+        UNION ALL
+        SELECT NEW.id, NEW.id, 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_closure_employees_cycle BEFORE UPDATE OF manager_id ON employees
+    WHEN NEW.manager_id IS NOT NULL AND EXISTS (
+        SELECT 1 FROM employee_closure WHERE ancestor_id = NEW.id AND descendant_id = NEW.manager_id
+    ) BEGIN
+        SELECT RAISE(ABORT, '上级不能是本人或其下属');
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_closure_employees_move AFTER UPDATE OF manager_id ON employees
+    WHEN OLD.manager_id IS NOT NEW.manager_id BEGIN
+        -- 断开整棵子树与原祖先的关系
+        DELETE FROM employee_closure
+        WHERE descendant_id IN (SELECT descendant_id FROM employee_closure WHERE ancestor_id = NEW.id)
+          AND ancestor_id IN (SELECT ancestor_id FROM employee_closure
+                              WHERE descendant_id = NEW.id AND ancestor_id <> NEW.id);
+        -- 把子树挂到新上级的所有祖先下
+        INSERT OR IGNORE INTO employee_closure (ancestor_id, descendant_id, depth)
+        SELECT up.ancestor_id, down.descendant_id, up.depth + down.depth + 1
+        FROM employee_closure up, employee_closure down
+        WHERE up.descendant_id = NEW.manager_id AND down.ancestor_id = NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_closure_employees_del AFTER DELETE ON employees BEGIN
+        DELETE FROM employee_closure WHERE descendant_id = OLD.id;
+        DELETE FROM employee_closure WHERE ancestor_id = OLD.id;
+    END;
+'''
+
+SUBTREE_SELECT = '''
+    SELECT e.id, e.name, e.role, e.manager_id, d.name as dept_name, p.title as pos_title, c.depth
+    FROM employee_closure c
+    JOIN employees e ON e.id = c.descendant_id
+    LEFT JOIN departments d ON e.department_id = d.id
+    LEFT JOIN positions p ON e.position_id = p.id
+'''
+
+
+def create_org_schema(conn):
+    """创建闭包表和维护触发器；新建时按 manager_id 初始化"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS employee_closure (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_closure_ancestor_depth ON employee_closure(ancestor_id, depth)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_closure_descendant ON employee_closure(descendant_id, depth)')
+    cursor.executescript(CLOSURE_TRIGGERS)
+
+    has_rows = cursor.execute('SELECT 1 FROM employee_closure LIMIT 1').fetchone()
+    has_employees = cursor.execute('SELECT 1 FROM employees LIMIT 1').fetchone()
+    if has_employees and not has_rows:
+        rebuild_closure(conn)
+
+
+# 递归 CTE：从每个员工出发沿 manager_id 向下展开（深度上限防止脏数据成环时死循环）
+RECURSIVE_CLOSURE = '''
+    WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+        SELECT id, id, 0 FROM employees
+        UNION ALL
+        SELECT t.ancestor_id, e.id, t.depth + 1
+        FROM tree t
+        JOIN employees e ON e.manager_id = t.descendant_id
+        WHERE t.depth < %d AND e.id <> t.ancestor_id
+    )
+''' % MAX_DEPTH
+
+
+def rebuild_closure(conn):
+    """用递归 CTE 按 manager_id 全量重建闭包表"""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('DELETE FROM employee_closure')
+        cursor.execute(RECURSIVE_CLOSURE + '''
+            INSERT OR IGNORE INTO employee_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, MIN(depth) FROM tree GROUP BY ancestor_id, descendant_id
+        ''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def verify_closure(conn):
+    """对比闭包表与递归 CTE 结果，返回 (缺失行数, 多余行数)"""
+    expected = RECURSIVE_CLOSURE + '''
+        , expected AS (
+            SELECT ancestor_id, descendant_id, MIN(depth) as depth FROM tree GROUP BY ancestor_id, descendant_id
+        )
+    '''
+    missing = conn.execute(expected + '''
+        SELECT COUNT(*) FROM (
+            SELECT ancestor_id, descendant_id, depth FROM expected
+            EXCEPT SELECT ancestor_id, descendant_id, depth FROM employee_closure
+        )
+    ''').fetchone()[0]
+    extra = conn.execute(expected + '''
+        SELECT COUNT(*) FROM (
+            SELECT ancestor_id, descendant_id, depth FROM employee_closure
+            EXCEPT SELECT ancestor_id, descendant_id, depth FROM expected
+        )
+    ''').fetchone()[0]
+    return missing, extra
+
+
+def _depth_arg(args, default=MAX_DEPTH):
+    try:
+        depth = int(args.get('max_depth', default))
+    except (TypeError, ValueError):
+        depth = default
+    return max(1, min(depth, MAX_DEPTH))
+
+
+def subtree_page(conn, employee_id, args):
+    """某员工的全部下属（不含本人），按 (层级, id) 分页，可用 max_depth 限制层数"""
+    clauses = ['c.ancestor_id = ?', 'c.depth BETWEEN 1 AND ?']
+    params = [employee_id, _depth_arg(args)]
+    return fetch_page(conn, SUBTREE_SELECT, clauses, params, 'c.depth', 'c.descendant_id', 'depth',
+                      args.get('cursor'), page_size(args), descending=False)
+
+
+def subordinates(conn, employee_id, args):
+    """某员工的全部下属（不含本人，不分页），按 (层级, 姓名) 排序，可用 max_depth 限制层数"""
+    rows = conn.execute(SUBTREE_SELECT + '''
+        WHERE c.ancestor_id = ? AND c.depth BETWEEN 1 AND ?
+        ORDER BY c.depth, e.name
+    ''', (employee_id, _depth_arg(args))).fetchall()
+    return [dict(row) for row in rows]
+
+
+def ancestors(conn, employee_id, args):
+    """某员工的上级链（由近到远）"""
+    rows = conn.execute('''
+        SELECT e.id, e.name, e.role, e.manager_id, d.name as dept_name, p.title as pos_title, c.depth
+        FROM employee_closure c
+        JOIN employees e ON e.id = c.ancestor_id
+        LEFT JOIN departments d ON e.department_id = d.id
+        LEFT JOIN positions p ON e.position_id = p.id
+        WHERE c.descendant_id = ? AND c.depth BETWEEN 1 AND ?
+        ORDER BY c.depth
+    ''', (employee_id, _depth_arg(args))).fetchall()
+    return [dict(row) for row in rows]
+
+
+def has_subordinates(conn, employee_id):
+    return conn.execute('SELECT 1 FROM employee_closure WHERE ancestor_id = ? AND depth = 1 LIMIT 1',
+                        (employee_id,)).fetchone() is not None
+
+
+def is_descendant(conn, ancestor_id, descendant_id):
+    """descendant_id 是否为 ancestor_id 的下属（含间接下属，不含本人）"""
+    return conn.execute('SELECT 1 FROM employee_closure WHERE ancestor_id = ? AND descendant_id = ? AND depth > 0',
+                        (ancestor_id, descendant_id)).fetchone() is not None
+
+
+def would_create_cycle(conn, employee_id, manager_id):
+    """把 manager_id 设为 employee_id 的上级是否会成环（上级是本人或其下属）"""
+    if manager_id is None:
+        return False
+    return manager_id == employee_id or is_descendant(conn, employee_id, manager_id)
+
+
+def main():
+    from db import connect
+    from init_db import DATABASE
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'verify'
+    conn = connect(DATABASE)
+    create_org_schema(conn)
+    if command == 'rebuild':
+        rebuild_closure(conn)
+        print('组织架构闭包表已重建。')
+    elif command == 'verify':
+        missing, extra = verify_closure(conn)
+        print('校验完成：缺失 %d 行，多余 %d 行' % (missing, extra))
+        conn.close()
+        sys.exit(1 if missing or extra else 0)
+    else:
+        print('用法：python org_chart.py verify | rebuild')
+        sys.exit(2)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
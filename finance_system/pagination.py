@@ -0,0 +1,95 @@
+import base64
+import json
+from datetime import date, timedelta
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Page:
+    """一页查询结果"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def to_dict(self):
+        return {
+            'items': [dict(row) for row in self.items],
+            'next_cursor': self.next_cursor,
+        }
+
+
+def encode_cursor(sort_value, row_id):
+    """把 (排序值, id) 编码为 URL 安全的游标"""
+    raw = json.dumps([sort_value, row_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，非法游标返回 None（从第一页开始）"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw.decode('utf-8'))
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def page_size(args):
+    """从查询参数读取每页条数"""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        limit = DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def parse_date(value):
+    """解析 YYYY-MM-DD，非法值返回 None"""
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def date_range_clauses(column, date_from, date_to):
+    """生成可走索引的日期范围条件（闭区间 [date_from, date_to]）"""
+    clauses, params = [], []
+    start, end = parse_date(date_from), parse_date(date_to)
+    if start:
+        clauses.append('%s >= ?' % column)
+        params.append(start.isoformat())
+    if end:
+        clauses.append('%s < ?' % column)
+        params.append((end + timedelta(days=1)).isoformat())
+    return clauses, params
+
+
+def fetch_page(conn, select_sql, clauses, params, sort_column, id_column, sort_key,
+               cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    """按 (sort_column, id_column) 做键集分页（默认倒序）
+
+    select_sql 不含 WHERE/ORDER BY；sort_key 是结果行中排序值的字段名。
+    """
+    clauses, params = list(clauses), list(params)
+    position = decode_cursor(cursor)
+    if position:
+        clauses.append('(%s, %s) %s (?, ?)' % (sort_column, id_column, '<' if descending else '>'))
+        params.extend(position)
+
+    direction = 'DESC' if descending else 'ASC'
+    sql = select_sql
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    sql += ' ORDER BY %s %s, %s %s LIMIT ?' % (sort_column, direction, id_column, direction)
+    params.append(limit + 1)
+
+    rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][sort_key], rows[-1]['id'])
+    return Page(rows, next_cursor)
@@ -0,0 +1,231 @@
+"""月度薪资批量核算：按考勤扣款，整数分计算，单事务写入，按 (employee_id, 发放月份) 幂等
+
+用法：python payroll.py 2024-01-31 [--department 1] [--default-base 5000]
+"""
+import argparse
+import time
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from attendance_rollup import WORK_START, elapsed_workdays, first_check_ins, month_period, refresh_dirty, workdays
+
+WORKDAYS_PER_MONTH = Decimal('21.75')
+LATE_PENALTY_CENTS = 5000     # 每次迟到扣款 50 元
+PAYROLL_BATCH_SIZE = 1000
+
+
+def to_cents(value):
+    """金额转为整数分（四舍五入）"""
+    return int((Decimal(str(value)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return float(Decimal(cents) / 100)
+
+
+def salary_total(base_salary, bonus, deduction):
+    """实发工资 = 基本工资 + 奖金 - 扣款（按分精确计算）"""
+    return from_cents(to_cents(base_salary) + to_cents(bonus) - to_cents(deduction))
+
+
+def create_payroll_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pay_date DATE NOT NULL,
+            department_id INTEGER,
+            employee_count INTEGER NOT NULL DEFAULT 0,
+            inserted INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            missing_base INTEGER NOT NULL DEFAULT 0,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            elapsed_ms INTEGER NOT NULL DEFAULT 0,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_payroll_runs_pay_date ON payroll_runs(pay_date)')
+    # 核算生成的每笔发薪：同一员工同一月份只能有一笔，换一个发放日重复核算或并发核算都无法重复插入。
+    # 手工录入的薪资（奖金、调整）不登记在这里，也不影响核算
+    created = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'payroll_payments'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_payments (
+            employee_id INTEGER NOT NULL,
+            pay_month TEXT NOT NULL,
+            pay_date DATE NOT NULL,
+            PRIMARY KEY (employee_id, pay_month)
+        ) WITHOUT ROWID
+    ''')
+    if created:
+        # 补登记本表出现之前核算生成的薪资：与某次核算同一发放日、没有奖金的记录
+        conn.execute('''
+            INSERT OR IGNORE INTO payroll_payments (employee_id, pay_month, pay_date)
+            SELECT employee_id, strftime('%Y-%m', pay_date), pay_date FROM salaries
+            WHERE bonus = 0 AND pay_date IN (SELECT pay_date FROM payroll_runs)
+        ''')
+    conn.commit()
+
+
+def attendance_deduction(base_cents, check_ins, month_workdays, join_date):
+    """缺勤按日薪扣款、迟到按次扣款，扣款不超过基本工资；返回 (扣款分, 缺勤天数, 迟到次数)
+
+    只考核 month_workdays 中入职后的工作日：周末、节假日加班签到晚不算迟到。
+    """
+    required = [day for day in month_workdays if not join_date or day >= join_date]
+    absences = sum(1 for day in required if day not in check_ins)
+    lates = sum(1 for day in required if (check_ins.get(day) or '') > WORK_START)
+    daily_cents = Decimal(base_cents) / WORKDAYS_PER_MONTH
+    cents = int((daily_cents * absences).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    cents += lates * LATE_PENALTY_CENTS
+    return min(cents, base_cents), absences, lates
+
+
+class PayrollResult:
+    """一次薪资核算的结果"""
+
+    def __init__(self, pay_date, department_id):
+        self.run_id = None
+        self.pay_date = pay_date
+        self.department_id = department_id
+        self.employee_count = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.missing_base = 0
+        self.total_cents = 0
+        self.elapsed = 0.0
+
+    def to_dict(self):
+        return {
+            'run_id': self.run_id,
+            'pay_date': self.pay_date,
+            'department_id': self.department_id,
+            'employee_count': self.employee_count,
+            'inserted': self.inserted,
+            'skipped': self.skipped,
+            'missing_base': self.missing_base,
+            'total': from_cents(self.total_cents),
+            'elapsed': round(self.elapsed, 3),
+        }
+
+
+def run_payroll(conn, pay_date, department_id=None, default_base=None, created_by=None,
+                batch_size=PAYROLL_BATCH_SIZE):
+    """为所有员工（或指定部门）生成一个月的薪资记录
+
+    基本工资沿用该员工最近一次薪资记录，没有历史记录时使用 default_base（为空则跳过）。
+    该月已由核算发过薪的员工跳过（以 payroll_payments 登记为准，手工录入的奖金、调整不影响），
+    同一个月换发放日重复执行也不会重复发薪；(employee_id, pay_month) 主键兜底并发核算，
+    违反时整次核算回滚（sqlite3.IntegrityError）。
+    """
+    started = time.perf_counter()
+    pay_day = date.fromisoformat(pay_date)
+    start, end = month_period(pay_day)
+    # 只考核发放日之前的工作日，月中发薪不会按之后尚未到来的工作日扣缺勤
+    month_workdays, _ = elapsed_workdays(workdays(start, end), end.isoformat(), pay_day)
+    default_base_cents = to_cents(default_base) if default_base not in (None, '') else None
+    result = PayrollResult(pay_day.isoformat(), department_id)
+    pay_month = pay_day.strftime('%Y-%m')
+
+    # 扣款基于考勤汇总表，先把尚未汇总的打卡处理完
+    refresh_dirty(conn)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        summary = first_check_ins(conn, start, end, department_id)
+        sql = '''
+            SELECT e.id, e.join_date,
+                   (SELECT s.base_salary FROM salaries s WHERE s.employee_id = e.id
+                    ORDER BY s.pay_date DESC, s.id DESC LIMIT 1) as last_base
+            FROM employees e
+        '''
+        params = []
+        if department_id is not None:
+            sql += ' WHERE e.department_id = ?'
+            params.append(department_id)
+        cursor = conn.execute(sql + ' ORDER BY e.id', params)
+
+        insert_sql = '''
+            INSERT INTO salaries (employee_id, base_salary, bonus, deduction, total, pay_date)
+            VALUES (?, ?, 0, ?, ?, ?)
+        '''
+        ledger_sql = 'INSERT INTO payroll_payments (employee_id, pay_month, pay_date) VALUES (?, ?, ?)'
+        while True:
+            employees = cursor.fetchmany(batch_size)
+            if not employees:
+                break
+            paid = _already_paid(conn, [row[0] for row in employees], pay_month)
+            batch = []
+            for employee_id, join_date, last_base in employees:
+                result.employee_count += 1
+                if employee_id in paid:
+                    result.skipped += 1
+                    continue
+                base_cents = to_cents(last_base) if last_base is not None else default_base_cents
+                if base_cents is None:
+                    result.missing_base += 1
+                    continue
+                deduction_cents, _, _ = attendance_deduction(
+                    base_cents, summary.get(employee_id, {}), month_workdays, join_date)
+                total_cents = base_cents - deduction_cents
+                result.total_cents += total_cents
+                batch.append((employee_id, from_cents(base_cents), from_cents(deduction_cents),
+                              from_cents(total_cents), result.pay_date))
+
+            if batch:
+                conn.executemany(ledger_sql, [(row[0], pay_month, result.pay_date) for row in batch])
+                conn.executemany(insert_sql, batch)
+                result.inserted += len(batch)
+
+        result.elapsed = time.perf_counter() - started
+        result.run_id = conn.execute('''
+            INSERT INTO payroll_runs (pay_date, department_id, employee_count, inserted, skipped,
+                                      missing_base, total_cents, elapsed_ms, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (result.pay_date, department_id, result.employee_count, result.inserted, result.skipped,
+              result.missing_base, result.total_cents, int(result.elapsed * 1000), created_by)).lastrowid
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+def _already_paid(conn, employee_ids, pay_month):
+    """本批员工中核算登记过该月的 id 集合（薪资记录事后被删除时也不再重发）"""
+    rows = conn.execute(
+        'SELECT employee_id FROM payroll_payments WHERE pay_month = ? AND employee_id IN (%s)'
+        % ', '.join('?' * len(employee_ids)), [pay_month] + employee_ids)
+    return {row[0] for row in rows}
+
+
+def recent_runs(conn, limit=20):
+    return conn.execute('''
+        SELECT r.*, d.name as dept_name
+        FROM payroll_runs r
+        LEFT JOIN departments d ON r.department_id = d.id
+        ORDER BY r.id DESC
+        LIMIT ?
+    ''', (limit,)).fetchall()
+
+
+def main():
+    from db import connect
+    from init_db import DATABASE, create_schema
+
+    parser = argparse.ArgumentParser(description='月度薪资批量核算')
+    parser.add_argument('pay_date', help='发放日期 YYYY-MM-DD')
+    parser.add_argument('--department', type=int)
+    parser.add_argument('--default-base', help='无历史薪资员工的基本工资')
+    parser.add_argument('--database', default=DATABASE)
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    create_schema(conn)
+    result = run_payroll(conn, args.pay_date, args.department, args.default_base)
+    conn.close()
+    print('核算完成：员工 %(employee_count)d 人，新增 %(inserted)d 条，已存在跳过 %(skipped)d 条，'
+          '无基本工资 %(missing_base)d 人，实发合计 %(total).2f 元，耗时 %(elapsed).2fs' % result.to_dict())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""下拉框用的参考数据（部门、职位、可选上级、员工名单）：按版本号缓存在进程内
+
+reference_versions 只有一行，每张表一个版本号，由触发器在写入时递增。
+读取时先查这一行（主键查询），版本未变直接返回预先构建好的列表，不再访问部门、职位、员工表；
+其他进程写入后版本号变化，本进程下一次读取即重新加载。
+"""
+from cache import VersionedValue
+
+MANAGER_ROLES = ('领导', '主管', '组长')
+VERSIONED_TABLES = ('departments', 'positions', 'employees')
+
+REFERENCE_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_reference_departments_ins AFTER INSERT ON departments BEGIN
+        UPDATE reference_versions SET departments = departments + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_reference_departments_del AFTER DELETE ON departments BEGIN
+        UPDATE reference_versions SET departments = departments + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_reference_departments_upd AFTER UPDATE OF name ON departments BEGIN
+        UPDATE reference_versions SET departments = departments + 1 WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_reference_positions_ins AFTER INSERT ON positions BEGIN
+        UPDATE reference_versions SET positions = positions + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_reference_positions_del AFTER DELETE ON positions BEGIN
+        UPDATE reference_versions SET positions = positions + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_reference_positions_upd AFTER UPDATE OF title ON positions BEGIN
+        UPDATE reference_versions SET positions = positions + 1 WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_reference_employees_ins AFTER INSERT ON employees BEGIN
+        UPDATE reference_versions SET employees = employees + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_reference_employees_del AFTER DELETE ON employees BEGIN
+        UPDATE reference_versions SET employees = employees + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_reference_employees_upd
+    AFTER UPDATE OF name, role, department_id, position_id ON employees BEGIN
+        UPDATE reference_versions SET employees = employees + 1 WHERE id = 1;
+    END;
+'''
+
+
+def create_reference_schema(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reference_versions (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            departments INTEGER NOT NULL DEFAULT 0,
+            positions INTEGER NOT NULL DEFAULT 0,
+            employees INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO reference_versions (id) VALUES (1)')
+    # 可选上级按角色筛选
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_role ON employees(role)')
+    cursor.executescript(REFERENCE_TRIGGERS)
+    conn.commit()
+
+
+def load_versions(conn):
+    row = conn.execute('SELECT departments, positions, employees FROM reference_versions WHERE id = 1').fetchone()
+    return dict(zip(VERSIONED_TABLES, row)) if row else dict.fromkeys(VERSIONED_TABLES, 0)
+
+
+def load_departments(conn):
+    return [dict(row) for row in conn.execute('SELECT * FROM departments ORDER BY name')]
+
+
+def load_positions(conn):
+    return [dict(row) for row in conn.execute('SELECT * FROM positions ORDER BY title')]
+
+
+def load_managers(conn):
+    return [dict(row) for row in conn.execute('''
+        SELECT e.*, d.name as dept_name, p.title as pos_title
+        FROM employees e
+        LEFT JOIN departments d ON e.department_id = d.id
+        LEFT JOIN positions p ON e.position_id = p.id
+        WHERE e.role IN (%s)
+        ORDER BY e.name
+    ''' % ', '.join('?' * len(MANAGER_ROLES)), MANAGER_ROLES)]
+
+
+def load_employee_options(conn):
+    return [dict(row) for row in conn.execute('SELECT id, name FROM employees ORDER BY name')]
+
+
+# 名称 -> (缓存, 依赖的表)
+REFERENCE_DATA = {
+    'departments': (VersionedValue('ref_departments', load_departments), ('departments',)),
+    'positions': (VersionedValue('ref_positions', load_positions), ('positions',)),
+    'managers': (VersionedValue('ref_managers', load_managers), ('employees', 'departments', 'positions')),
+    'employee_options': (VersionedValue('ref_employee_options', load_employee_options), ('employees',)),
+}
+
+
+def reference_data(conn, *names):
+    """读取一次版本号，返回 {名称: 列表}；返回的列表为共享缓存，调用方不要修改"""
+    versions = load_versions(conn)
+    result = {}
+    for name in names:
+        cache, tables = REFERENCE_DATA[name]
+        result[name] = cache.get(tuple(versions[table] for table in tables), conn)
+    return result
@@ -0,0 +1,355 @@
+"""薪资分析：按 (部门, 月份) 预聚合薪资，报表只读聚合表
+
+salary_monthly 存每个部门每月的发放人次与各项金额合计（整数分），
+salary_monthly_bands 存同一粒度下按 BAND_WIDTH 元分档的人数直方图，用于计算中位数等分位数。
+两张表由触发器随 salaries 增删改增量维护；员工调岗或删除时把其历史薪资整体移到新部门或扣除，
+与实时按 salaries JOIN employees 统计的口径一致。分位数在直方图上用窗口函数累计后档内线性插值，
+误差不超过一个档宽。
+
+用法：python salary_analytics.py verify | rebuild
+"""
+import sys
+from datetime import date
+
+BAND_WIDTH = 500          # 分位数直方图档宽（元）
+DEFAULT_MONTHS = 12
+PERCENTILES = (('p25', 0.25), ('median', 0.5), ('p75', 0.75), ('p90', 0.9))
+NO_DEPARTMENT = 0         # 未分配部门（WITHOUT ROWID 主键列不能为 NULL）
+
+# rows 为产出 (department_id, pay_date, total, base_salary, bonus, deduction) 的查询，sign 为 1 或 -1
+_MONTHLY_UPSERT = '''
+    INSERT INTO salary_monthly (department_id, month, payslips, total_cents, base_cents, bonus_cents, deduction_cents)
+    SELECT department_id, strftime('%%Y-%%m', pay_date), %(sign)d * COUNT(*),
+           %(sign)d * SUM(CAST(ROUND(total * 100) AS INTEGER)),
+           %(sign)d * SUM(CAST(ROUND(base_salary * 100) AS INTEGER)),
+           %(sign)d * SUM(CAST(ROUND(COALESCE(bonus, 0) * 100) AS INTEGER)),
+           %(sign)d * SUM(CAST(ROUND(COALESCE(deduction, 0) * 100) AS INTEGER))
+    FROM (%(rows)s) WHERE strftime('%%Y-%%m', pay_date) IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT(department_id, month) DO UPDATE SET
+        payslips = payslips + excluded.payslips,
+        total_cents = total_cents + excluded.total_cents,
+        base_cents = base_cents + excluded.base_cents,
+        bonus_cents = bonus_cents + excluded.bonus_cents,
+        deduction_cents = deduction_cents + excluded.deduction_cents;
+    INSERT INTO salary_monthly_bands (department_id, month, band, cnt)
+    SELECT department_id, strftime('%%Y-%%m', pay_date), CAST(total / %(band)d AS INTEGER), %(sign)d * COUNT(*)
+    FROM (%(rows)s) WHERE strftime('%%Y-%%m', pay_date) IS NOT NULL AND total IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT(department_id, month, band) DO UPDATE SET cnt = cnt + excluded.cnt;
+'''
+
+_SALARY_ROW = '''
+    SELECT COALESCE(e.department_id, %d) as department_id, %%(row)s.pay_date as pay_date, %%(row)s.total as total,
+           %%(row)s.base_salary as base_salary, %%(row)s.bonus as bonus, %%(row)s.deduction as deduction
+    FROM employees e WHERE e.id = %%(row)s.employee_id
+''' % NO_DEPARTMENT
+
+_EMPLOYEE_SALARIES = '''
+    SELECT COALESCE(%%(row)s.department_id, %d) as department_id, s.pay_date, s.total, s.base_salary, s.bonus, s.deduction
+    FROM salaries s WHERE s.employee_id = OLD.id
+''' % NO_DEPARTMENT
+
+
+def _apply(rows, sign):
+    return _MONTHLY_UPSERT % {'rows': rows, 'sign': sign, 'band': BAND_WIDTH}
+
+
+ANALYTICS_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_salary_analytics_ins AFTER INSERT ON salaries BEGIN
+        %(add_new)s
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_salary_analytics_del AFTER DELETE ON salaries BEGIN
+        %(sub_old)s
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_salary_analytics_upd
+    AFTER UPDATE OF employee_id, base_salary, bonus, deduction, total, pay_date ON salaries BEGIN
+        %(sub_old)s
+        %(add_new)s
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_salary_analytics_employee_move AFTER UPDATE OF department_id ON employees
+    WHEN OLD.department_id IS NOT NEW.department_id BEGIN
+        %(move_out)s
+        %(move_in)s
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_salary_analytics_employee_del AFTER DELETE ON employees BEGIN
+        %(move_out)s
+    END;
+''' % {
+    'add_new': _apply(_SALARY_ROW % {'row': 'NEW'}, 1),
+    'sub_old': _apply(_SALARY_ROW % {'row': 'OLD'}, -1),
+    'move_out': _apply(_EMPLOYEE_SALARIES % {'row': 'OLD'}, -1),
+    'move_in': _apply(_EMPLOYEE_SALARIES % {'row': 'NEW'}, 1),
+}
+
+_ALL_SALARIES = _SALARY_ROW.replace('FROM employees e WHERE e.id = %(row)s.employee_id',
+                                    'FROM salaries s JOIN employees e ON e.id = s.employee_id') % {'row': 's'}
+
+
+def create_analytics_schema(conn):
+    """创建聚合表和维护触发器；聚合表为空而已有薪资时全量重建"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS salary_monthly (
+            department_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            payslips INTEGER NOT NULL DEFAULT 0,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            base_cents INTEGER NOT NULL DEFAULT 0,
+            bonus_cents INTEGER NOT NULL DEFAULT 0,
+            deduction_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (department_id, month)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_salary_monthly_month ON salary_monthly(month)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS salary_monthly_bands (
+            department_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            band INTEGER NOT NULL,
+            cnt INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, department_id, band)
+        ) WITHOUT ROWID
+    ''')
+    cursor.executescript(ANALYTICS_TRIGGERS)
+
+    has_rows = cursor.execute('SELECT 1 FROM salary_monthly LIMIT 1').fetchone()
+    has_salaries = cursor.execute('SELECT 1 FROM salaries LIMIT 1').fetchone()
+    if has_salaries and not has_rows:
+        rebuild_analytics(conn)
+
+
+def rebuild_analytics(conn):
+    """按 salaries 全量重算聚合表（单个事务内完成）"""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('DELETE FROM salary_monthly')
+        cursor.execute('DELETE FROM salary_monthly_bands')
+        for statement in _apply(_ALL_SALARIES, 1).split(';'):
+            if statement.strip():
+                cursor.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def verify_analytics(conn):
+    """对比聚合表与实时统计，返回不一致的 [(部门, 月份, 聚合值, 实际值)]"""
+    expected = '''
+        SELECT department_id, strftime('%%Y-%%m', pay_date) as month, COUNT(*) as payslips,
+               SUM(CAST(ROUND(total * 100) AS INTEGER)) as total_cents
+        FROM (%s) WHERE strftime('%%Y-%%m', pay_date) IS NOT NULL GROUP BY 1, 2
+    ''' % _ALL_SALARIES
+    rows = conn.execute('''
+        WITH expected AS (%s),
+        stored AS (SELECT department_id, month, payslips, total_cents FROM salary_monthly WHERE payslips <> 0)
+        SELECT x.department_id, x.month, s.payslips, s.total_cents, x.payslips, x.total_cents
+        FROM expected x LEFT JOIN stored s USING (department_id, month)
+        WHERE s.payslips IS NOT x.payslips OR s.total_cents IS NOT x.total_cents
+        UNION ALL
+        SELECT s.department_id, s.month, s.payslips, s.total_cents, NULL, NULL
+        FROM stored s WHERE NOT EXISTS (
+            SELECT 1 FROM expected x WHERE x.department_id = s.department_id AND x.month = s.month
+        )
+    ''' % expected).fetchall()
+    mismatches = [(row[0], row[1], (row[2], row[3]), (row[4], row[5])) for row in rows]
+
+    bands = conn.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT department_id, month, SUM(cnt) as cnt FROM salary_monthly_bands GROUP BY 1, 2
+        ) b LEFT JOIN salary_monthly m USING (department_id, month)
+        WHERE b.cnt IS NOT COALESCE(m.payslips, 0)
+    ''').fetchone()[0]
+    if bands:
+        mismatches.append(('bands', None, bands, 0))
+    return mismatches
+
+
+# ---------- 报表（只读聚合表） ----------
+
+def parse_month(value):
+    """'YYYY-MM' -> (年, 月)，格式不对时抛 ValueError"""
+    parsed = date.fromisoformat(value + '-01')
+    return parsed.year, parsed.month
+
+
+def shift_month(month, delta):
+    year, mon = parse_month(month)
+    index = year * 12 + mon - 1 + delta
+    return '%04d-%02d' % (index // 12, index % 12 + 1)
+
+
+def month_range(month_from=None, month_to=None, months=DEFAULT_MONTHS):
+    """默认取截至本月的最近 months 个月；参数非法时抛 ValueError"""
+    month_to = month_to or date.today().strftime('%Y-%m')
+    month_from = month_from or shift_month(month_to, 1 - months)
+    parse_month(month_from)
+    parse_month(month_to)
+    if month_from > month_to:
+        raise ValueError('起始月份晚于结束月份')
+    return month_from, month_to
+
+
+# partition 为分组列：按部门时为 'month, department_id'（与主键顺序一致，窗口无需排序），全公司时为 'month'
+_PERCENTILE_SQL = '''
+    bands AS (%(bands)s),
+    running AS (
+        SELECT %(partition)s, band, cnt,
+               SUM(cnt) OVER (PARTITION BY %(partition)s ORDER BY band ROWS UNBOUNDED PRECEDING) as running,
+               SUM(cnt) OVER (PARTITION BY %(partition)s) as n
+        FROM bands
+    ),
+    percentiles AS MATERIALIZED (
+        SELECT %(partition)s, %(columns)s
+        FROM running GROUP BY %(partition)s
+    )
+'''
+
+
+DEPARTMENT_BANDS = '''
+    SELECT month, department_id, band, cnt FROM salary_monthly_bands
+    WHERE month BETWEEN ? AND ? AND cnt > 0 %s
+'''
+
+COMPANY_BANDS = '''
+    SELECT month, band, SUM(cnt) as cnt FROM salary_monthly_bands
+    WHERE month BETWEEN ? AND ? AND cnt > 0
+    GROUP BY month, band
+'''
+
+
+def _percentile_ctes(partition, bands):
+    # 只有累计人数首次达到 n * p 的那一档满足条件，在档内按人数线性插值
+    columns = ', '.join(
+        'MAX(CASE WHEN running >= n * %(p)s AND running - cnt < n * %(p)s '
+        'THEN band + (n * %(p)s - running + cnt) * 1.0 / cnt END) as %(name)s'
+        % {'p': p, 'name': name} for name, p in PERCENTILES)
+    return _PERCENTILE_SQL % {'partition': partition, 'columns': columns, 'bands': bands}
+
+
+def _finish(row):
+    """分转元、档位转金额，计算平均值与环比（仅上一行恰为上个月时）"""
+    item = dict(row)
+    payslips = item['payslips']
+    for name in ('total', 'base', 'bonus', 'deduction'):
+        item[name] = item.pop(name + '_cents') / 100.0
+    item['avg'] = round(item['total'] / payslips, 2) if payslips else None
+    for name, _ in PERCENTILES:
+        item[name] = round(item[name] * BAND_WIDTH, 2) if item[name] is not None else None
+
+    prev_total = item.pop('prev_total_cents')
+    prev_payslips = item.pop('prev_payslips')
+    if item.pop('prev_month') == shift_month(item['month'], -1) and prev_total is not None:
+        prev_total /= 100.0
+        item['mom_delta'] = round(item['total'] - prev_total, 2)
+        item['mom_pct'] = round((item['total'] - prev_total) / prev_total * 100, 2) if prev_total else None
+        item['avg_delta'] = round(item['avg'] - prev_total / prev_payslips, 2) if prev_payslips else None
+    else:
+        item['mom_delta'] = item['mom_pct'] = item['avg_delta'] = None
+    return item
+
+
+def department_trend(conn, month_from, month_to, department_id=None):
+    """各部门逐月薪资：人次、合计、平均、分位数、环比"""
+    filter_sql = 'AND department_id = ?' if department_id is not None else ''
+    dept_params = [department_id] if department_id is not None else []
+    sql = 'WITH ' + _percentile_ctes('month, department_id', DEPARTMENT_BANDS % filter_sql) + ''',
+        monthly AS (
+            SELECT department_id, month, payslips, total_cents, base_cents, bonus_cents, deduction_cents,
+                   LAG(month) OVER w as prev_month,
+                   LAG(total_cents) OVER w as prev_total_cents,
+                   LAG(payslips) OVER w as prev_payslips
+            FROM salary_monthly
+            WHERE month BETWEEN ? AND ? AND payslips > 0 %s
+            WINDOW w AS (PARTITION BY department_id ORDER BY month)
+        )
+        SELECT m.*, d.name as dept_name, p.p25, p.median, p.p75, p.p90
+        FROM monthly m
+        LEFT JOIN departments d ON d.id = m.department_id
+        LEFT JOIN percentiles p ON p.department_id = m.department_id AND p.month = m.month
+        WHERE m.month >= ?
+        ORDER BY m.month, m.department_id
+    ''' % filter_sql
+    params = [month_from, month_to] + dept_params
+    params += [shift_month(month_from, -1), month_to] + dept_params + [month_from]
+    report = []
+    for row in conn.execute(sql, params):
+        item = _finish(row)
+        if item['department_id'] == NO_DEPARTMENT:
+            item['department_id'] = None
+        report.append(item)
+    return report
+
+
+def company_trend(conn, month_from, month_to):
+    """全公司逐月薪资（各部门聚合行再汇总）"""
+    sql = 'WITH ' + _percentile_ctes('month', COMPANY_BANDS) + ''',
+        totals AS (
+            SELECT month, SUM(payslips) as payslips, SUM(total_cents) as total_cents, SUM(base_cents) as base_cents,
+                   SUM(bonus_cents) as bonus_cents, SUM(deduction_cents) as deduction_cents,
+                   COUNT(*) as departments
+            FROM salary_monthly
+            WHERE month BETWEEN ? AND ? AND payslips > 0
+            GROUP BY month
+        ),
+        monthly AS (
+            SELECT *, LAG(month) OVER w as prev_month, LAG(total_cents) OVER w as prev_total_cents,
+                   LAG(payslips) OVER w as prev_payslips
+            FROM totals
+            WINDOW w AS (ORDER BY month)
+        )
+        SELECT m.*, p.p25, p.median, p.p75, p.p90
+        FROM monthly m LEFT JOIN percentiles p ON p.month = m.month
+        WHERE m.month >= ?
+        ORDER BY m.month
+    '''
+    params = [month_from, month_to, shift_month(month_from, -1), month_to, month_from]
+    return [_finish(row) for row in conn.execute(sql, params)]
+
+
+def latest_month(conn):
+    row = conn.execute('SELECT MAX(month) FROM salary_monthly WHERE payslips > 0').fetchone()
+    return row[0] if row else None
+
+
+def dashboard_panel(conn):
+    """工作台薪资面板：最近一个有薪资的月份，全公司合计和各部门明细"""
+    month = latest_month(conn)
+    if month is None:
+        return None
+    company = company_trend(conn, month, month)
+    return {
+        'month': month,
+        'company': company[0] if company else None,
+        'departments': sorted(department_trend(conn, month, month), key=lambda d: -d['total']),
+    }
+
+
+def main():
+    from db import connect
+    from init_db import DATABASE
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'verify'
+    conn = connect(DATABASE)
+    create_analytics_schema(conn)
+    if command == 'rebuild':
+        rebuild_analytics(conn)
+        print('薪资聚合表已按基表重建。')
+    elif command == 'verify':
+        mismatches = verify_analytics(conn)
+        for department_id, month, stored, actual in mismatches:
+            print('部门 %-6s %-8s 聚合值 %-24s 实际值 %s' % (department_id, month, stored, actual))
+        print('校验完成：%s' % ('共 %d 项不一致，可执行 rebuild 修复' % len(mismatches) if mismatches else '全部一致'))
+        conn.close()
+        sys.exit(1 if mismatches else 0)
+    else:
+        print('用法：python salary_analytics.py verify | rebuild')
+        sys.exit(2)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
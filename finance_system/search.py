@@ -0,0 +1,322 @@
+"""全文检索：员工（姓名、邮箱、电话）与通知（标题、内容）的 FTS5 索引
+
+索引表为外部内容表（content=基表），只存倒排索引，由触发器随基表增删改同步。
+使用 trigram 分词：按三个字符切分，中文姓名、邮箱片段、电话号码片段都能按子串命中，
+不依赖中文分词词典。trigram 要求每个检索词至少 3 个字符，更短的词（如姓氏、名字、两个字的姓名）
+改用基表上的 LIKE 子串条件。结果按 bm25 相关度排序，(相关度, id) 键集分页，命中部分用 <mark> 标出。
+
+用法：python search.py check | rebuild
+"""
+import re
+import sys
+
+from markupsafe import escape
+
+from pagination import Page, fetch_page, page_size
+
+# highlight()/snippet() 的标记用控制字符，HTML 转义后再替换成 <mark>，避免与正文中的尖括号混淆
+MARK_OPEN, MARK_CLOSE = '\x02', '\x03'
+MIN_TERM_LENGTH = 3
+MAX_TERMS = 8
+SNIPPET_TOKENS = 24
+SNIPPET_CHARS = 40
+
+SEARCH_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_search_employees_ins AFTER INSERT ON employees BEGIN
+        INSERT INTO employees_fts (rowid, name, email, phone) VALUES (NEW.id, NEW.name, NEW.email, NEW.phone);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_search_employees_del AFTER DELETE ON employees BEGIN
+        INSERT INTO employees_fts (employees_fts, rowid, name, email, phone)
+        VALUES ('delete', OLD.id, OLD.name, OLD.email, OLD.phone);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_search_employees_upd AFTER UPDATE OF name, email, phone ON employees BEGIN
+        INSERT INTO employees_fts (employees_fts, rowid, name, email, phone)
+        VALUES ('delete', OLD.id, OLD.name, OLD.email, OLD.phone);
+        INSERT INTO employees_fts (rowid, name, email, phone) VALUES (NEW.id, NEW.name, NEW.email, NEW.phone);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_search_notices_ins AFTER INSERT ON notices BEGIN
+        INSERT INTO notices_fts (rowid, title, content) VALUES (NEW.id, NEW.title, NEW.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_search_notices_del AFTER DELETE ON notices BEGIN
+        INSERT INTO notices_fts (notices_fts, rowid, title, content) VALUES ('delete', OLD.id, OLD.title, OLD.content);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_search_notices_upd AFTER UPDATE OF title, content ON notices BEGIN
+        INSERT INTO notices_fts (notices_fts, rowid, title, content) VALUES ('delete', OLD.id, OLD.title, OLD.content);
+        INSERT INTO notices_fts (rowid, title, content) VALUES (NEW.id, NEW.title, NEW.content);
+    END;
+'''
+
+# 索引表 -> (基表, 索引列)
+SEARCH_INDEXES = {
+    'employees_fts': ('employees', ('name', 'email', 'phone')),
+    'notices_fts': ('notices', ('title', 'content')),
+}
+
+
+def create_search_schema(conn):
+    """创建全文索引表和同步触发器；索引为空而基表有数据时（新建或批量导入后）全量重建"""
+    cursor = conn.cursor()
+    for index, (table, columns) in SEARCH_INDEXES.items():
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(
+                %s, content='%s', content_rowid='id', tokenize='trigram'
+            )
+        ''' % (index, ', '.join(columns), table))
+    cursor.executescript(SEARCH_TRIGGERS)
+    # 员工列表按姓名排序（listings.EMPLOYEE_SORTS）
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_name ON employees(name)')
+
+    for index, (table, _) in SEARCH_INDEXES.items():
+        has_rows = cursor.execute('SELECT 1 FROM %s_docsize LIMIT 1' % index).fetchone()
+        has_source = cursor.execute('SELECT 1 FROM %s LIMIT 1' % table).fetchone()
+        if has_source and not has_rows:
+            cursor.execute("INSERT INTO %s (%s) VALUES ('rebuild')" % (index, index))
+    conn.commit()
+
+
+def rebuild_search(conn):
+    """按基表全量重建全部全文索引"""
+    for index in SEARCH_INDEXES:
+        conn.execute("INSERT INTO %s (%s) VALUES ('rebuild')" % (index, index))
+    conn.commit()
+
+
+def check_search(conn):
+    """逐个校验索引与基表是否一致，返回出错的索引名列表"""
+    broken = []
+    for index in SEARCH_INDEXES:
+        try:
+            conn.execute("INSERT INTO %s (%s, rank) VALUES ('integrity-check', 1)" % (index, index))
+        except Exception:
+            broken.append(index)
+    # integrity-check 以 INSERT 的形式执行，会开启写事务
+    conn.rollback()
+    return broken
+
+
+def parse_terms(q):
+    """按空白切分检索词（去重，最多 MAX_TERMS 个）"""
+    terms = []
+    for term in (q or '').split():
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def match_expression(terms):
+    """每个词作为带引号的短语，多个词之间为 AND；引号按 FTS5 规则转义"""
+    return ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _like_pattern(term):
+    return '%' + _escape_like(term) + '%'
+
+
+def like_clauses(columns, terms):
+    """短词退回 LIKE：每个词须命中任一列"""
+    clauses, params = [], []
+    for term in terms:
+        clauses.append('(%s)' % ' OR '.join("%s LIKE ? ESCAPE '\\'" % column for column in columns))
+        params.extend([_like_pattern(term)] * len(columns))
+    return clauses, params
+
+
+def render_marked(text):
+    """HTML 转义 highlight()/snippet() 的结果，再把标记换成 <mark>"""
+    if text is None:
+        return None
+    return str(escape(text)).replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>')
+
+
+def mark_terms(text, terms, width=None):
+    """LIKE 路径下在 Python 中标出命中词；给定 width 时截取首个命中附近的片段"""
+    if text is None:
+        return None
+    pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.I)
+    prefix = suffix = ''
+    if width and len(text) > width:
+        found = pattern.search(text)
+        start = max(0, (found.start() if found else 0) - width // 4)
+        prefix, suffix = ('…' if start else ''), ('…' if start + width < len(text) else '')
+        text = text[start:start + width]
+    parts, last = [], 0
+    for found in pattern.finditer(text):
+        parts.append(str(escape(text[last:found.start()])))
+        parts.append('<mark>%s</mark>' % escape(found.group()))
+        last = found.end()
+    parts.append(str(escape(text[last:])))
+    return prefix + ''.join(parts) + suffix
+
+
+def _search_page(conn, inner_sql, params, args):
+    """内层查询给出 score 列，外层按 (score, id) 升序做键集分页"""
+    return fetch_page(conn, 'SELECT * FROM (%s)' % inner_sql, [], params, 'score', 'id', 'score',
+                      args.get('cursor'), page_size(args), descending=False)
+
+
+def split_terms(terms):
+    """分出可走全文索引的长词和需要 LIKE 的短词"""
+    return ([term for term in terms if len(term) >= MIN_TERM_LENGTH],
+            [term for term in terms if len(term) < MIN_TERM_LENGTH])
+
+
+def _marked_rows(page, render):
+    rows = []
+    for row in page.items:
+        item = dict(row)
+        render(item)
+        rows.append(item)
+    return Page(rows, page.next_cursor)
+
+
+EMPLOYEE_COLUMNS = '''
+    e.id, e.name, e.email, e.phone, e.role, e.department_id, d.name as dept_name, p.title as pos_title
+'''
+
+EMPLOYEE_JOINS = '''
+    LEFT JOIN departments d ON e.department_id = d.id
+    LEFT JOIN positions p ON e.position_id = p.id
+'''
+
+# manager_id 非空时只检索其全部下属（与员工列表相同的闭包表条件）
+EMPLOYEE_SCOPE = 'e.id IN (SELECT descendant_id FROM employee_closure WHERE ancestor_id = ? AND depth > 0)'
+
+
+def search_employees(conn, args, manager_id=None):
+    """检索员工：?q=&cursor=&limit=，结果带 name_html/email_html/phone_html
+
+    有长词时走全文索引，短词作为附加的 LIKE 条件；全是短词时（如按姓氏、名字或两个字的姓名查找）
+    按 LIKE 子串匹配，“伟”也能找到“张伟”。结果按第一个词排序：姓名完全相同、姓名以它开头、其他命中，
+    同一档内按 id；每页最多 limit 条。
+    """
+    terms = parse_terms(args.get('q'))
+    if not terms:
+        return Page([], None)
+
+    long_terms, short_terms = split_terms(terms)
+    clauses, params = ([EMPLOYEE_SCOPE], [manager_id]) if manager_id is not None else ([], [])
+    if long_terms:
+        like, like_params = like_clauses(('e.name', 'e.email', 'e.phone'), short_terms)
+        sql = '''
+            SELECT %s, bm25(employees_fts, 10.0, 2.0, 2.0) as score,
+                   highlight(employees_fts, 0, '%s', '%s') as name_hl,
+                   highlight(employees_fts, 1, '%s', '%s') as email_hl,
+                   highlight(employees_fts, 2, '%s', '%s') as phone_hl
+            FROM employees_fts
+            JOIN employees e ON e.id = employees_fts.rowid
+            %s
+            WHERE %s
+        ''' % ((EMPLOYEE_COLUMNS,) + (MARK_OPEN, MARK_CLOSE) * 3 +
+               (EMPLOYEE_JOINS, ' AND '.join(['employees_fts MATCH ?'] + clauses + like)))
+        page = _search_page(conn, sql, [match_expression(long_terms)] + params + like_params, args)
+
+        def render(item):
+            item.pop('score')
+            for column in ('name', 'email', 'phone'):
+                item[column + '_html'] = render_marked(item.pop(column + '_hl'))
+        return _marked_rows(page, render)
+
+    like, like_params = like_clauses(('e.name', 'e.email', 'e.phone'), short_terms)
+    sql = '''
+        SELECT %s, CASE WHEN e.name = ? THEN 0 WHEN e.name LIKE ? ESCAPE '\\' THEN 1 ELSE 2 END as score
+        FROM employees e
+        %s
+        WHERE %s
+    ''' % (EMPLOYEE_COLUMNS, EMPLOYEE_JOINS, ' AND '.join(clauses + like))
+    first = short_terms[0]
+    page = _search_page(conn, sql, [first, _escape_like(first) + '%'] + params + like_params, args)
+
+    def render(item):
+        item.pop('score')
+        for column in ('name', 'email', 'phone'):
+            item[column + '_html'] = mark_terms(item[column], terms)
+    return _marked_rows(page, render)
+
+
+NOTICE_COLUMNS = 'n.id, n.title, n.author_id, n.priority, n.is_active, n.created_at, u.username as author_name'
+
+
+def notice_scope(author_id=None, active_only=False):
+    clauses, params = [], []
+    if author_id is not None:
+        clauses.append('n.author_id = ?')
+        params.append(author_id)
+    if active_only:
+        clauses.append('n.is_active = 1')
+    return clauses, params
+
+
+def search_notices(conn, args, author_id=None, active_only=False):
+    """检索通知：?q=&cursor=&limit=，结果带 title_html 和内容摘要 snippet_html
+
+    有长词时走全文索引；全是短词时对通知表做 LIKE 子串匹配（通知量小），标题命中排在内容命中之前。
+    """
+    terms = parse_terms(args.get('q'))
+    if not terms:
+        return Page([], None)
+
+    long_terms, short_terms = split_terms(terms)
+    clauses, params = notice_scope(author_id, active_only)
+    like, like_params = like_clauses(('n.title', 'n.content'), short_terms)
+    if long_terms:
+        sql = '''
+            SELECT %s, bm25(notices_fts, 5.0, 1.0) as score,
+                   highlight(notices_fts, 0, '%s', '%s') as title_hl,
+                   snippet(notices_fts, 1, '%s', '%s', '…', %d) as snippet_hl
+            FROM notices_fts
+            JOIN notices n ON n.id = notices_fts.rowid
+            LEFT JOIN users u ON n.author_id = u.id
+            WHERE %s
+        ''' % (NOTICE_COLUMNS, MARK_OPEN, MARK_CLOSE, MARK_OPEN, MARK_CLOSE, SNIPPET_TOKENS,
+               ' AND '.join(['notices_fts MATCH ?'] + clauses + like))
+        page = _search_page(conn, sql, [match_expression(long_terms)] + params + like_params, args)
+
+        def render(item):
+            item.pop('score')
+            item['title_html'] = render_marked(item.pop('title_hl'))
+            item['snippet_html'] = render_marked(item.pop('snippet_hl'))
+        return _marked_rows(page, render)
+
+    sql = '''
+        SELECT %s, n.content, CASE WHEN n.title LIKE ? ESCAPE '\\' THEN 0 ELSE 1 END as score
+        FROM notices n
+        LEFT JOIN users u ON n.author_id = u.id
+        WHERE %s
+    ''' % (NOTICE_COLUMNS, ' AND '.join(clauses + like))
+    page = _search_page(conn, sql, [_like_pattern(short_terms[0])] + params + like_params, args)
+
+    def render(item):
+        item.pop('score')
+        item['title_html'] = mark_terms(item['title'], terms)
+        item['snippet_html'] = mark_terms(item.pop('content'), terms, SNIPPET_CHARS)
+    return _marked_rows(page, render)
+
+
+def main():
+    from db import connect
+    from init_db import DATABASE
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    conn = connect(DATABASE)
+    create_search_schema(conn)
+    if command == 'rebuild':
+        rebuild_search(conn)
+        print('全文索引已重建。')
+    elif command == 'check':
+        broken = check_search(conn)
+        print('校验完成：%s' % ('、'.join(broken) + ' 与基表不一致' if broken else '全部一致'))
+        conn.close()
+        sys.exit(1 if broken else 0)
+    else:
+        print('用法：python search.py check | rebuild')
+        sys.exit(2)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+"""生产入口：预先 fork N 个 worker 进程共享同一个监听 socket，每个 worker 用固定大小的线程池处理请求
+
+主进程只负责监听和管理 worker，不导入任何应用模块；表结构迁移在一个短命的子进程里完成（启动时和每次重载前），
+worker 不再迁移。worker 在 fork 之后才导入应用，打开连接池并预热（建立连接、加载缓存、编译模板）后才通知主进程就绪。
+worker 只有空闲线程时才 accept，忙碌的 worker 不会抢连接，新连接留在内核队列里由其他 worker 取走。
+通知推送（/notices/stream）的长连接在发出首批数据后交给应用的推送线程，不占用线程池。
+
+信号：
+    SIGHUP          平滑重载：先迁移表结构，再启动一组新 worker（重新导入全部代码），
+                    全部就绪后再让旧 worker 处理完手头请求退出；迁移失败时放弃重载
+    SIGTERM/SIGINT  平滑退出：worker 停止 accept，处理完已接收的请求、写完打卡缓冲后退出
+worker 异常退出时主进程自动补上。
+
+用法：python serve.py [--host 0.0.0.0] [--port 8000] [--workers CPU 核数] [--threads 8]
+                      [--database hr_system.db] [--session-store cookie|sqlite] [--access-log]
+"""
+import argparse
+import os
+import resource
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+MIGRATE_SCRIPT = '''
+import sys
+from db import connect
+from init_db import create_schema
+conn = connect(sys.argv[1])
+create_schema(conn)
+conn.close()
+'''
+
+
+def migrate(database):
+    """在子进程里迁移表结构，返回是否成功
+
+    主进程一旦导入 init_db，就会连带导入大部分应用模块，fork 出的 worker 继承这些旧模块，重载时只会重新导入 app.py。
+    """
+    process = subprocess.run([sys.executable, '-c', MIGRATE_SCRIPT, os.path.abspath(database)], cwd=HERE)
+    return process.returncode == 0
+
+
+class RequestHandler(WSGIRequestHandler):
+    # 不做 keep-alive：长连接会一直占住线程池中的线程
+    protocol_version = 'HTTP/1.0'
+    access_log = False
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+    def make_environ(self):
+        environ = super().make_environ()
+        # 长连接（通知推送）发出首批数据后把 socket 交给应用自己管理，不再占用线程池
+        environ['serve.handoff'] = lambda callback: self.server.handoff(self.request, callback)
+        return environ
+
+
+class ThreadPoolWSGIServer(BaseWSGIServer):
+    """固定线程池的 WSGI 服务器：没有空闲线程时不 accept"""
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, app, threads, listener, handler=RequestHandler):
+        host, port = listener.getsockname()[:2]
+        super().__init__(host, port, app, handler=handler, fd=listener.fileno())
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix='request')
+        self._slots = threading.Semaphore(threads)
+        self._handoffs = {}
+        self._handoff_lock = threading.Lock()
+
+    def handoff(self, request, callback):
+        """请求处理完后不关闭连接，而是调用 callback(socket) 把连接交出去"""
+        with self._handoff_lock:
+            self._handoffs[request] = callback
+
+    def _handle_request_noblock(self):
+        """serve_forever 在 socket 可读时调用：先占一个线程再 accept。
+        监听 socket 是非阻塞的，连接被其他 worker 抢先取走时 accept 立即失败，归还线程继续等待"""
+        self._slots.acquire()
+        try:
+            request, client_address = self.get_request()
+        except OSError:
+            self._slots.release()
+            return
+        self._executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self._handoff_lock:
+                callback = self._handoffs.pop(request, None)
+            try:
+                if callback is None:
+                    self.shutdown_request(request)
+                else:
+                    callback(request)
+            except Exception:
+                self.shutdown_request(request)
+            finally:
+                self._slots.release()
+
+    def handle_timeout(self):
+        pass
+
+    def serve_forever(self, poll_interval=0.5):
+        """shutdown() 之后停止 accept，等已接收的请求处理完才返回"""
+        super().serve_forever(poll_interval)
+        self._executor.shutdown(wait=True)
+
+
+def warm_up(app, threads):
+    """预先打开连接池中的连接、加载进程内缓存并编译模板，避免第一批请求承担这些开销"""
+    from app import sidebar_notices
+    from db import READER, WRITER, get_pool, get_read_db
+    from reference import REFERENCE_DATA, reference_data
+    from salary_analytics import dashboard_panel
+    from stats import load_dashboard_stats
+
+    with app.app_context():
+        for role in (WRITER, READER):
+            pool = get_pool(app, role)
+            conns = [pool.acquire() for _ in range(min(threads, pool.max_size))]
+            for conn in conns:
+                pool.release(conn)
+
+        conn = get_read_db()
+        reference_data(conn, *REFERENCE_DATA)
+        sidebar_notices.get()
+        load_dashboard_stats(conn)
+        dashboard_panel(conn)
+
+    for name in app.jinja_env.list_templates():
+        if name.endswith('.html'):
+            app.jinja_env.get_template(name)
+
+
+def run_worker(listener, options, ready_fd):
+    """worker 进程主体：导入应用、预热、通知主进程就绪，然后处理请求直到收到 SIGTERM"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from app import app
+    from attendance_archive import default_archive_dir
+
+    # 表结构已由主进程启动的迁移子进程补齐，各 worker 建写连接池时不再重复迁移、争抢写锁
+    app.extensions['db_schema'] = None
+    app.config['DATABASE'] = options.database
+    app.config['ATTENDANCE_ARCHIVE_DIR'] = default_archive_dir(options.database)
+    app.config['SESSION_STORE'] = options.session_store
+    app.config['DB_POOL_SIZE'] = max(app.config['DB_POOL_SIZE'], options.threads)
+    # 每个通知推送连接占一个文件描述符，默认的 1024 不够
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = app.config['NOTICE_STREAM_MAX_CLIENTS'] + 256
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        if hard != resource.RLIM_INFINITY:
+            wanted = min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+    RequestHandler.access_log = options.access_log
+
+    server = ThreadPoolWSGIServer(app, options.threads, listener)
+    if options.warmup:
+        warm_up(app, options.threads)
+
+    # shutdown() 会等待 serve_forever 退出，不能在信号处理函数（主线程）里直接调用
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    os.write(ready_fd, b'1')
+    os.close(ready_fd)
+    server.serve_forever()
+
+    # 推送连接断开后浏览器会自动重连到其他 worker
+    hub = app.extensions.get('notice_hub')
+    if hub is not None:
+        hub.close()
+    buffer = app.extensions.get('punch_buffer')
+    if buffer is not None:
+        buffer.close()
+    for pool in app.extensions.get('db_pools', {}).values():
+        pool.close_all()
+
+
+class Arbiter:
+    """主进程：维护 worker 数量，处理重载与退出信号"""
+
+    def __init__(self, listener, options):
+        self.listener = listener
+        self.options = options
+        self.workers = {}    # pid -> 代数
+        self.pending = {}    # 就绪通知管道的读端 -> pid（尚未就绪的 worker）
+        self.generation = 0
+        self.reloading = None  # 重载中：旧 worker 的 pid 列表
+        self.stopping = False
+        self.exit_code = 0
+        self.signals = []
+
+    def spawn(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for fd in self.pending:
+                os.close(fd)
+            code = 0
+            try:
+                run_worker(self.listener, self.options, write_fd)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        os.close(write_fd)
+        self.workers[pid] = self.generation
+        self.pending[read_fd] = pid
+        return pid
+
+    def log(self, message):
+        print('[serve %d] %s' % (os.getpid(), message), flush=True)
+
+    def stop_workers(self, pids, sig=signal.SIGTERM):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        """回收退出的 worker：已就绪的当代 worker 意外退出时补上一个；
+        启动失败（就绪前退出）时，重载中则放弃重载保留旧 worker，否则整体退出"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            generation = self.workers.pop(pid, None)
+            started = True
+            for fd, waiting in list(self.pending.items()):
+                if waiting == pid:
+                    os.close(fd)
+                    del self.pending[fd]
+                    started = False
+            if generation != self.generation or self.stopping:
+                continue
+            if started:
+                self.log('worker %d 异常退出（状态 %d），重新启动' % (pid, status))
+                self.spawn()
+            elif self.reloading is not None:
+                self.log('新 worker %d 启动失败，放弃重载，保留旧 worker' % pid)
+                self.stop_workers([p for p, g in self.workers.items() if g == self.generation])
+                # 旧 worker 归入新的一代，被放弃的新 worker 退出时不会被补上
+                self.generation += 1
+                for old in self.reloading:
+                    if old in self.workers:
+                        self.workers[old] = self.generation
+                self.reloading = None
+            else:
+                self.log('worker %d 启动失败，停止服务' % pid)
+                self.stopping = True
+                self.exit_code = 1
+
+    def wait_ready(self, timeout):
+        """等待就绪通知；返回本轮就绪的 worker"""
+        ready = []
+        if not self.pending:
+            time.sleep(timeout)
+            return ready
+        try:
+            readable, _, _ = select.select(list(self.pending), [], [], timeout)
+        except InterruptedError:
+            return ready
+        for fd in readable:
+            if not os.read(fd, 1):
+                continue  # 就绪前退出（管道关闭），留给 reap() 处理
+            os.close(fd)
+            ready.append(self.pending.pop(fd))
+        return ready
+
+    def handle_signals(self):
+        while self.signals:
+            signum = self.signals.pop(0)
+            if signum in (signal.SIGTERM, signal.SIGINT):
+                self.stopping = True
+            elif signum == signal.SIGHUP and not self.stopping and self.reloading is None:
+                self.log('开始平滑重载')
+                if not migrate(self.options.database):
+                    self.log('表结构迁移失败，放弃重载，保留旧 worker')
+                    continue
+                self.reloading = [pid for pid, generation in self.workers.items() if generation == self.generation]
+                self.generation += 1
+                for _ in range(self.options.workers):
+                    self.spawn()
+
+    def run(self):
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+
+        for _ in range(self.options.workers):
+            self.spawn()
+        host, port = self.listener.getsockname()[:2]
+        self.log('监听 http://%s:%d，%d 个 worker × %d 线程，session 存储：%s' % (
+            host, port, self.options.workers, self.options.threads, self.options.session_store))
+
+        while not self.stopping:
+            ready = self.wait_ready(0.5)
+            if ready:
+                self.log('worker %s 已就绪' % ', '.join(map(str, ready)))
+            self.handle_signals()
+            self.reap()
+            # 新一代 worker 全部就绪后再让旧 worker 退出
+            if self.reloading is not None and not any(
+                    self.workers.get(pid) == self.generation for pid in self.pending.values()):
+                self.stop_workers(self.reloading)
+                self.log('平滑重载完成，旧 worker %s 退出中' % ', '.join(map(str, self.reloading)))
+                self.reloading = None
+
+        self.log('停止中，等待 worker 处理完当前请求')
+        self.stop_workers(list(self.workers))
+        deadline = time.monotonic() + self.options.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        self.stop_workers(list(self.workers), signal.SIGKILL)
+        self.reap()
+        self.listener.close()
+        self.log('已停止')
+        return self.exit_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程 + 线程池的生产服务器')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker 进程数，默认 CPU 核数')
+    parser.add_argument('--threads', type=int, default=8, help='每个 worker 的线程数')
+    parser.add_argument('--backlog', type=int, default=1024)
+    parser.add_argument('--database', default='hr_system.db')
+    parser.add_argument('--session-store', choices=['cookie', 'sqlite'], default='cookie')
+    parser.add_argument('--graceful-timeout', type=float, default=30.0, help='退出时等待 worker 的最长秒数')
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false', help='不预热连接池和缓存')
+    parser.add_argument('--access-log', action='store_true', help='打印每个请求的访问日志')
+    options = parser.parse_args()
+
+    if not os.path.exists(options.database):
+        parser.error('%s 不存在，请先运行 init_db.py 或 gen_data.py' % options.database)
+
+    if not migrate(options.database):
+        parser.exit(1, '表结构迁移失败\n')
+
+    listener = socket.create_server((options.host, options.port), backlog=options.backlog)
+    listener.setblocking(False)
+    sys.exit(Arbiter(listener, options).run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""持久化的 SECRET_KEY 与可选的服务端 session
+
+多个 worker 进程（以及重启前后）必须使用同一个 SECRET_KEY，否则签名 cookie 互不承认、重启即全员掉线：
+密钥优先取环境变量 SECRET_KEY，否则读 instance/secret_key，文件不存在时生成一个（权限 0600）。
+
+SESSION_STORE = 'sqlite' 时 session 数据存在 sessions 表中，cookie 里只放随机 session id：
+多个 worker 共享同一张表，退出登录即在服务端作废；登录（user_id 变化）时更换 session id 防止会话固定。
+session 闲置超过 SESSION_IDLE_TIMEOUT 秒过期；过期记录由请求顺带清理（每个进程每 SESSION_SWEEP_INTERVAL 秒最多一次），
+也可以用命令行清理。默认 'cookie' 仍是 Flask 的签名 cookie session。
+
+用法：python session_store.py sweep | stats [--database hr_system.db]
+"""
+import argparse
+import os
+import secrets
+import tempfile
+import time
+
+from flask.sessions import SecureCookieSession, SecureCookieSessionInterface
+
+from db import connect, get_read_db, get_write_db
+
+SECRET_KEY_FILE = 'secret_key'
+
+
+def load_secret_key(instance_path):
+    """环境变量 SECRET_KEY，否则读取（必要时生成）instance_path/secret_key"""
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+    path = os.path.join(instance_path, SECRET_KEY_FILE)
+    if not os.path.exists(path):
+        os.makedirs(instance_path, exist_ok=True)
+        # 先写临时文件再 link：多个进程同时启动时只有一个能创建成功，其他进程读到的一定是完整的密钥
+        fd, tmp = tempfile.mkstemp(dir=instance_path)
+        try:
+            os.write(fd, secrets.token_hex(32).encode('ascii'))
+            os.fsync(fd)
+            os.close(fd)
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(tmp)
+    with open(path, encoding='ascii') as f:
+        return f.read().strip()
+
+
+def create_session_schema(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)')
+    conn.commit()
+
+
+def sweep_sessions(conn, now=None):
+    """删除已过期的 session，返回删除条数"""
+    deleted = conn.execute('DELETE FROM sessions WHERE expires_at < ?', (now or time.time(),)).rowcount
+    conn.commit()
+    return deleted
+
+
+class ServerSession(SecureCookieSession):
+    """服务端 session：sid 为 None 表示尚未写入 sessions 表"""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.loaded_user = self.get('user_id')
+
+
+class SessionStore(SecureCookieSessionInterface):
+    """SESSION_STORE 为 'sqlite' 时使用 sessions 表，否则沿用签名 cookie"""
+
+    def __init__(self):
+        self._last_sweep = 0.0
+
+    def _enabled(self, app):
+        return app.config['SESSION_STORE'] == 'sqlite'
+
+    def open_session(self, app, request):
+        if not self._enabled(app):
+            return super().open_session(app, request)
+        sid = request.cookies.get(self.get_cookie_name(app))
+        # 静态资源不需要 session，不查库
+        if sid and not request.path.startswith(app.static_url_path + '/'):
+            row = get_read_db().execute('SELECT data, expires_at FROM sessions WHERE id = ?', (sid,)).fetchone()
+            if row is not None and row['expires_at'] > time.time():
+                return ServerSession(self.serializer.loads(row['data']), sid, row['expires_at'])
+        return ServerSession()
+
+    def _write(self, app, statements):
+        """用请求自己的写连接写入（同一请求再借一个写连接在并发时会把连接池耗尽）。
+        请求中未提交的修改归还连接时本来就会回滚，这里先回滚，不会被一并提交"""
+        conn = get_write_db()
+        if conn.in_transaction:
+            conn.rollback()
+        now = time.time()
+        for sql, parameters in statements:
+            conn.execute(sql, parameters)
+        if now - self._last_sweep >= app.config['SESSION_SWEEP_INTERVAL']:
+            self._last_sweep = now
+            conn.execute('DELETE FROM sessions WHERE expires_at < ?', (now,))
+        conn.commit()
+
+    def save_session(self, app, session, response):
+        if not self._enabled(app):
+            return super().save_session(app, session, response)
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            # session.clear()（退出登录）：删除服务端记录和 cookie
+            if session.sid is not None and session.modified:
+                self._write(app, [('DELETE FROM sessions WHERE id = ?', (session.sid,))])
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite,
+                                       httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        now = time.time()
+        timeout = app.config['SESSION_IDLE_TIMEOUT']
+        # 未修改的 session 最多每 SESSION_TOUCH_INTERVAL 秒续期一次，避免每个请求都写库
+        touch = session.expires_at is not None and \
+            session.expires_at - now < timeout - app.config['SESSION_TOUCH_INTERVAL']
+        if session.sid is not None and not session.modified and not touch:
+            return
+
+        statements = []
+        sid = session.sid
+        if sid is None or session.get('user_id') != session.loaded_user:
+            if sid is not None:
+                statements.append(('DELETE FROM sessions WHERE id = ?', (sid,)))
+            sid = secrets.token_urlsafe(32)
+        statements.append(('INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)',
+                           (sid, self.serializer.dumps(dict(session)), now + timeout)))
+        self._write(app, statements)
+
+        if sid != session.sid or session.permanent:
+            response.set_cookie(name, sid, expires=self.get_expiration_time(app, session), httponly=httponly,
+                                domain=domain, path=path, secure=secure, samesite=samesite)
+            response.vary.add('Cookie')
+
+
+def init_app(app):
+    """注册 session 配置与 SessionStore"""
+    app.config.setdefault('SESSION_STORE', 'cookie')
+    app.config.setdefault('SESSION_IDLE_TIMEOUT', 8 * 3600)
+    app.config.setdefault('SESSION_TOUCH_INTERVAL', 300)
+    app.config.setdefault('SESSION_SWEEP_INTERVAL', 600)
+    app.session_interface = SessionStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='服务端 session 维护')
+    parser.add_argument('command', choices=['sweep', 'stats'])
+    parser.add_argument('--database', default='hr_system.db')
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    create_session_schema(conn)
+    if args.command == 'sweep':
+        print('已删除 %d 个过期 session' % sweep_sessions(conn))
+    else:
+        total, expired = conn.execute('SELECT COUNT(*), SUM(expires_at < ?) FROM sessions',
+                                      (time.time(),)).fetchone()
+        print('session 共 %d 个，其中已过期 %d 个' % (total, expired or 0))
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -16,7 +16,8 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // 设置当前日期
-    const todayInputs = document.querySelectorAll('input[type="date"]');
+    // 筛选表单中的日期（data-no-default）留空表示不限
+    const todayInputs = document.querySelectorAll('input[type="date"]:not([data-no-default])');
     const today = new Date().toISOString().slice(0, 10);
     todayInputs.forEach(input => {
         if (!input.value) {
@@ -33,20 +34,35 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    // 移动端表格标签
-    if (window.innerWidth <= 768) {
-        const tables = document.querySelectorAll('.table');
-        tables.forEach(table => {
-            const headers = Array.from(table.querySelectorAll('thead th')).map(th => th.textContent);
-            const rows = table.querySelectorAll('tbody tr');
-            rows.forEach(row => {
-                const cells = row.querySelectorAll('td');
-                cells.forEach((cell, index) => {
-                    if (headers[index]) {
-                        cell.setAttribute('data-label', headers[index]);
-                    }
-                });
-            });
+    // 通知推送：新通知以提示条插入页面顶部，紧急通知不自动关闭；通知删除后移除对应提示
+    const main = document.querySelector('main[data-notice-stream]');
+    if (main && window.EventSource) {
+        const source = new EventSource(main.dataset.noticeStream);
+        source.addEventListener('notice', event => {
+            const notice = JSON.parse(event.data);
+            main.querySelectorAll('[data-notice-id="' + notice.id + '"]').forEach(el => el.remove());
+            const alert = document.createElement('div');
+            alert.className = 'alert alert-dismissible fade show ' + (notice.priority === 'high' ? 'alert-danger' : 'alert-info');
+            alert.setAttribute('role', 'alert');
+            alert.dataset.noticeId = notice.id;
+            const title = document.createElement('strong');
+            title.textContent = notice.title;
+            const time = document.createElement('small');
+            time.className = 'text-muted d-block';
+            time.textContent = '发布于 ' + notice.created_at;
+            const close = document.createElement('button');
+            close.type = 'button';
+            close.className = 'btn-close';
+            close.dataset.bsDismiss = 'alert';
+            alert.append(title, ' - ' + notice.content, time, close);
+            main.prepend(alert);
+            if (notice.priority !== 'high') {
+                setTimeout(() => bootstrap.Alert.getOrCreateInstance(alert).close(), 8000);
+            }
+        });
+        source.addEventListener('notice-removed', event => {
+            const id = JSON.parse(event.data).id;
+            main.querySelectorAll('[data-notice-id="' + id + '"]').forEach(el => el.remove());
         });
     }
 });
@@ -0,0 +1,334 @@
+// 虚拟滚动表格：行数据从 JSON 列表接口按游标分页获取，只把可视区域内的行放进 DOM
+//
+// <div data-virtual-table data-source="/api/attendance" data-filter-form="attendance-filters">
+//     <div class="virtual-table-viewport">
+//         <table class="table table-stack"><thead>…<th data-sort="timestamp" data-sort-default>时间</th>…</thead><tbody></tbody></table>
+//     </div>
+//     <template data-row><tr><td data-label="员工" data-text="emp_name"></td>…</tr></template>
+//     <template data-empty><tr><td colspan="3">暂无记录</td></tr></template>
+//     <script type="application/json" data-initial-page>{"items": […], "next_cursor": …}</script>
+//     <div data-virtual-status></div>
+// </div>
+//
+// 行模板中的绑定（{字段} 替换为该行的值）：
+//     data-text="字段"          文本内容；data-format="money" 保留两位小数，"initial" 取首字；空值显示 data-empty-text
+//     data-if / data-unless     字段为空 / 非空时移除该元素
+//     data-class-field="字段"   按字段值从 data-class-map（JSON）取 class，没有对应项时用 data-class-default
+//     data-href="/x/{id}"       链接地址（值按 URL 编码）
+//     data-confirm="删除 {name}？"  点击时先确认
+//
+// 排序（表头 data-sort）和筛选（data-filter-form 指向的表单）都由服务器完成：重新请求第一页并同步地址栏，
+// 带 data-virtual-link 的链接（导出）随筛选条件更新。移动端的列名来自模板单元格的 data-label，由 CSS 显示。
+(function() {
+    const OVERSCAN_ROWS = 10;
+    const ESTIMATED_ROW_HEIGHT = 48;
+    const PREFETCH_ROWS = 40;
+    const PAGE_PARAMS = ['cursor'];
+
+    function isEmpty(value) {
+        return value === null || value === undefined || value === '';
+    }
+
+    function fill(template, item, encode) {
+        return template.replace(/\{(\w+)\}/g, (match, field) => {
+            const value = isEmpty(item[field]) ? '' : String(item[field]);
+            return encode ? encodeURIComponent(value) : value;
+        });
+    }
+
+    function formatValue(value, format) {
+        if (format === 'money') {
+            return Number(value).toFixed(2);
+        }
+        if (format === 'initial') {
+            return String(value).charAt(0);
+        }
+        return String(value);
+    }
+
+    function bindRow(row, item) {
+        row.querySelectorAll('[data-if]').forEach(el => {
+            if (isEmpty(item[el.dataset.if])) el.remove();
+        });
+        row.querySelectorAll('[data-unless]').forEach(el => {
+            if (!isEmpty(item[el.dataset.unless])) el.remove();
+        });
+        row.querySelectorAll('[data-text]').forEach(el => {
+            const value = item[el.dataset.text];
+            el.textContent = isEmpty(value) ? (el.dataset.emptyText || '') : formatValue(value, el.dataset.format);
+        });
+        row.querySelectorAll('[data-class-field]').forEach(el => {
+            const map = JSON.parse(el.dataset.classMap || '{}');
+            const classes = map[item[el.dataset.classField]] || el.dataset.classDefault || '';
+            classes.split(/\s+/).filter(Boolean).forEach(name => el.classList.add(name));
+        });
+        row.querySelectorAll('[data-href]').forEach(el => {
+            el.setAttribute('href', fill(el.dataset.href, item, true));
+        });
+        row.querySelectorAll('[data-confirm]').forEach(el => {
+            el.dataset.confirm = fill(el.dataset.confirm, item, false);
+        });
+        return row;
+    }
+
+    class VirtualTable {
+        constructor(root) {
+            this.root = root;
+            this.source = root.dataset.source;
+            this.viewport = root.querySelector('.virtual-table-viewport');
+            this.tbody = root.querySelector('tbody');
+            this.rowTemplate = root.querySelector('template[data-row]');
+            this.emptyTemplate = root.querySelector('template[data-empty]');
+            this.status = root.querySelector('[data-virtual-status]');
+            this.form = root.dataset.filterForm ? document.getElementById(root.dataset.filterForm) : null;
+            this.columns = this.rowTemplate.content.querySelectorAll('tr > td').length;
+
+            this.query = new URLSearchParams(window.location.search);
+            PAGE_PARAMS.forEach(name => this.query.delete(name));
+            this.generation = 0;
+            this.rowHeight = 0;
+            this.rendered = new Map();
+            this.range = null;
+
+            this.topSpacer = this.spacer();
+            this.bottomSpacer = this.spacer();
+
+            const initial = root.querySelector('script[data-initial-page]');
+            const page = initial ? JSON.parse(initial.textContent) : null;
+            this.reset();
+            this.bindEvents();
+            this.updateSortHeaders();
+            if (page) {
+                this.append(page);
+            } else {
+                this.load();
+            }
+        }
+
+        spacer() {
+            const row = document.createElement('tr');
+            row.className = 'virtual-spacer';
+            row.setAttribute('aria-hidden', 'true');
+            const cell = document.createElement('td');
+            cell.colSpan = this.columns;
+            row.appendChild(cell);
+            return row;
+        }
+
+        reset() {
+            this.generation += 1;
+            this.items = [];
+            this.nextCursor = null;
+            this.loading = false;
+            this.done = false;
+            this.rendered.clear();
+            this.range = null;
+            this.tbody.replaceChildren(this.topSpacer, this.bottomSpacer);
+            this.viewport.scrollTop = 0;
+        }
+
+        bindEvents() {
+            let frame = 0;
+            const schedule = () => {
+                if (!frame) {
+                    frame = requestAnimationFrame(() => {
+                        frame = 0;
+                        this.render();
+                    });
+                }
+            };
+            this.viewport.addEventListener('scroll', schedule, {passive: true});
+            // 窗口尺寸变化可能切换桌面/移动端布局，行高需要重新测量
+            window.addEventListener('resize', () => {
+                this.rowHeight = 0;
+                this.range = null;
+                schedule();
+            });
+
+            this.root.querySelectorAll('th[data-sort]').forEach(th => {
+                th.tabIndex = 0;
+                th.addEventListener('click', () => this.sortBy(th));
+                th.addEventListener('keydown', event => {
+                    if (event.key === 'Enter' || event.key === ' ') {
+                        event.preventDefault();
+                        this.sortBy(th);
+                    }
+                });
+            });
+
+            this.tbody.addEventListener('click', event => {
+                const target = event.target.closest('[data-confirm]');
+                if (target && !window.confirm(target.dataset.confirm)) {
+                    event.preventDefault();
+                }
+            });
+
+            if (this.form) {
+                this.form.addEventListener('submit', event => {
+                    event.preventDefault();
+                    const query = new URLSearchParams();
+                    new FormData(this.form).forEach((value, name) => {
+                        if (value !== '') query.set(name, value);
+                    });
+                    ['sort', 'order', 'limit'].forEach(name => {
+                        if (this.query.has(name)) query.set(name, this.query.get(name));
+                    });
+                    this.setQuery(query);
+                });
+            }
+        }
+
+        sortBy(th) {
+            const query = new URLSearchParams(this.query);
+            const active = this.activeSort();
+            let order = th.dataset.sortOrder || 'desc';
+            if (active === th) {
+                order = (this.query.get('order') || 'desc') === 'desc' ? 'asc' : 'desc';
+            }
+            query.set('sort', th.dataset.sort);
+            query.set('order', order);
+            this.setQuery(query);
+        }
+
+        activeSort() {
+            const headers = Array.from(this.root.querySelectorAll('th[data-sort]'));
+            const sort = this.query.get('sort');
+            return headers.find(th => sort ? th.dataset.sort === sort : th.hasAttribute('data-sort-default')) || null;
+        }
+
+        updateSortHeaders() {
+            const active = this.activeSort();
+            this.root.querySelectorAll('th[data-sort]').forEach(th => {
+                if (th === active) {
+                    th.setAttribute('aria-sort', this.query.get('order') === 'asc' ? 'ascending' : 'descending');
+                } else {
+                    th.removeAttribute('aria-sort');
+                }
+            });
+        }
+
+        setQuery(query) {
+            this.query = query;
+            const search = query.toString();
+            window.history.replaceState(null, '', window.location.pathname + (search ? '?' + search : ''));
+            document.querySelectorAll('a[data-virtual-link]').forEach(link => {
+                const url = new URL(link.href, window.location.href);
+                if (this.form) {
+                    new FormData(this.form).forEach((value, name) => url.searchParams.delete(name));
+                }
+                query.forEach((value, name) => url.searchParams.set(name, value));
+                link.href = url.pathname + url.search;
+            });
+            this.updateSortHeaders();
+            this.reset();
+            this.load();
+        }
+
+        load() {
+            if (this.loading || this.done) return;
+            this.loading = true;
+            this.setStatus();
+            const generation = this.generation;
+            const query = new URLSearchParams(this.query);
+            if (this.nextCursor) query.set('cursor', this.nextCursor);
+            fetch(this.source + '?' + query.toString(), {headers: {'Accept': 'application/json'}})
+                .then(response => {
+                    if (!response.ok) throw new Error(response.status);
+                    return response.json();
+                })
+                .then(page => {
+                    if (generation !== this.generation) return;
+                    this.loading = false;
+                    this.append(page);
+                })
+                .catch(() => {
+                    if (generation !== this.generation) return;
+                    // 不再随滚动重试，避免接口异常时连续请求
+                    this.loading = false;
+                    this.done = true;
+                    this.setStatus('加载失败，请刷新页面重试');
+                });
+        }
+
+        append(page) {
+            this.items = this.items.concat(page.items);
+            this.nextCursor = page.next_cursor;
+            this.done = !page.next_cursor;
+            if (this.done && !this.items.length && this.emptyTemplate) {
+                this.tbody.replaceChildren(this.emptyTemplate.content.cloneNode(true));
+            }
+            this.range = null;
+            this.setStatus();
+            this.render();
+        }
+
+        setStatus(message) {
+            if (!this.status) return;
+            if (message) {
+                this.status.textContent = message;
+            } else if (this.loading) {
+                this.status.textContent = '加载中…';
+            } else if (this.items.length) {
+                this.status.textContent = '已加载 ' + this.items.length + ' 条' + (this.done ? '，已全部显示' : '，向下滚动加载更多');
+            } else {
+                this.status.textContent = '';
+            }
+        }
+
+        createRow(index) {
+            const row = this.rowTemplate.content.firstElementChild.cloneNode(true);
+            return bindRow(row, this.items[index]);
+        }
+
+        render() {
+            if (!this.items.length) return;
+            if (!this.rowHeight) {
+                const probe = this.rendered.values().next().value || this.createRow(0);
+                if (!probe.isConnected) this.tbody.insertBefore(probe, this.bottomSpacer);
+                this.rowHeight = probe.offsetHeight;
+                if (!this.rendered.size) probe.remove();
+            }
+            // 表格不可见时量不出行高，先按估计值渲染，尺寸变化后重新测量
+            const rowHeight = this.rowHeight || ESTIMATED_ROW_HEIGHT;
+
+            const top = this.viewport.scrollTop;
+            const height = this.viewport.clientHeight || window.innerHeight;
+            const first = Math.max(0, Math.floor(top / rowHeight) - OVERSCAN_ROWS);
+            const last = Math.min(this.items.length, Math.ceil((top + height) / rowHeight) + OVERSCAN_ROWS);
+            const range = first + ':' + last + ':' + this.items.length;
+            if (range !== this.range) {
+                this.range = range;
+                this.rendered.forEach((row, index) => {
+                    if (index < first || index >= last) {
+                        row.remove();
+                        this.rendered.delete(index);
+                    }
+                });
+                // 已渲染的行是连续的一段，只需把新出现的行插到它前面或后面
+                let next = this.topSpacer.nextSibling;
+                for (let index = first; index < last; index++) {
+                    let row = this.rendered.get(index);
+                    if (!row) {
+                        row = this.createRow(index);
+                        this.rendered.set(index, row);
+                    }
+                    if (row === next) {
+                        next = next.nextSibling;
+                    } else {
+                        this.tbody.insertBefore(row, next);
+                    }
+                }
+                this.topSpacer.style.height = first * rowHeight + 'px';
+                this.bottomSpacer.style.height = (this.items.length - last) * rowHeight + 'px';
+            }
+
+            if (!this.done && last >= this.items.length - PREFETCH_ROWS) {
+                this.load();
+            }
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('[data-virtual-table]').forEach(root => new VirtualTable(root));
+    });
+})();
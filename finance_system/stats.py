@@ -0,0 +1,168 @@
+"""工作台统计物化表：由触发器增量维护，提供重建与校验命令
+
+用法：python stats.py verify | rebuild
+"""
+import sys
+
+# 计数器名称 -> 基表上的真实计数 SQL
+COUNTERS = {
+    'total_employees': 'SELECT COUNT(*) FROM employees',
+    'total_departments': 'SELECT COUNT(*) FROM departments',
+    'total_positions': 'SELECT COUNT(*) FROM positions',
+    'active_notices': 'SELECT COUNT(*) FROM notices WHERE is_active = 1',
+}
+
+STATS_TRIGGERS = '''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_employees_ins AFTER INSERT ON employees BEGIN
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'total_employees';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_stats_employees_del AFTER DELETE ON employees BEGIN
+        UPDATE dashboard_stats SET value = value - 1 WHERE name = 'total_employees';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stats_departments_ins AFTER INSERT ON departments BEGIN
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'total_departments';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_stats_departments_del AFTER DELETE ON departments BEGIN
+        UPDATE dashboard_stats SET value = value - 1 WHERE name = 'total_departments';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stats_positions_ins AFTER INSERT ON positions BEGIN
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'total_positions';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_stats_positions_del AFTER DELETE ON positions BEGIN
+        UPDATE dashboard_stats SET value = value - 1 WHERE name = 'total_positions';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stats_notices_ins AFTER INSERT ON notices WHEN NEW.is_active = 1 BEGIN
+        UPDATE dashboard_stats SET value = value + 1 WHERE name = 'active_notices';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_stats_notices_del AFTER DELETE ON notices WHEN OLD.is_active = 1 BEGIN
+        UPDATE dashboard_stats SET value = value - 1 WHERE name = 'active_notices';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_stats_notices_upd AFTER UPDATE OF is_active ON notices
+    WHEN (OLD.is_active = 1) <> (NEW.is_active = 1) BEGIN
+        UPDATE dashboard_stats SET value = value + (CASE WHEN NEW.is_active = 1 THEN 1 ELSE -1 END)
+        WHERE name = 'active_notices';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stats_attendance_ins AFTER INSERT ON attendance BEGIN
+        INSERT INTO attendance_daily_counts (day, cnt) VALUES (DATE(NEW.timestamp), 1)
+        ON CONFLICT(day) DO UPDATE SET cnt = cnt + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_stats_attendance_del AFTER DELETE ON attendance BEGIN
+        UPDATE attendance_daily_counts SET cnt = cnt - 1 WHERE day IS DATE(OLD.timestamp);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_stats_attendance_upd AFTER UPDATE OF timestamp ON attendance
+    WHEN DATE(OLD.timestamp) IS NOT DATE(NEW.timestamp) BEGIN
+        UPDATE attendance_daily_counts SET cnt = cnt - 1 WHERE day IS DATE(OLD.timestamp);
+        INSERT INTO attendance_daily_counts (day, cnt) VALUES (DATE(NEW.timestamp), 1)
+        ON CONFLICT(day) DO UPDATE SET cnt = cnt + 1;
+    END;
+'''
+
+
+def create_stats_schema(conn):
+    """创建统计表和维护触发器；新建时从基表初始化"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dashboard_stats (
+            name VARCHAR(50) PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_daily_counts (
+            day DATE PRIMARY KEY,
+            cnt INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.executescript(STATS_TRIGGERS)
+
+    initialized = cursor.execute('SELECT COUNT(*) FROM dashboard_stats').fetchone()[0]
+    if initialized < len(COUNTERS):
+        rebuild_stats(conn)
+
+
+def rebuild_stats(conn):
+    """按基表重新计算全部统计（单个事务内完成）"""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        for name, sql in COUNTERS.items():
+            cursor.execute('''
+                INSERT INTO dashboard_stats (name, value) VALUES (?, (%s))
+                ON CONFLICT(name) DO UPDATE SET value = excluded.value
+            ''' % sql, (name,))
+        cursor.execute('DELETE FROM attendance_daily_counts')
+        cursor.execute('''
+            INSERT INTO attendance_daily_counts (day, cnt)
+            SELECT DATE(timestamp), COUNT(*) FROM attendance GROUP BY DATE(timestamp)
+        ''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def verify_stats(conn):
+    """对比物化值与基表真实值，返回不一致项 [(名称, 物化值, 真实值)]"""
+    mismatches = []
+    stored = dict(conn.execute('SELECT name, value FROM dashboard_stats').fetchall())
+    for name, sql in COUNTERS.items():
+        actual = conn.execute(sql).fetchone()[0]
+        if stored.get(name) != actual:
+            mismatches.append((name, stored.get(name), actual))
+
+    rows = conn.execute('''
+        SELECT day, stored, actual FROM (
+            SELECT c.day, c.cnt as stored, COALESCE(a.cnt, 0) as actual
+            FROM attendance_daily_counts c
+            LEFT JOIN (SELECT DATE(timestamp) as day, COUNT(*) as cnt FROM attendance GROUP BY 1) a
+                ON a.day IS c.day
+            UNION ALL
+            SELECT a.day, 0, a.cnt
+            FROM (SELECT DATE(timestamp) as day, COUNT(*) as cnt FROM attendance GROUP BY 1) a
+            WHERE NOT EXISTS (SELECT 1 FROM attendance_daily_counts c WHERE c.day IS a.day)
+        )
+        WHERE stored <> actual
+    ''').fetchall()
+    mismatches.extend(('attendance@%s' % row[0], row[1], row[2]) for row in rows)
+    return mismatches
+
+
+def load_dashboard_stats(conn):
+    """工作台统计：全部来自物化表的主键查找"""
+    stats = dict(conn.execute('SELECT name, value FROM dashboard_stats').fetchall())
+    today = conn.execute("SELECT cnt FROM attendance_daily_counts WHERE day = DATE('now')").fetchone()
+    stats['today_attendance'] = today[0] if today else 0
+    for name in COUNTERS:
+        stats.setdefault(name, 0)
+    return stats
+
+
+def main():
+    from db import connect
+    from init_db import DATABASE
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'verify'
+    conn = connect(DATABASE)
+    create_stats_schema(conn)
+    if command == 'rebuild':
+        rebuild_stats(conn)
+        print('统计表已按基表重建。')
+    elif command == 'verify':
+        mismatches = verify_stats(conn)
+        for name, stored, actual in mismatches:
+            print('%-30s 物化值 %-8s 实际值 %s' % (name, stored, actual))
+        print('校验完成：%s' % ('共 %d 项不一致，可执行 rebuild 修复' % len(mismatches) if mismatches else '全部一致'))
+        conn.close()
+        sys.exit(1 if mismatches else 0)
+    else:
+        print('用法：python stats.py verify | rebuild')
+        sys.exit(2)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""/metrics 访问控制：匿名请求跳转登录，管理员或带正确 METRICS_TOKEN 的抓取请求可以访问
+
+用法：python -m pytest test_access.py
+"""
+import os
+import shutil
+
+import pytest
+
+from app import app
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def client(tmp_path):
+    database = str(tmp_path / 'hr_system.db')
+    shutil.copy(os.path.join(HERE, 'hr_system.db'), database)
+    app.config.update(DATABASE=database, TESTING=True, METRICS_TOKEN='scrape-token')
+    yield app.test_client()
+    app.config['METRICS_TOKEN'] = None
+
+
+def test_metrics_anonymous_redirects_to_login(client):
+    response = client.get('/metrics')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/login')
+
+
+def test_metrics_wrong_token_redirects_to_login(client):
+    response = client.get('/metrics', headers={'Authorization': 'Bearer wrong'})
+    assert response.status_code == 302
+
+
+def test_metrics_scrape_token(client):
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    assert response.status_code == 200
+    assert b'db_pool_connections' in response.data
+
+
+def test_metrics_admin(client):
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    assert client.get('/metrics').status_code == 200
@@ -0,0 +1,52 @@
+"""考勤归档：多个线程同时查询未缓存的同一个月时，解压出的缓存文件完整且不报错
+
+用法：python -m pytest test_attendance_archive.py
+"""
+import os
+import threading
+
+import pytest
+
+from attendance_archive import CACHE_DIRNAME, archive_month, archived_attendance_page
+from db import connect
+from init_db import create_schema
+
+MONTH = '2024-03'
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = str(tmp_path / 'hr_system.db')
+    conn = connect(database)
+    create_schema(conn)
+    employee_id = conn.execute("INSERT INTO employees (name) VALUES ('测试')").lastrowid
+    conn.executemany("INSERT INTO attendance (employee_id, type, timestamp) VALUES (?, '上班', ?)",
+                     [(employee_id, '%s-%02d 08:55:00' % (MONTH, day)) for day in range(1, 31)])
+    conn.commit()
+    archive_month(conn, MONTH, str(tmp_path / 'archive'))
+    conn.close()
+    return database
+
+
+def test_concurrent_queries_share_one_cache_file(database, tmp_path):
+    archive_dir = str(tmp_path / 'archive')
+    results, errors = [], []
+
+    def query():
+        conn = connect(database, readonly=True)
+        try:
+            results.append(len(archived_attendance_page(conn, MONTH, {'limit': '50'}, archive_dir).items))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=query) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert results == [30] * 8
+    assert os.listdir(os.path.join(archive_dir, CACHE_DIRNAME)) == ['attendance_%s.db' % MONTH]
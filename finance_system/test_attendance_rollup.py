@@ -0,0 +1,65 @@
+"""考勤月报：当月报表只把今天之前的工作日计入缺勤
+
+用法：python -m pytest test_attendance_rollup.py
+"""
+from datetime import date
+
+import pytest
+
+from attendance_rollup import monthly_report, refresh_dirty
+from db import connect
+from init_db import create_schema
+
+TODAY = date(2026, 10, 16)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'hr_system.db'))
+    create_schema(conn)
+    yield conn
+    conn.close()
+
+
+def add_employee(conn, join_date):
+    employee_id = conn.execute("INSERT INTO employees (name, join_date) VALUES ('测试', ?)", (join_date,)).lastrowid
+    conn.commit()
+    return employee_id
+
+
+def punch(conn, employee_id, days):
+    for day in days:
+        conn.execute("INSERT INTO attendance (employee_id, type, timestamp) VALUES (?, '上班', ?)",
+                     (employee_id, day + ' 08:55:00'))
+        conn.execute("INSERT INTO attendance (employee_id, type, timestamp) VALUES (?, '下班', ?)",
+                     (employee_id, day + ' 18:00:00'))
+    conn.commit()
+    refresh_dirty(conn)
+
+
+def report_for(conn, employee_id, month, today=TODAY):
+    return next(item for item in monthly_report(conn, month, today=today) if item['employee_id'] == employee_id)
+
+
+def test_current_month_ignores_future_workdays(conn):
+    employee_id = add_employee(conn, '2026-09-01')
+    # 10-01 至 10-15 的工作日全部出勤
+    punch(conn, employee_id, ['2026-10-%02d' % d for d in (1, 2, 5, 6, 7, 8, 9, 12, 13, 14, 15)])
+    assert report_for(conn, employee_id, '2026-10')['absences'] == 0
+
+
+def test_current_month_counts_missed_past_workdays(conn):
+    employee_id = add_employee(conn, '2026-09-01')
+    punch(conn, employee_id, ['2026-10-%02d' % d for d in (1, 2, 5, 6, 7, 8, 9, 12, 13, 15)])
+    assert report_for(conn, employee_id, '2026-10')['absences'] == 1
+
+
+def test_today_is_not_an_absence_yet(conn):
+    employee_id = add_employee(conn, '2026-10-16')
+    assert report_for(conn, employee_id, '2026-10')['absences'] == 0
+
+
+def test_past_and_future_months(conn):
+    employee_id = add_employee(conn, '2026-09-01')
+    assert report_for(conn, employee_id, '2026-09')['absences'] == 22
+    assert report_for(conn, employee_id, '2026-11')['absences'] == 0
@@ -0,0 +1,25 @@
+"""批量导入：无法按 UTF-8 解码的行报告为该行的错误，其余行照常导入
+
+用法：python -m pytest test_importer.py
+"""
+import io
+
+from importer import DECODE_ERROR, open_text, read_csv, read_jsonl
+
+
+def test_csv_bad_line_reported_with_line_number():
+    data = '﻿name,email\n甲,a@example.com\n'.encode('utf-8') + b'\xff\xfe,b@example.com\n' + \
+        '丙,c@example.com\n'.encode('utf-8')
+    rows = list(read_csv(open_text(io.BytesIO(data))))
+    assert [line_no for line_no, _ in rows] == [2, 3, 4]
+    assert rows[0][1] == {'name': '甲', 'email': 'a@example.com'}
+    assert str(rows[1][1]) == DECODE_ERROR
+    assert rows[2][1]['name'] == '丙'
+
+
+def test_jsonl_bad_line_reported_with_line_number():
+    data = b'{"name": "a"}\n{"name": "\xe4\xb8"}\n{"name": "c"}\n'
+    rows = list(read_jsonl(open_text(io.BytesIO(data))))
+    assert [line_no for line_no, _ in rows] == [1, 2, 3]
+    assert str(rows[1][1]) == DECODE_ERROR
+    assert rows[2][1] == {'name': 'c'}
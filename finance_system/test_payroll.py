@@ -0,0 +1,62 @@
+"""薪资核算：考勤扣款只考核发放日之前的工作日，周末签到不算迟到
+
+用法：python -m pytest test_payroll.py
+"""
+from datetime import date
+
+import pytest
+
+from attendance_rollup import workdays
+from db import connect
+from init_db import create_schema
+from payroll import LATE_PENALTY_CENTS, attendance_deduction, run_payroll
+from datetime import date
+
+OCTOBER = workdays(date(2026, 10, 1), date(2026, 11, 1))
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'hr_system.db'))
+    create_schema(conn)
+    yield conn
+    conn.close()
+
+
+def test_weekend_check_in_is_not_late():
+    check_ins = {day: '08:50:00' for day in OCTOBER}
+    check_ins['2026-10-10'] = '14:00:00'    # 周六
+    assert attendance_deduction(2175000, check_ins, OCTOBER, '2026-01-01') == (0, 0, 0)
+
+
+def test_late_on_workday():
+    check_ins = {day: '08:50:00' for day in OCTOBER}
+    check_ins['2026-10-12'] = '09:30:00'
+    assert attendance_deduction(2175000, check_ins, OCTOBER, '2026-01-01') == (LATE_PENALTY_CENTS, 0, 1)
+
+
+def test_mid_month_run_ignores_later_workdays(conn):
+    employee_id = conn.execute("INSERT INTO employees (name, join_date) VALUES ('测试', '2026-01-01')").lastrowid
+    for day in workdays(date(2026, 10, 1), date(2026, 10, 16)):
+        conn.execute("INSERT INTO attendance (employee_id, type, timestamp) VALUES (?, '上班', ?)",
+                     (employee_id, day + ' 08:55:00'))
+    conn.commit()
+
+    result = run_payroll(conn, '2026-10-16', default_base='5000')
+    assert result.inserted == 1
+    row = conn.execute('SELECT deduction, total FROM salaries WHERE employee_id = ?', (employee_id,)).fetchone()
+    assert (row['deduction'], row['total']) == (0, 5000)
+
+
+def test_manual_bonus_does_not_suppress_payroll(conn):
+    employee_id = conn.execute("INSERT INTO employees (name, join_date) VALUES ('测试', '2026-01-01')").lastrowid
+    conn.execute('''
+        INSERT INTO salaries (employee_id, base_salary, bonus, deduction, total, pay_date)
+        VALUES (?, 0, 800, 0, 800, '2026-09-05')
+    ''', (employee_id,))
+    conn.commit()
+
+    assert run_payroll(conn, '2026-09-30', default_base='5000').inserted == 1
+    # 同月换发放日再次核算不会重复发薪
+    assert run_payroll(conn, '2026-09-29', default_base='5000').skipped == 1
+    assert conn.execute('SELECT COUNT(*) FROM salaries WHERE employee_id = ?', (employee_id,)).fetchone()[0] == 2
@@ -0,0 +1,48 @@
+"""SQL hook：查询计时包括取行，没取完就丢弃的游标由连接显式结束计时，不依赖垃圾回收
+
+用法：python -m pytest test_query_hooks.py
+"""
+import pytest
+
+import db
+
+
+@pytest.fixture
+def queries(tmp_path):
+    seen = []
+
+    def hook(conn, sql, parameters, elapsed):
+        seen.append(sql)
+
+    conn = db.connect(str(tmp_path / 'hooks.db'))
+    conn.execute('CREATE TABLE t (x INTEGER)')
+    conn.executemany('INSERT INTO t VALUES (?)', [(i,) for i in range(100)])
+    conn.commit()
+    db.add_query_hook(hook)
+    yield conn, seen
+    db._query_hooks.remove(hook)
+    conn.close()
+
+
+def test_notified_when_rows_exhausted(queries):
+    conn, seen = queries
+    cursor = conn.execute('SELECT x FROM t')
+    cursor.fetchmany(10)
+    assert seen == []
+    cursor.fetchall()
+    assert seen == ['SELECT x FROM t']
+
+
+def test_abandoned_cursor_finished_by_next_statement(queries):
+    conn, seen = queries
+    conn.execute('SELECT x FROM t').fetchone()
+    assert seen == []
+    conn.execute('SELECT COUNT(*) FROM t').fetchall()
+    assert seen == ['SELECT x FROM t', 'SELECT COUNT(*) FROM t']
+
+
+def test_abandoned_cursor_finished_on_commit(queries):
+    conn, seen = queries
+    conn.execute('SELECT x FROM t').fetchone()
+    conn.commit()
+    assert seen == ['SELECT x FROM t']